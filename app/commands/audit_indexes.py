@@ -0,0 +1,137 @@
+# app/commands/audit_indexes.py
+# 對每個 service 的查詢形狀執行 explain()，只要有任何一個走 COLLSCAN 就以非 0 結束
+#
+# 執行：python -m app.commands.audit_indexes
+import asyncio
+import sys
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+from bson import ObjectId
+
+from app.db import init_db
+
+
+_OID = ObjectId()
+_NOW = datetime.now(timezone.utc)
+
+# (名稱, collection, 指令)；指令是 find 的 filter/sort 或 aggregate 的 pipeline，值只是樣本
+QUERY_SHAPES: List[dict] = [
+    # auth_service
+    {"name": "auth.register.username", "collection": "users", "filter": {"username": "u"}},
+    {"name": "auth.register.email", "collection": "users", "filter": {"email": "u@example.com"}},
+    {"name": "auth.login", "collection": "users",
+     "filter": {"$or": [{"username": "u"}, {"email": "u"}]}},
+    {"name": "auth.reset_password", "collection": "users",
+     "filter": {"resetPasswordToken": "t", "resetPasswordExpires": {"$gt": _NOW}}},
+    # hotel_service / room_service
+    {"name": "hotel.popular", "collection": "hotels", "filter": {"popularHotel": True}},
+    {"name": "hotel.search_by_price", "collection": "hotels",
+     "filter": {"cheapestPrice": {"$lte": 5000},
+                "$or": [{"cheapestPrice": {"$gt": 2000}}, {"cheapestPrice": 2000, "_id": {"$gt": _OID}}]},
+     "sort": {"cheapestPrice": 1, "_id": 1}},
+    {"name": "hotel.search_by_price_dated", "collection": "hotels",
+     "filter": {"$or": [{"cheapestPrice": {"$lte": 5000}}, {"minNightlyPrice": {"$lte": 5000}},
+                        {"minNightlyPrice": None}]},
+     "sort": {"cheapestPrice": 1, "_id": 1}},
+    {"name": "hotel.search_by_rating", "collection": "hotels",
+     "filter": {"$or": [{"rating": {"$lt": 8}}, {"rating": 8, "_id": {"$gt": _OID}}, {"rating": None}]},
+     "sort": {"rating": -1, "_id": 1}},
+    {"name": "hotel.near", "collection": "hotels", "pipeline": [
+        {"$geoNear": {"near": {"type": "Point", "coordinates": [121.56, 25.03]}, "key": "location",
+                      "distanceField": "distanceMeters", "spherical": True, "maxDistance": 5000}},
+    ]},
+    {"name": "room.by_hotel", "collection": "rooms", "filter": {"hotelId": _OID}},
+    {"name": "room.by_hotels", "collection": "rooms", "filter": {"hotelId": {"$in": [_OID]}}},
+    {"name": "room_inventory.available", "collection": "roominventory",
+     "filter": {"_id": {"$in": [f"{_OID}:2030-01"]}}},
+    # order_service / user_service
+    {"name": "order.by_user", "collection": "orders", "filter": {"userId": _OID}},
+    {"name": "order.pending_duplicate", "collection": "orders",
+     "filter": {"userId": str(_OID), "status": {"$ne": "completed"}}},
+    # flight_service
+    {"name": "flight.by_number", "collection": "flights", "filter": {"flightNumber": "BR001"}},
+    {"name": "flight.search", "collection": "flights", "pipeline": [
+        {"$match": {
+            "route.departureCity": "Taipei",
+            "route.arrivalCity": "Tokyo",
+            "schedules": {"$elemMatch": {"departureDate": {"$gte": _NOW, "$lte": _NOW}}},
+        }},
+    ]},
+    {"name": "flight.list_page", "collection": "flights",
+     "filter": {"_id": {"$gt": _OID},
+                "$or": [{"schedules.0": {"$exists": True}}, {"schedulesExternal": True}]},
+     "sort": {"_id": 1}},
+    {"name": "flight.fare_calendar", "collection": "flights", "pipeline": [
+        {"$match": {"route.departureCity": "Taipei", "route.arrivalCity": "Tokyo"}},
+    ]},
+    {"name": "flight.stale_prices", "collection": "flights",
+     "filter": {"schedules.pricesValidUntil": {"$lt": _NOW}}},
+    {"name": "flight.recurrence_due", "collection": "flights",
+     "filter": {"recurrence.materializedUntil": {"$lt": _NOW}}},
+    {"name": "flight_instance.by_flight", "collection": "flightinstances",
+     "filter": {"flightId": {"$in": [_OID]}, "departureDate": {"$gte": _NOW, "$lte": _NOW}},
+     "sort": {"departureDate": 1}},
+    {"name": "flight_instance.stale_prices", "collection": "flightinstances",
+     "filter": {"pricesValidUntil": {"$lt": _NOW}}},
+    {"name": "flight_order.by_user", "collection": "flightorders", "filter": {"userId": _OID}},
+    {"name": "flight_order.pending_duplicate", "collection": "flightorders",
+     "filter": {"userId": _OID, "flightId": _OID, "category": "ECONOMY",
+                "scheduleId": _OID, "status": "PENDING"}},
+    {"name": "flight_order.schedule_pending", "collection": "flightorders",
+     "filter": {"flightId": _OID, "scheduleId": _OID, "status": "PENDING"}},
+    {"name": "flight_order.cancel_batch", "collection": "flightorders",
+     "pipeline": [{"$match": {"cancelBatch": "b"}}]},
+]
+
+
+def _stages(plan: Optional[dict]) -> Iterator[str]:
+    """走訪 explain 的 plan 樹，列出所有 stage 名稱"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def _winning_plans(explain: dict) -> Iterator[dict]:
+    """find 與 aggregate 的 explain 格式不同（aggregate 可能包在 stages / shards 裡）"""
+    if "queryPlanner" in explain:
+        yield explain["queryPlanner"].get("winningPlan", {})
+    for stage in explain.get("stages", []):
+        cursor = stage.get("$cursor", {})
+        if "queryPlanner" in cursor:
+            yield cursor["queryPlanner"].get("winningPlan", {})
+    for shard in explain.get("shards", {}).values():
+        yield from _winning_plans(shard)
+
+
+async def explain_shape(db, shape: dict) -> dict:
+    if "pipeline" in shape:
+        cmd = {"aggregate": shape["collection"], "pipeline": shape["pipeline"], "cursor": {}}
+    else:
+        cmd = {"find": shape["collection"], "filter": shape["filter"]}
+        if shape.get("sort"):
+            cmd["sort"] = shape["sort"]
+    return await db.command({"explain": cmd, "verbosity": "queryPlanner"})
+
+
+async def audit() -> int:
+    db = await init_db()
+    failures = 0
+    for shape in QUERY_SHAPES:
+        explain = await explain_shape(db, shape)
+        stages = [s for plan in _winning_plans(explain) for s in _stages(plan)]
+        collscan = "COLLSCAN" in stages
+        failures += collscan
+        print(f"[{'COLLSCAN' if collscan else 'ok':>8}] {shape['name']:<34} {' > '.join(stages)}")
+
+    print(f"\n{len(QUERY_SHAPES)} 個查詢形狀，{failures} 個走全表掃描")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(audit()))
@@ -0,0 +1,47 @@
+# app/commands/backfill_hotel_locations.py
+# 為既有飯店補上 location（coordinates 的 GeoJSON 鏡像），讓 2dsphere 索引與附近飯店搜尋涵蓋舊資料
+# - 可重複執行：只處理還沒有 location 的飯店；一次 update_many 在資料庫端組出 GeoJSON，不載入文件
+# - 經緯度超出範圍或不是數字的飯店會被略過並列出筆數（2dsphere 索引會拒絕這種座標）
+#
+# 執行：python -m app.commands.backfill_hotel_locations [--dry-run]
+import argparse
+import asyncio
+import sys
+
+from app.db import init_db
+from app.models.hotel import Hotel
+
+
+VALID_COORDINATES = {
+    "coordinates.latitude": {"$type": "number", "$gte": -90, "$lte": 90},
+    "coordinates.longitude": {"$type": "number", "$gte": -180, "$lte": 180},
+}
+
+
+async def main(dry_run: bool) -> int:
+    db = await init_db()
+    hotels = db[Hotel.Settings.name]
+    missing = {"location": {"$exists": False}}
+
+    pending = await hotels.count_documents({**missing, **VALID_COORDINATES})
+    invalid = await hotels.count_documents(missing) - pending
+    print(f"待補 location：{pending}，座標不合法而略過：{invalid}")
+    if dry_run or not pending:
+        return 0
+
+    result = await hotels.update_many(
+        {**missing, **VALID_COORDINATES},
+        [{"$set": {"location": {
+            "type": "Point",
+            "coordinates": ["$coordinates.longitude", "$coordinates.latitude"],
+        }}}],
+    )
+    print(f"完成：更新 {result.modified_count} 筆")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true", help="只統計待補的飯店數")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run)))
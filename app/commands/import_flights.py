@@ -0,0 +1,40 @@
+# app/commands/import_flights.py
+# 從 JSON（航班陣列）或 CSV 檔批次匯入航班，印出逐筆錯誤與吞吐量；有任何錯誤時以非 0 結束
+#
+# 執行：python -m app.commands.import_flights flights.csv [--chunk-size 500]
+import argparse
+import asyncio
+import json
+import sys
+
+from app.db import init_db
+from app.services.flight_import import import_flights, import_flights_csv
+
+
+async def main(path: str, chunk_size: int) -> int:
+    await init_db()
+    with open(path, encoding="utf-8-sig") as f:
+        text = f.read()
+
+    if path.lower().endswith(".csv"):
+        report = await import_flights_csv(text, chunk_size)
+    else:
+        payload = json.loads(text)
+        rows = payload.get("flights") if isinstance(payload, dict) else payload
+        report = await import_flights(rows, chunk_size)
+
+    for error in report["errors"]:
+        print(json.dumps(error, ensure_ascii=False))
+    print(
+        f"匯入 {report['inserted']}/{report['total']} 筆航班，失敗 {report['failed']} 筆，"
+        f"耗時 {report['elapsedMs']}ms（{report['rowsPerSecond']} 筆/秒）"
+    )
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="JSON 或 CSV 檔案")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.path, args.chunk_size)))
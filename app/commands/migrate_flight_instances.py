@@ -0,0 +1,98 @@
+# app/commands/migrate_flight_instances.py
+# 線上遷移：把 Flight.schedules 內嵌陣列搬到 flightinstances（一個班次一筆文件）
+# - 可重複執行、可中斷：每個航班獨立搬移，已搬完的航班（schedulesExternal=True）會被跳過
+# - 搬移期間服務照常運作：切換時以「schedules 陣列與讀取時完全相同」為條件，
+#   若中途有訂位改了座位，切換會失敗並重新讀取該航班再搬一次
+# - 切換前的複本不是正本（訂位依 schedulesExternal 只寫內嵌陣列）：複本帶 migrationToken，
+#   切換失敗就刪掉自己這次的複本；中斷留下的舊複本（token 超過 STALE_AFTER）下次執行時清掉
+# - 複本一律 insert、不覆蓋既有班次文件；_id 已存在代表另一個 process 正在搬同一個航班，本次略過
+#
+# 執行：python -m app.commands.migrate_flight_instances [--dry-run] [--limit N]
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.db import init_db
+from app.models.flight import Flight
+from app.models.flight_instance import FlightInstance
+
+
+MAX_ATTEMPTS = 5
+STALE_AFTER = timedelta(minutes=30)
+
+
+async def migrate_flight(db, flight_id) -> bool:
+    flights = db[Flight.Settings.name]
+    instances = db[FlightInstance.Settings.name]
+
+    for _ in range(MAX_ATTEMPTS):
+        doc = await flights.find_one({"_id": flight_id, "schedulesExternal": {"$ne": True}}, {"schedules": 1})
+        if not doc:
+            return True  # 已被其他 process 搬完
+        schedules = doc.get("schedules") or []
+
+        # 0) 清掉先前中斷留下、沒有切換成功的複本
+        stale = ObjectId.from_datetime(datetime.now(timezone.utc) - STALE_AFTER)
+        await instances.delete_many({"flightId": flight_id, "migrationToken": {"$lt": stale}})
+
+        # 1) 複製班次（帶本次的 token；不覆蓋已存在的班次文件）
+        token = ObjectId()
+        if schedules:
+            try:
+                await instances.insert_many(
+                    [{**s, "flightId": flight_id, "migrationToken": token} for s in schedules],
+                    ordered=False,
+                )
+            except BulkWriteError:
+                await instances.delete_many({"flightId": flight_id, "migrationToken": token})
+                return False
+
+        # 2) 切換：陣列沒被改過才移除內嵌班次並標記 schedulesExternal
+        result = await flights.update_one(
+            {"_id": flight_id, "schedulesExternal": {"$ne": True}, "schedules": schedules},
+            {"$set": {"schedulesExternal": True}, "$unset": {"schedules": ""}},
+        )
+        if result.modified_count:
+            await instances.update_many({"migrationToken": token}, {"$unset": {"migrationToken": ""}})
+            return True
+
+        # 切換失敗：這次的複本已過時，刪掉後重新讀取再搬
+        await instances.delete_many({"flightId": flight_id, "migrationToken": token})
+    return False
+
+
+async def main(dry_run: bool, limit: int) -> int:
+    db = await init_db()
+    flights = db[Flight.Settings.name]
+    query = {"schedulesExternal": {"$ne": True}}
+
+    pending = await flights.count_documents(query)
+    print(f"待遷移航班：{pending}")
+    if dry_run:
+        return 0
+
+    migrated = failed = 0
+    cursor = flights.find(query, {"_id": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+    async for doc in cursor:
+        if await migrate_flight(db, doc["_id"]):
+            migrated += 1
+        else:
+            failed += 1
+            print(f"[!] 航班 {doc['_id']} 在 {MAX_ATTEMPTS} 次嘗試內都被同時修改（或另一個 process 正在搬移），請稍後重跑")
+
+    print(f"完成：遷移 {migrated} 筆，失敗 {failed} 筆")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true", help="只統計待遷移的航班數")
+    parser.add_argument("--limit", type=int, default=0, help="本次最多遷移幾個航班（0 為不限）")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run, args.limit)))
@@ -0,0 +1,73 @@
+# app/commands/rebuild_room_inventory.py
+# 依訂單重建房型庫存帳（app/services/room_inventory.py）：上線前已存在的訂單、或帳與訂單不一致時使用
+# - 只計入 pending / confirmed 且退房日在今天之後的訂單，每筆佔用 [入住日, 退房日) 各一間
+# - 從本月起的帳整份改寫：有訂單的月份 $set booked，沒有訂單的既有月份歸零
+# - 重建期間若有新訂單寫入可能被覆蓋，請在離峰時段執行
+#
+# 執行：python -m app.commands.rebuild_room_inventory [--dry-run]
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+from app.db import init_db
+from app.models.order import Order
+from app.services import room_inventory
+from app.services.order_service import HOLDING_STATUSES, ref_id
+
+
+async def main(dry_run: bool) -> int:
+    db = await init_db()
+    now = datetime.now(timezone.utc)
+    first_month = f"{now.year:04d}-{now.month:02d}"
+
+    ledgers: Dict[str, dict] = {}
+    orders = db[Order.Settings.name].find(
+        {"status": {"$in": list(HOLDING_STATUSES)}, "checkOutDate": {"$gt": now}},
+        {"roomId": 1, "checkInDate": 1, "checkOutDate": 1},
+    )
+    n_orders = 0
+    async for doc in orders:
+        stay = room_inventory.stay_range(doc.get("checkInDate"), doc.get("checkOutDate"))
+        if not stay:
+            continue
+        n_orders += 1
+        room_id = ref_id(doc["roomId"])
+        for month, days in room_inventory.nights_by_month(*stay).items():
+            if month < first_month:
+                continue
+            ledger = ledgers.setdefault(room_inventory.ledger_id(room_id, month), {
+                "roomId": room_id, "month": month, "booked": room_inventory.empty_month(month),
+            })
+            booked: List[int] = ledger["booked"]
+            for d in days:
+                booked[d] += 1
+
+    collection = db[room_inventory.COLLECTION]
+    stale = await collection.count_documents({"month": {"$gte": first_month}, "_id": {"$nin": list(ledgers)}})
+    print(f"有效訂單：{n_orders}，重建房型月份：{len(ledgers)}，歸零既有月份：{stale}")
+    if dry_run:
+        return 0
+
+    if ledgers:
+        await collection.bulk_write([
+            UpdateOne({"_id": ledger_id}, {"$set": ledger}, upsert=True)
+            for ledger_id, ledger in ledgers.items()
+        ], ordered=False)
+    if stale:
+        await collection.update_many(
+            {"month": {"$gte": first_month}, "_id": {"$nin": list(ledgers)}},
+            [{"$set": {"booked": {"$map": {"input": "$booked", "in": 0}}}}],
+        )
+    print("完成")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true", help="只統計，不寫入")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run)))
@@ -0,0 +1,31 @@
+# app/commands/refresh_fares.py
+# 手動重算過期票價，或以 --check 比對已物化的票價與即時計算結果（不一致時以非 0 結束）
+#
+# 執行：python -m app.commands.refresh_fares [--check]
+import argparse
+import asyncio
+import json
+import sys
+
+from app.db import init_db
+from app.jobs.fare_refresher import check_stored_prices, refresh_stale_prices
+
+
+async def main(check: bool) -> int:
+    await init_db()
+    if not check:
+        print(f"重算 {await refresh_stale_prices()} 個班次的票價")
+        return 0
+
+    mismatches = await check_stored_prices()
+    for m in mismatches:
+        print(json.dumps(m, ensure_ascii=False))
+    print(f"{len(mismatches)} 個班次的票價與即時計算不一致")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="只檢查，不寫入")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.check)))
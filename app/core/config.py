@@ -8,6 +8,56 @@ load_dotenv()
 class Settings:
     # 從環境變數中取得 MONGODB 的設定值，若未設定則使用預設值 "mongodb://localhost:27017/default"
     MONGODB_URI = os.getenv("MONGODB", "mongodb://localhost:27017/default")
+    # 離線城市表查不到時，是否改用 Nominatim 線上查詢（設為 0 則完全不走網路）
+    GEOCODER_FALLBACK = os.getenv("GEOCODER_FALLBACK", "1") == "1"
+    # 地理查詢持久快取（SQLite），所有 worker 共用同一個檔案；TTL 以秒為單位
+    GEO_CACHE_PATH = os.getenv("GEO_CACHE_PATH", ".cache/geo_cache.sqlite3")
+    GEO_CACHE_TTL = int(os.getenv("GEO_CACHE_TTL", str(30 * 24 * 3600)))
+    GEO_CACHE_NEGATIVE_TTL = int(os.getenv("GEO_CACHE_NEGATIVE_TTL", str(24 * 3600)))
+    # 票價物化：背景重算過期票價的間隔（秒）
+    FARE_REFRESH_INTERVAL = int(os.getenv("FARE_REFRESH_INTERVAL", "600"))
+    # 新寫入的航班班次存放位置："embedded"（Flight.schedules 陣列）或 "instances"（flightinstances collection）
+    FLIGHT_SCHEDULE_STORE = os.getenv("FLIGHT_SCHEDULE_STORE", "embedded")
+    # 航班列表（非搜尋模式）分頁：帶 cursor 未帶 limit 時的每頁筆數，與 limit 上限（兩者都沒帶時回傳全部，不分頁）
+    FLIGHT_PAGE_SIZE = int(os.getenv("FLIGHT_PAGE_SIZE", "100"))
+    FLIGHT_PAGE_SIZE_MAX = int(os.getenv("FLIGHT_PAGE_SIZE_MAX", "500"))
+    # 轉機搜尋：最短 / 最長轉機時間、每次搜尋最多展開的部分行程數、航線圖整份重建間隔（秒）
+    CONNECTION_MIN_MINUTES = int(os.getenv("CONNECTION_MIN_MINUTES", "60"))
+    CONNECTION_MAX_HOURS = int(os.getenv("CONNECTION_MAX_HOURS", "24"))
+    CONNECTION_MAX_EXPANSIONS = int(os.getenv("CONNECTION_MAX_EXPANSIONS", "20000"))
+    ROUTE_GRAPH_REFRESH_INTERVAL = int(os.getenv("ROUTE_GRAPH_REFRESH_INTERVAL", "900"))
+    # 票價月曆：快取秒數上限（同步其他 worker 的異動）、快取筆數、單次查詢最多天數
+    FARE_CALENDAR_CACHE_TTL = int(os.getenv("FARE_CALENDAR_CACHE_TTL", "300"))
+    FARE_CALENDAR_CACHE_SIZE = int(os.getenv("FARE_CALENDAR_CACHE_SIZE", "512"))
+    FARE_CALENDAR_MAX_DAYS = int(os.getenv("FARE_CALENDAR_MAX_DAYS", "62"))
+    # 航班批次匯入：每批 insert_many 的筆數、API 單次上限
+    FLIGHT_IMPORT_CHUNK_SIZE = int(os.getenv("FLIGHT_IMPORT_CHUNK_SIZE", "500"))
+    FLIGHT_IMPORT_MAX_ROWS = int(os.getenv("FLIGHT_IMPORT_MAX_ROWS", "20000"))
+    # 重複規則：班次預先產生到未來幾天、背景作業間隔（秒）、單次展開的班次數上限
+    SCHEDULE_HORIZON_DAYS = int(os.getenv("SCHEDULE_HORIZON_DAYS", "90"))
+    SCHEDULE_MATERIALIZE_INTERVAL = int(os.getenv("SCHEDULE_MATERIALIZE_INTERVAL", "3600"))
+    RECURRENCE_MAX_OCCURRENCES = int(os.getenv("RECURRENCE_MAX_OCCURRENCES", "2000"))
+    # 房型價格表（星期 / 假日查表）的快取筆數，以 (房型 _id, updatedAt) 為 key
+    ROOM_PRICE_TABLE_CACHE_SIZE = int(os.getenv("ROOM_PRICE_TABLE_CACHE_SIZE", "4096"))
+    # 飯店最低價物化：處理房型異動的間隔、全部重算的間隔（秒）
+    HOTEL_PRICE_DIRTY_INTERVAL = int(os.getenv("HOTEL_PRICE_DIRTY_INTERVAL", "5"))
+    HOTEL_PRICE_REFRESH_INTERVAL = int(os.getenv("HOTEL_PRICE_REFRESH_INTERVAL", "3600"))
+    # 飯店名稱自動完成：回傳筆數、索引整份重建的間隔（秒）
+    HOTEL_SUGGESTION_LIMIT = int(os.getenv("HOTEL_SUGGESTION_LIMIT", "10"))
+    HOTEL_SUGGESTION_REFRESH_INTERVAL = int(os.getenv("HOTEL_SUGGESTION_REFRESH_INTERVAL", "600"))
+    # 飯店篩選條件（類型 / 城市 / 評分 / 設施）點陣索引整份重建的間隔（秒）
+    HOTEL_FACET_REFRESH_INTERVAL = int(os.getenv("HOTEL_FACET_REFRESH_INTERVAL", "600"))
+    # 飯店搜尋分頁：預設每頁筆數與上限；附近飯店搜尋的預設 / 最大半徑（公里）
+    HOTEL_PAGE_SIZE = int(os.getenv("HOTEL_PAGE_SIZE", "20"))
+    HOTEL_PAGE_SIZE_MAX = int(os.getenv("HOTEL_PAGE_SIZE_MAX", "100"))
+    HOTEL_NEAR_DEFAULT_RADIUS_KM = float(os.getenv("HOTEL_NEAR_DEFAULT_RADIUS_KM", "5"))
+    HOTEL_NEAR_MAX_RADIUS_KM = float(os.getenv("HOTEL_NEAR_MAX_RADIUS_KM", "200"))
+    # 明細頁的 Cache-Control（依路由設定，搭配 ETag 讓瀏覽器與 CDN 以 If-None-Match 重新驗證）
+    # 航班座位會隨訂位變動，預設每次都回原站驗證；飯店資料變動少，允許短暫快取
+    CACHE_CONTROL = {
+        "flight.detail": os.getenv("CACHE_CONTROL_FLIGHT_DETAIL", "public, no-cache"),
+        "hotel.detail": os.getenv("CACHE_CONTROL_HOTEL_DETAIL", "public, max-age=60, must-revalidate"),
+    }
 
 # 建立設定實例供其他模組匯入使用
 settings = Settings()
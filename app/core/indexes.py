@@ -0,0 +1,75 @@
+# app/core/indexes.py
+# 索引登錄表：所有 collection 的查詢索引集中在這裡宣告，init_db 啟動時同步到資料庫
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+
+# collection 名稱 → 索引清單（欄位一律使用資料庫中的 alias 名稱）
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # User 上的 Field(unique=True) 不會建立任何索引，唯一性由這裡保證
+        IndexModel([("username", ASCENDING)], unique=True, name="username_unique"),
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+        # 重置密碼：token 平常是 null，用 sparse 避免把整個 collection 都收進索引
+        IndexModel([("resetPasswordToken", ASCENDING)], sparse=True, name="reset_token"),
+    ],
+    "hotels": [
+        IndexModel([("popularHotel", ASCENDING)], name="popular_hotel"),
+        # 飯店搜尋的排序與 keyset 分頁（price / rating），cheapestPrice 同時用於 maxPrice 預先過濾
+        IndexModel([("cheapestPrice", ASCENDING), ("_id", ASCENDING)], name="cheapest_price_id"),
+        IndexModel([("rating", DESCENDING), ("_id", ASCENDING)], name="rating_id"),
+        # 附近飯店搜尋（$geoNear）；location 由 Hotel.coordinates 同步，舊資料以 backfill_hotel_locations 補上
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+    ],
+    "rooms": [
+        # list_hotels / list_rooms_by_hotel
+        IndexModel([("hotelId", ASCENDING)], name="hotel_id"),
+    ],
+    "orders": [
+        IndexModel([("userId", ASCENDING), ("status", ASCENDING)], name="user_status"),
+    ],
+    "flights": [
+        # list_flights 搜尋模式（flightNumber 的唯一索引由 Flight 模型的 Indexed 建立）
+        IndexModel(
+            [("route.departureCity", ASCENDING), ("route.arrivalCity", ASCENDING)],
+            name="route_city_pair",
+        ),
+        # 票價背景重算：找出 pricesValidUntil 已過期的班次
+        IndexModel([("schedules.pricesValidUntil", ASCENDING)], sparse=True, name="schedule_prices_valid_until"),
+        # 重複規則背景作業：找出滾動視窗需要往後補的航班
+        IndexModel([("recurrence.materializedUntil", ASCENDING)], sparse=True, name="recurrence_materialized_until"),
+    ],
+    "flightinstances": [
+        # 單一航班的班次列表與日期區間搜尋
+        IndexModel([("flightId", ASCENDING), ("departureDate", ASCENDING)], name="flight_departure"),
+        IndexModel([("pricesValidUntil", ASCENDING)], sparse=True, name="prices_valid_until"),
+    ],
+    "flightorders": [
+        # get_user_orders / get_user；前綴同時涵蓋 create_flight_order 的重複訂單檢查
+        IndexModel(
+            [("userId", ASCENDING), ("flightId", ASCENDING), ("scheduleId", ASCENDING), ("status", ASCENDING)],
+            name="user_flight_schedule_status",
+        ),
+        # 後台批次取消：某班次的待付款訂單，以及該批次的座位統計
+        IndexModel(
+            [("flightId", ASCENDING), ("scheduleId", ASCENDING), ("status", ASCENDING)],
+            name="flight_schedule_status",
+        ),
+        IndexModel([("cancelBatch", ASCENDING)], sparse=True, name="cancel_batch"),
+    ],
+}
+
+
+async def sync_indexes(db) -> None:
+    """
+    依 INDEXES 建立索引（create_indexes 對已存在的同名索引是 no-op）
+    - 單一 collection 失敗（例如既有資料違反 unique）只記錄錯誤，不阻擋啟動
+    """
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            logging.error("建立索引失敗 collection=%s: %s", collection, e)
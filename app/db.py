@@ -2,20 +2,39 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 from app.core.config import settings
+from app.core.indexes import sync_indexes
 from app.models.user import User
 from app.models.hotel import Hotel
 from app.models.room import Room
 from app.models.order import Order
 from app.models.flight import Flight
 from app.models.flight_order import FlightOrder
+from app.models.flight_instance import FlightInstance
+
+
+# 啟動後保留資料庫物件，供需要原生 Motor 操作（索引、explain、bulk write）的地方使用
+_db = None
 
 
 async def init_db():
+    global _db
     client = AsyncIOMotorClient(settings.MONGODB_URI)
     db = client.get_default_database()
 
     # 初始化 Beanie ODM，註冊所有模型
     await init_beanie(
         database=db,
-        document_models=[User, Hotel, Room, Order, Flight, FlightOrder]
+        document_models=[User, Hotel, Room, Order, Flight, FlightOrder, FlightInstance]
     )
+
+    # 同步索引登錄表
+    await sync_indexes(db)
+
+    _db = db
+    return db
+
+
+def get_db():
+    if _db is None:
+        raise RuntimeError("資料庫尚未初始化，請先呼叫 init_db()")
+    return _db
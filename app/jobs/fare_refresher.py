@@ -0,0 +1,102 @@
+# app/jobs/fare_refresher.py
+# 背景作業：只重算「因時間跨過早鳥門檻而過期」的 Schedule.prices，並提供一致性檢查
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.db import get_db
+from app.models.flight import Flight, Schedule
+from app.models.flight_instance import FlightInstance
+from app.services import schedule_store
+from app.services.schedule_store import FLIGHT_HEADER_PROJECTION
+
+
+async def refresh_stale_prices(now: Optional[datetime] = None) -> int:
+    """
+    找出有過期票價的航班，只重算過期的 schedules（內嵌與 flightinstances 兩種格式都處理）
+    - 以 pricesValidUntil 索引篩選，不掃全部航班
+    - 寫回用位置運算子 $set 單一 schedule 的 prices，不整份覆寫（不會蓋掉同時進行的座位異動）
+    - 回傳重算的 schedule 數
+    """
+    now = now or datetime.now(timezone.utc)
+    ops: List[UpdateOne] = []
+
+    async for flight in Flight.find({"schedules.pricesValidUntil": {"$lt": now}}):
+        for s in flight.refresh_schedule_prices(now=now, only_stale=True):
+            ops.append(UpdateOne(
+                {"_id": flight.id, "schedules._id": s.id},
+                {"$set": {
+                    "schedules.$.prices": s.prices,
+                    "schedules.$.pricesValidUntil": s.prices_valid_until,
+                }},
+            ))
+
+    if ops:
+        await get_db()[Flight.Settings.name].bulk_write(ops, ordered=False)
+    return len(ops) + await _refresh_stale_instance_prices(now)
+
+
+async def _refresh_stale_instance_prices(now: datetime) -> int:
+    """已遷移到 flightinstances 的班次：依航班分組重算，直接 $set 班次文件"""
+    stale: Dict[PydanticObjectId, List[Schedule]] = {}
+    async for instance in FlightInstance.find({"pricesValidUntil": {"$lt": now}}):
+        stale.setdefault(instance.flight_id, []).append(instance.to_schedule())
+    if not stale:
+        return 0
+
+    ops: List[UpdateOne] = []
+    cursor = get_db()[Flight.Settings.name].find({"_id": {"$in": list(stale)}}, FLIGHT_HEADER_PROJECTION)
+    async for header in cursor:
+        flight = Flight.model_validate(header)
+        flight.schedules = stale[flight.id]
+        for s in flight.refresh_schedule_prices(now=now, only_stale=True):
+            ops.append(UpdateOne(
+                {"_id": s.id},
+                {"$set": {"prices": s.prices, "pricesValidUntil": s.prices_valid_until}},
+            ))
+
+    if ops:
+        await get_db()[FlightInstance.Settings.name].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+async def check_stored_prices(now: Optional[datetime] = None) -> List[dict]:
+    """
+    一致性檢查：比對已物化的票價與即時計算結果，回傳不一致的清單
+    - 未過期的票價應與 calculate_price_grid 四捨五入後完全相同
+    """
+    now = now or datetime.now(timezone.utc)
+    mismatches = []
+    async for flight in Flight.find_all():
+        schedules = await schedule_store.get_schedules(flight)
+        live = flight.calculate_price_grid([s.departure_date for s in schedules], now=now)
+        for s, prices in zip(schedules, live):
+            expected = {category: round(raw) for category, raw in prices.items()}
+            if s.prices_stale(now) or s.prices != expected:
+                mismatches.append({
+                    "flightId": str(flight.id),
+                    "flightNumber": flight.flight_number,
+                    "scheduleId": str(s.id),
+                    "stored": s.prices,
+                    "stale": s.prices_stale(now),
+                    "expected": expected,
+                })
+    return mismatches
+
+
+async def run_fare_refresher(interval: Optional[int] = None):
+    """常駐迴圈：每 interval 秒重算一次過期票價（啟動時由 main.py 建立背景 task）"""
+    interval = interval or settings.FARE_REFRESH_INTERVAL
+    while True:
+        try:
+            refreshed = await refresh_stale_prices()
+            if refreshed:
+                logging.info("fare refresher: %s schedules refreshed", refreshed)
+        except Exception:
+            logging.exception("fare refresher failed")
+        await asyncio.sleep(interval)
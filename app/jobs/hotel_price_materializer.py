@@ -0,0 +1,34 @@
+# app/jobs/hotel_price_materializer.py
+# 背景作業：物化飯店最低價（cheapestPrice）與搜尋預先排除用的價格下界（minNightlyPrice）
+# - 每 interval 秒重算本 worker 標記過（房型有異動）的飯店
+# - 每 full_interval 秒全部重算一次（涵蓋其他 worker 的異動與直接改資料庫的情況）
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.services import hotel_price
+
+
+async def run_hotel_price_materializer(interval: Optional[int] = None, full_interval: Optional[int] = None):
+    """常駐迴圈（啟動時由 main.py 建立背景 task）；第一輪即全量重算"""
+    interval = interval or settings.HOTEL_PRICE_DIRTY_INTERVAL
+    full_interval = full_interval or settings.HOTEL_PRICE_REFRESH_INTERVAL
+    next_full = 0.0
+    while True:
+        # 全量重算時一併清掉標記；重算期間新增的標記留到下一輪
+        dirty = hotel_price.take_dirty()
+        full = time.monotonic() >= next_full
+        try:
+            if full:
+                updated = await hotel_price.refresh_cheapest_prices()
+                next_full = time.monotonic() + full_interval
+            else:
+                updated = await hotel_price.refresh_cheapest_prices(dirty) if dirty else 0
+            if updated:
+                logging.info("hotel price materializer: %s hotels updated%s", updated, " (full)" if full else "")
+        except Exception:
+            hotel_price.mark_dirty(*dirty)  # 失敗時保留標記，下一輪重試
+            logging.exception("hotel price materializer failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,20 @@
+# app/jobs/route_graph_refresher.py
+# 背景作業：定期整份重建轉機搜尋用的航線圖（同步其他 worker 的航班異動、淘汰已出發的班次）
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.services import connection_index
+
+
+async def run_route_graph_refresher(interval: Optional[int] = None):
+    """常駐迴圈：每 interval 秒重建一次（啟動時由 main.py 建立背景 task）"""
+    interval = interval or settings.ROUTE_GRAPH_REFRESH_INTERVAL
+    while True:
+        try:
+            graph = await connection_index.rebuild()
+            logging.info("route graph rebuilt: %s flights, %s legs", len(graph.flights), len(graph))
+        except Exception:
+            logging.exception("route graph rebuild failed")
+        await asyncio.sleep(interval)
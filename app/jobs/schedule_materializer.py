@@ -0,0 +1,70 @@
+# app/jobs/schedule_materializer.py
+# 背景作業：有重複規則的航班，把班次以滾動視窗往後補到 now + SCHEDULE_HORIZON_DAYS
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from app.core.config import settings
+from app.db import get_db
+from app.models.flight import Flight
+from app.services import fare_calendar, schedule_store
+from app.services.flight_service import expand_recurrence
+from app.services.schedule_store import FLIGHT_HEADER_PROJECTION
+from app.utils.fare_engine import to_utc
+from app.utils.timezone import get_time_zone_by_city
+
+
+async def materialize_recurring_schedules(now: Optional[datetime] = None) -> int:
+    """
+    - 以 recurrence.materializedUntil 索引只挑視窗落後的航班；不載入既有班次
+    - 從 max(materializedUntil, now) 展開到視窗終點，已經過去的出發時間不補
+    - 單次展開達到 RECURRENCE_MAX_OCCURRENCES 時，materializedUntil 只推進到最後一個產生的班次，下一輪接著補
+    - 抵達時間與票價在寫入前算好（$push 不會觸發 before_event）
+    - 轉機航線圖不即時更新：新班次都在遠期，由航線圖的定期重建帶入
+    - 回傳新增的班次數
+    """
+    now = (now or datetime.now(timezone.utc)).replace(microsecond=0)
+    horizon = now + timedelta(days=settings.SCHEDULE_HORIZON_DAYS)
+    added = 0
+
+    cursor = get_db()[Flight.Settings.name].find(
+        {"recurrence.materializedUntil": {"$lt": horizon}},
+        {**FLIGHT_HEADER_PROJECTION, "recurrence": 1},
+    )
+    async for doc in cursor:
+        flight = Flight.model_validate(doc)
+        tz_name = get_time_zone_by_city(flight.route.departure_city)
+        if not tz_name:
+            logging.warning("schedule materializer: 找不到城市時區資訊 %s（%s）", flight.route.departure_city, flight.flight_number)
+            continue
+
+        expected = flight.recurrence.materialized_until
+        try:
+            schedules, covered_until = expand_recurrence(flight, ZoneInfo(tz_name), max(to_utc(expected), now), horizon)
+        except ValueError:
+            logging.exception("schedule materializer: %s 的重複規則無法展開", flight.flight_number)
+            continue
+
+        flight.schedules = schedules
+        await flight.fill_schedule_arrival_dates()
+        flight.refresh_schedule_prices(now=now)
+        if await schedule_store.append_schedules(flight, schedules, expected, covered_until):
+            added += len(schedules)
+            if schedules:
+                fare_calendar.invalidate_route(flight.route.departure_city, flight.route.arrival_city)
+    return added
+
+
+async def run_schedule_materializer(interval: Optional[int] = None):
+    """常駐迴圈：每 interval 秒補一次（啟動時由 main.py 建立背景 task）"""
+    interval = interval or settings.SCHEDULE_MATERIALIZE_INTERVAL
+    while True:
+        try:
+            added = await materialize_recurring_schedules()
+            if added:
+                logging.info("schedule materializer: %s schedules added", added)
+        except Exception:
+            logging.exception("schedule materializer failed")
+        await asyncio.sleep(interval)
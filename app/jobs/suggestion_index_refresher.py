@@ -0,0 +1,20 @@
+# app/jobs/suggestion_index_refresher.py
+# 背景作業：定期整份重建飯店名稱自動完成索引（同步其他 worker 的飯店異動）
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.services import hotel_suggestions
+
+
+async def run_suggestion_index_refresher(interval: Optional[int] = None):
+    """常駐迴圈：每 interval 秒重建一次（啟動時由 main.py 建立背景 task）"""
+    interval = interval or settings.HOTEL_SUGGESTION_REFRESH_INTERVAL
+    while True:
+        try:
+            index = await hotel_suggestions.rebuild()
+            logging.info("hotel suggestion index rebuilt: %s hotels", len(index))
+        except Exception:
+            logging.exception("hotel suggestion index rebuild failed")
+        await asyncio.sleep(interval)
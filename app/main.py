@@ -3,14 +3,24 @@ from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
+import asyncio
 import logging
 
 from app.core.config import settings
 from app.models.hotel import Hotel
 from app.models.room import Room
 from app.models.order import Order
+from app.models.flight import Flight
 from app.routes import hotels, rooms, users, auth, order, flight, captcha
 from app.db import init_db
+from app.utils import gazetteer
+from app.utils.timezone import warm_up_city_cache
+from app.jobs.fare_refresher import run_fare_refresher
+from app.jobs.route_graph_refresher import run_route_graph_refresher
+from app.jobs.schedule_materializer import run_schedule_materializer
+from app.jobs.hotel_price_materializer import run_hotel_price_materializer
+from app.jobs.suggestion_index_refresher import run_suggestion_index_refresher
+from app.jobs.facet_index_refresher import run_facet_index_refresher
 from app.utils.error_handler import http_error_handler, validation_exception_handler
 
 app = FastAPI(title="Hotel Booking API")
@@ -20,10 +30,45 @@ Hotel.model_rebuild()
 Room.model_rebuild()
 Order.model_rebuild()
 
+# 背景 task 需保留參照，避免被 GC 回收
+_background_tasks = set()
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 # 啟動時初始化 DB
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    # 預先載入離線城市表，第一個航班請求不用付載入成本
+    gazetteer.warm_up()
+    # 背景預熱地理快取：既有航班用到的城市（不阻塞啟動）
+    _spawn(_warm_up_flight_cities())
+    # 背景重算因時間而過期的物化票價
+    _spawn(run_fare_refresher())
+    # 背景建立轉機搜尋用的航線圖，之後定期重建
+    _spawn(run_route_graph_refresher())
+    # 背景以滾動視窗產生重複規則的班次
+    _spawn(run_schedule_materializer())
+    # 背景依房型物化飯店最低價（搜尋不再寫入飯店）
+    _spawn(run_hotel_price_materializer())
+    # 背景建立飯店名稱自動完成索引，之後定期重建
+    _spawn(run_suggestion_index_refresher())
+    # 背景建立飯店篩選條件的點陣索引，之後定期重建
+    _spawn(run_facet_index_refresher())
+
+
+async def _warm_up_flight_cities():
+    try:
+        cities = await Flight.distinct("route.departureCity") + await Flight.distinct("route.arrivalCity")
+        resolved = await warm_up_city_cache(cities)
+        logging.info("geo cache warm-up: %s/%s cities resolved", resolved, len(set(cities)))
+    except Exception:
+        logging.exception("geo cache warm-up failed")
 
 # 設定 CORS
 app.add_middleware(
@@ -32,6 +77,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],  # 航班列表分頁游標、明細頁的 ETag
 )
 
 # 路由註冊
@@ -1,8 +1,9 @@
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional, Literal
-from pydantic import BaseModel, Field, ConfigDict
-from beanie import Document, PydanticObjectId, Indexed, before_event, Insert, Replace 
-from app.utils.flight_time_util import calculate_arrival_date
+from pydantic import BaseModel, Field, ConfigDict, PrivateAttr
+from beanie import Document, PydanticObjectId, Indexed, before_event, Insert, Replace, Save
+from app.utils.flight_time_util import arrival_calculator
+from app.utils.fare_engine import price_grid, to_utc
 
 
 class CabinClass(BaseModel):
@@ -40,6 +41,14 @@ class Schedule(BaseModel):
     arrival_date: Optional[datetime] = Field(default=None, alias="arrivalDate")
     available_seats: dict[str, int] = Field(alias="availableSeats")
     prices: dict[str, float] = Field(default_factory=dict)
+    # prices 的有效期限：早鳥折扣在這個時間點之後失效，需要重算；None 表示不會再因時間而變動
+    prices_valid_until: Optional[datetime] = Field(default=None, alias="pricesValidUntil")
+
+    def prices_stale(self, now: datetime) -> bool:
+        """已物化的票價是否需要重算（從未計算過，或已超過有效期限）"""
+        if not self.prices:
+            return True
+        return self.prices_valid_until is not None and to_utc(self.prices_valid_until) < now
 
 
 class Route(BaseModel):
@@ -49,6 +58,16 @@ class Route(BaseModel):
     flight_duration: int = Field(alias="flightDuration")
 
 
+class Recurrence(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    # RFC 5545 RRULE，例如 "FREQ=DAILY;UNTIL=20260301T000000"（以出發城市當地時間展開，見 app/utils/recurrence.py）
+    rule: str
+    # 第一個出發時間：出發城市當地時間（naive，存庫時不轉 UTC）
+    start: datetime
+    # 班次已產生到哪個時間點（UTC）；背景作業從這裡往後補到滾動視窗的終點
+    materialized_until: Optional[datetime] = Field(default=None, alias="materializedUntil")
+
+
 class Flight(Document):
     model_config = ConfigDict(populate_by_name=True)
     flight_number: Indexed(str, unique=True) = Field(alias="flightNumber")
@@ -56,6 +75,16 @@ class Flight(Document):
     cabin_classes: List[CabinClass] = Field(alias="cabinClasses")
     price_rules: PriceRules = Field(default_factory=PriceRules, alias="priceRules")
     schedules: List[Schedule] = Field(default_factory=list, alias="schedules")
+    # True 表示班次已移到 flightinstances collection，schedules 陣列為空（見 app/services/schedule_store.py）
+    schedules_external: bool = Field(default=False, alias="schedulesExternal")
+    # 重複規則：設定後由背景作業以滾動視窗產生班次（見 app/jobs/schedule_materializer.py）
+    recurrence: Optional[Recurrence] = None
+    # 文件版本：每次寫入都會 +1（含訂位時對內嵌班次的 $inc），與 updatedAt 一起產生明細頁的 ETag
+    version: int = 0
+    updated_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc), alias="updatedAt")
+
+    # 上次計算抵達時間時的路線與出發時間（不存進資料庫）
+    _arrival_basis: dict = PrivateAttr(default_factory=dict)
 
     class Settings:
         name = "flights"
@@ -97,35 +126,89 @@ class Flight(Document):
 
         return base_price * multiplier
 
-   
-    @before_event([Insert, Replace])  # 新增/覆寫都會跑，確保更新時也重算
+    def calculate_price_grid(
+        self,
+        departure_dates: List[datetime],
+        categories: Optional[List[str]] = None,
+        now: Optional[datetime] = None
+    ) -> List[dict[str, float]]:
+        """
+        批次版 calculate_final_price：一次計算所有出發時間 × 艙等的最終票價。
+        - 回傳與 departure_dates 同序的 [{category: price}, ...]
+        - 整批共用同一個「現在時間」，旺季以排序後的區間索引 bisect 查詢
+        """
+        return price_grid(self.cabin_classes, self.price_rules, departure_dates, categories, now)
+
+    def refresh_schedule_prices(self, now: Optional[datetime] = None, only_stale: bool = False) -> List[Schedule]:
+        """
+        把票價物化到 Schedule.prices（四捨五入後的售價），並記錄有效期限。
+        - 票價只有「早鳥」會隨時間改變：出發前 days_in_advance 天之後失效
+        - only_stale=True 時只重算過期的 schedule；回傳實際重算過的 schedules
+        """
+        now = now or datetime.now(timezone.utc)
+        targets = [s for s in self.schedules if not only_stale or s.prices_stale(now)]
+        if not targets:
+            return []
+
+        grid = self.calculate_price_grid([s.departure_date for s in targets], now=now)
+        need = timedelta(days=self.price_rules.early_bird_discount.days_in_advance)
+        for s, prices in zip(targets, grid):
+            s.prices = {category: round(raw) for category, raw in prices.items()}
+            dep = to_utc(s.departure_date)
+            s.prices_valid_until = dep - need if dep - now >= need else None
+        return targets
+
+    @before_event([Replace, Save])  # 整份覆寫時推進版本（insert 沿用預設值）
+    def touch(self):
+        self.version += 1
+        self.updated_at = datetime.now(timezone.utc)
+
+    @before_event([Insert, Replace, Save])  # 寫入航班時（含票價規則、艙等異動）重新物化所有票價
+    def materialize_schedule_prices(self):
+        self.refresh_schedule_prices()
+
+    def model_post_init(self, __context):
+        super().model_post_init(__context)
+        self._snapshot_arrival_basis()
+
+    def _arrival_route_key(self) -> tuple:
+        return (self.route.departure_city, self.route.arrival_city, self.route.flight_duration)
+
+    def _snapshot_arrival_basis(self):
+        """記下目前路線與每個 schedule 的出發時間，下次寫入時只重算有變動的 schedule"""
+        self._arrival_basis = {
+            "route": self._arrival_route_key(),
+            "departures": {s.id: s.departure_date for s in self.schedules if s.arrival_date is not None},
+        }
+
+    @before_event([Insert, Replace, Save])  # 新增/覆寫/儲存都會跑，確保更新時也重算
     async def fill_schedule_arrival_dates(self):
+        """
+        只重算「出發時間或路線有變動、或尚未有抵達時間」的 schedules
+        - 路線（城市、飛行時間）變動時全部重算
+        - 時區整個航班只解析一次；就地更新 schedule，保留原本的 _id（訂單以 scheduleId 參照）
+        """
         if not self.schedules:
             return
 
-        updated = []
+        basis = self._arrival_basis
+        known = basis.get("departures", {}) if basis.get("route") == self._arrival_route_key() else {}
+
+        calculate = None
         for s in self.schedules:
-            # 確保 departure_date 是 UTC-aware（你的 service 已轉 UTC，這裡保險再正規化）
-            dep = s.departure_date
-            if isinstance(dep, datetime):
-                dep = dep.replace(tzinfo=timezone.utc) if dep.tzinfo is None else dep.astimezone(timezone.utc)
-
-            # 計算抵達時間（轉為 UTC）
-            arr =  calculate_arrival_date(
-                dep,
-                self.route.flight_duration,
-                self.route.departure_city,
-                self.route.arrival_city,
-            )
-
-            if isinstance(arr, datetime):
-                arr = arr.replace(tzinfo=timezone.utc) if arr.tzinfo is None else arr.astimezone(timezone.utc)
-
-            updated.append(type(s)(
-                departure_date=dep,
-                arrival_date=arr,  # ← 覆寫為剛算出的值
-                available_seats=s.available_seats,
-                prices=s.prices,
-            ))
-
-        self.schedules = updated
+            if s.arrival_date is not None and s.id in known and known[s.id] == s.departure_date:
+                continue
+
+            if calculate is None:
+                calculate = arrival_calculator(
+                    self.route.departure_city,
+                    self.route.arrival_city,
+                    self.route.flight_duration,
+                )
+
+            # 確保 departure_date 是 UTC-aware（service 已轉 UTC，這裡保險再正規化）
+            dep = to_utc(s.departure_date)
+            s.departure_date = dep
+            s.arrival_date = calculate(dep)
+
+        self._snapshot_arrival_basis()
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import Field, ConfigDict
+from beanie import Document, PydanticObjectId
+from app.models.flight import Schedule
+
+
+class FlightInstance(Document):
+    """
+    單一航班班次（一個出發時間一筆文件），取代 Flight 內嵌的 schedules 陣列
+    - _id 沿用原本 Schedule 的 _id，訂單上的 scheduleId 不需要改
+    """
+    model_config = ConfigDict(populate_by_name=True)
+    flight_id: PydanticObjectId = Field(..., alias="flightId")
+    departure_date: datetime = Field(..., alias="departureDate")
+    arrival_date: Optional[datetime] = Field(default=None, alias="arrivalDate")
+    available_seats: dict[str, int] = Field(..., alias="availableSeats")
+    prices: dict[str, float] = Field(default_factory=dict)
+    prices_valid_until: Optional[datetime] = Field(default=None, alias="pricesValidUntil")
+    # 班次版本：訂位 / 退位時 +1（航班明細 ETag 以所有班次的版本合計判斷座位是否異動）
+    version: int = 0
+
+    class Settings:
+        name = "flightinstances"
+
+    def to_schedule(self) -> Schedule:
+        return Schedule(
+            id=self.id,
+            departure_date=self.departure_date,
+            arrival_date=self.arrival_date,
+            available_seats=self.available_seats,
+            prices=self.prices,
+            prices_valid_until=self.prices_valid_until,
+        )
+
+    @staticmethod
+    def document_from_schedule(flight_id: PydanticObjectId, schedule: Schedule) -> dict:
+        """Schedule → 要寫入 flightinstances 的原始文件（alias 欄位名）"""
+        doc = schedule.model_dump(by_alias=True)
+        doc["flightId"] = flight_id
+        return doc
@@ -40,6 +40,8 @@ class FlightOrder(Document):
         default="PENDING", alias="status"
     )
     payment_info: Optional[PaymentInfo] = Field(None, alias="paymentInfo")
+    # 後台批次取消時寫入的批次識別碼，用來統計該批次要歸還的座位
+    cancel_batch: Optional[str] = Field(None, alias="cancelBatch")
 
     created_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc), alias="createdAt")
     updated_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc), alias="updatedAt")
@@ -1,6 +1,6 @@
 from typing import Optional, List, Literal, TYPE_CHECKING
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from beanie import Document, Link
+from beanie import Document, Link, before_event, Insert, Replace, Save
 from datetime import datetime, timezone
 
 if TYPE_CHECKING:
@@ -12,6 +12,12 @@ class Coordinates(BaseModel):
     longitude: float = Field(..., alias="longitude")
 
 
+class GeoPoint(BaseModel):
+    """GeoJSON Point（2dsphere 索引用），座標順序為 [經度, 緯度]"""
+    type: Literal['Point'] = 'Point'
+    coordinates: List[float]
+
+
 class Facilities(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
     wifi: bool = Field(default=False, alias="wifi")
@@ -35,6 +41,8 @@ class Hotel(Document):
     desc: str = Field(..., alias="desc")
     rating: Optional[float] = Field(default=None, ge=0, le=10, alias="rating")
     cheapest_price: float = Field(..., alias="cheapestPrice")
+    # 所有房型任一晚的最低正價格（含假日價格），搜尋以 maxPrice 預先排除飯店時的下界；None 表示未知，不排除
+    min_nightly_price: Optional[float] = Field(default=None, alias="minNightlyPrice")
     popular_hotel: Optional[bool] = Field(default=False, alias="popularHotel")
     comments: Optional[int] = Field(default=0, alias="comments")
     facilities: Facilities = Field(default_factory=Facilities, alias="facilities")
@@ -45,15 +53,32 @@ class Hotel(Document):
     # email 欄位驗證 EmailStr 但因為資料庫有非@的 email，暫時改成 str
     nearby_attractions: List[str] = Field(..., alias="nearbyAttractions")
     phone: str = Field(..., alias="phone")
+    # coordinates 的 GeoJSON 鏡像，供 2dsphere 索引與 $geoNear 使用；寫入時由 coordinates 同步，不需自行設定
+    location: Optional[GeoPoint] = Field(default=None, alias="location")
     # 關聯房型（等同於 Node.js virtual populate）
     rooms: Optional[List[Link["Room"]]] = Field(default_factory=list)
 
     created_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc), alias="createdAt")
     updated_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc), alias="updatedAt")
-
+    # 文件版本：每次 save 都會 +1，與 updatedAt 一起產生明細頁的 ETag
+    version: int = 0
 
     class Settings:
         name = "hotels"
 
     def update_timestamp(self):
         self.updated_at = datetime.now(timezone.utc)
+
+    @before_event([Replace, Save])  # 任何整份寫回都推進版本與 updatedAt
+    def touch(self):
+        self.version += 1
+        self.update_timestamp()
+
+    @before_event([Insert, Replace, Save])
+    def sync_location(self):
+        """依 coordinates 產生 location；超出經緯度範圍的舊資料不建立（2dsphere 索引會拒絕寫入）"""
+        lat, lng = self.coordinates.latitude, self.coordinates.longitude
+        if -90 <= lat <= 90 and -180 <= lng <= 180:
+            self.location = GeoPoint(coordinates=[lng, lat])
+        else:
+            self.location = None
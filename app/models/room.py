@@ -1,9 +1,10 @@
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from typing import List, Literal, Optional
 from pydantic import BaseModel, Field, ConfigDict 
 from beanie import Document, PydanticObjectId
 from dateutil.parser import parse as parse_date
 from app.models.hotel import Hotel
+from app.utils.room_pricing import get_price_table
 
 
 class Service(BaseModel):
@@ -43,6 +44,8 @@ class Room(Document):
     payment_options: List[PaymentOption] = Field(..., alias="paymentOptions")
     pricing: List[WeekdayPricing] = Field(..., alias="pricing")
     holidays: List[HolidayPricing] = Field(..., alias="holidays")
+    # 此房型的間數：每晚最多可訂出的數量（見 app/services/room_inventory.py）
+    inventory: int = Field(default=1, ge=0, alias="inventory")
 
     created_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc), alias="createdAt")
     updated_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc), alias="updatedAt")
@@ -55,64 +58,12 @@ class Room(Document):
 
 
     def calculate_total_price(self, start_date: str, end_date: str) -> float:
-        """計算房型在指定日期區間的總價格"""
+        """計算房型在指定日期區間的總價格（查編譯好的價格表，見 app/utils/room_pricing.py）"""
         if not start_date or not end_date:
-            print("缺少日期參數")
             return 0.0
 
-        total_price = 0.0
-        current_date = parse_date(start_date).date()
-        end_date_obj = parse_date(end_date).date()
-        if current_date >= end_date_obj:
-            print("起訖日期不合法")
+        start = parse_date(start_date).date()
+        end = parse_date(end_date).date()
+        if start >= end:
             return 0.0
-
-        while current_date < end_date_obj:
-            date_str = current_date.isoformat()
-            node_day = (current_date.weekday() + 1) % 7  # Python週一=0 → Node週日=0
-            # print(f"📆 {date_str} (Node週={node_day})")
-
-            # 假日優先
-            holiday_price = None
-            for h in self.holidays or []:
-                if isinstance(h, dict):
-                    date_val, price_val = h.get("date"), h.get("price")
-                else:
-                    date_val, price_val = getattr(h, "date", None), getattr(h, "price", None)
-
-                if date_val == date_str:
-                    holiday_price = float(price_val.get("$numberInt", price_val)) if isinstance(price_val, dict) else float(price_val)
-                    break
-
-            if holiday_price is not None:
-                total_price += holiday_price
-            else:
-                found = False
-                for p in self.pricing or []:
-                    raw_days = p.get("days_of_week", []) if isinstance(p, dict) else getattr(p, "days_of_week", [])
-                    normalized_days = [
-                        int(d["$numberInt"]) if isinstance(d, dict) and "$numberInt" in d else int(d)
-                        for d in raw_days or []
-                    ]
-                    price_val = p.get("price") if isinstance(p, dict) else getattr(p, "price", None)
-                    price_value = float(price_val.get("$numberInt", price_val)) if isinstance(price_val, dict) else float(price_val or 0)
-
-                    if node_day in normalized_days:
-                        total_price += price_value
-                        found = True
-                        break
-
-                if not found:
-                    print(f"無匹配價格，略過")
-
-            current_date += timedelta(days=1)
-
-        print(f"總金額: {total_price}\n")
-        return total_price
-
-
-
-
-
-
-
+        return get_price_table(self).total(start, end)
@@ -6,8 +6,9 @@ from beanie import Document
 
 class User(Document):
     model_config = ConfigDict(populate_by_name=True)
-    username: str = Field(..., alias="username", unique=True)
-    email: EmailStr = Field(..., alias="email", unique=True)
+    # 唯一索引定義在 app/core/indexes.py
+    username: str = Field(..., alias="username")
+    email: EmailStr = Field(..., alias="email")
     password: str = Field(..., alias="password")  # hashed password
     is_admin: bool = Field(default=True, alias="isAdmin")
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from app.services.flight_service import (
     list_flights,
     create_flight,
@@ -10,8 +10,15 @@ from app.services.flight_service import (
     get_user_orders,
     get_order_detail,
     cancel_order,
+    cancel_schedule_orders,
+    search_connections,
+    get_fare_calendar,
 )
+from app.services.flight_import import import_flights_upload
 from app.services.auth_service import verify_token
+from app.utils import geo_cache
+from app.utils.response import success
+from app.utils import http_cache
 
 router = APIRouter(tags=["flights"])
 
@@ -40,15 +47,68 @@ async def route_get_order_detail_by_id(order_id: str):
 async def route_cancel_order_by_id(order_id: str, current_user=Depends(verify_token)):
     return await cancel_order(order_id, current_user["id"])
 
+# 後台：批次取消某班次的所有待付款訂單
+@router.post("/{flight_id}/schedules/{schedule_id}/cancelOrders")
+async def route_cancel_schedule_orders(flight_id: str, schedule_id: str, current_user=Depends(verify_token)):
+    return await cancel_schedule_orders(flight_id, schedule_id, current_user)
+
 
 
 
 # ----------- Flight 相關 -----------
 
+# 地理快取命中統計（每個 worker 各自計數，entries 為共用快取檔內的筆數）
+@router.get("/geoCacheStats")
+async def route_geo_cache_stats():
+    return success(data=geo_cache.stats())
+
+# 轉機行程搜尋（直飛 + 最多 maxStops 次轉機）
+@router.get("/connections")
+async def route_search_connections(
+    departureCity: str | None = Query(None),
+    arrivalCity: str | None = Query(None),
+    startDate: str | None = Query(None),   # 'YYYY-MM-DD'
+    endDate: str | None = Query(None),     # 'YYYY-MM-DD'
+    maxStops: int = Query(2, ge=0, le=2),
+    sortBy: str = Query("duration"),       # duration | price
+    category: str = Query("ECONOMY"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    return await search_connections(
+        departure_city=departureCity,
+        arrival_city=arrivalCity,
+        start_date=startDate,
+        end_date=endDate,
+        max_stops=maxStops,
+        sort_by=sortBy,
+        category=category,
+        limit=limit,
+    )
+
+# 票價月曆：每日最低票價（只列出有班次的日期）
+@router.get("/fareCalendar")
+async def route_get_fare_calendar(
+    departureCity: str | None = Query(None),
+    arrivalCity: str | None = Query(None),
+    startDate: str | None = Query(None),   # 'YYYY-MM-DD'
+    endDate: str | None = Query(None),     # 'YYYY-MM-DD'
+):
+    return await get_fare_calendar(
+        departure_city=departureCity,
+        arrival_city=arrivalCity,
+        start_date=startDate,
+        end_date=endDate,
+    )
+
 @router.post("")
 async def route_create_new_flight(payload: dict):
     return await create_flight(payload)
 
+# 後台：批次匯入航班（JSON 陣列，或 Content-Type: text/csv）
+@router.post("/import")
+async def route_import_flights(request: Request, current_user=Depends(verify_token)):
+    return await import_flights_upload(await request.body(), request.headers.get("content-type", ""), current_user)
+
 
 @router.put("/{flight_id}")
 async def route_update_flight_by_id(flight_id: str, payload: dict):
@@ -61,6 +121,9 @@ async def route_get_flight_list(
     arrivalCity: str | None = Query(None),
     startDate: str | None = Query(None),   # 'YYYY-MM-DD'
     endDate: str | None = Query(None),     # 'YYYY-MM-DD'
+    cursor: str | None = Query(None),      # 非搜尋模式：上一頁的 X-Next-Cursor
+    limit: int | None = Query(None, ge=1),
+    stream: bool = Query(False),           # 非搜尋模式：改回 NDJSON 串流
 ):
     # 對齊 Node：把 query 直接傳給 list_flights（snake 參數名對應）
     return await list_flights(
@@ -68,12 +131,16 @@ async def route_get_flight_list(
         arrival_city=arrivalCity,
         start_date=startDate,
         end_date=endDate,
+        cursor=cursor,
+        limit=limit,
+        stream=stream,
     )
 
 
 @router.get("/{flight_id}")
-async def route_get_flight_by_id(flight_id: str):
-    return await get_flight(flight_id)
+async def route_get_flight_by_id(flight_id: str, request: Request):
+    resp = await get_flight(flight_id, if_none_match=request.headers.get("if-none-match"))
+    return http_cache.apply_cache_control(resp, "flight.detail")
 
 @router.delete("/{flight_id}")
 async def route_delete_flight_by_id(flight_id: str):
@@ -1,7 +1,8 @@
 # app/routes/hotels.py
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from typing import Optional
 from app.services import hotel_service
+from app.utils import http_cache
 
 router = APIRouter(tags=["hotels"])
 
@@ -23,6 +24,17 @@ async def list_hotels(
     max_price: Optional[float] = Query(None, alias="maxPrice"),
     start_date: Optional[str] = Query(None, alias="startDate"),
     end_date: Optional[str] = Query(None, alias="endDate"),
+    lat: Optional[float] = Query(None),                          # 附近飯店：中心點
+    lng: Optional[float] = Query(None),
+    radius_km: Optional[float] = Query(None, alias="radiusKm"),
+    bbox: Optional[str] = Query(None),                           # 地圖可視範圍 minLng,minLat,maxLng,maxLat
+    sort: Optional[str] = Query(None),                           # price / rating / distance
+    cursor: Optional[str] = Query(None),                         # 上一頁回應的 X-Next-Cursor
+    limit: Optional[int] = Query(None, ge=1),
+    hotel_type: Optional[str] = Query(None, alias="type"),      # 以下皆可逗號分隔多個值
+    city: Optional[str] = Query(None),
+    rating: Optional[str] = Query(None),                         # 評分區間：9+ / 8+ / 7+ / 6+
+    facilities: Optional[str] = Query(None),                     # 需全部具備，例如 wifi,pool
 ):
 
     return await hotel_service.list_hotels(
@@ -33,8 +45,29 @@ async def list_hotels(
         max_price=max_price,
         start_date=start_date,
         end_date=end_date,
+        lat=lat,
+        lng=lng,
+        radius_km=radius_km,
+        bbox=bbox,
+        sort=sort,
+        cursor=cursor,
+        limit=limit,
+        hotel_type=hotel_type,
+        city=city,
+        rating=rating,
+        facilities=facilities,
     )
 
+#篩選條件的即時計數（條件同 /search 的 type / city / rating / facilities）
+@router.get("/facets")
+async def hotel_facets(
+    hotel_type: Optional[str] = Query(None, alias="type"),
+    city: Optional[str] = Query(None),
+    rating: Optional[str] = Query(None),
+    facilities: Optional[str] = Query(None),
+):
+    return await hotel_service.get_hotel_facets(hotel_type, city, rating, facilities)
+
 #獲取熱門飯店資訊 給首頁、精選區塊用
 @router.get("/popular")
 async def popular():
@@ -42,8 +75,9 @@ async def popular():
 
 #抓取其中一筆資料
 @router.get("/find/{id}")
-async def get_hotel(id: str):
-    return await hotel_service.get_hotel(id)
+async def get_hotel(id: str, request: Request):
+    resp = await hotel_service.get_hotel(id, if_none_match=request.headers.get("if-none-match"))
+    return http_cache.apply_cache_control(resp, "hotel.detail")
 
 #創建資料
 @router.post("/")
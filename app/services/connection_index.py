@@ -0,0 +1,143 @@
+# 轉機搜尋用的常駐航線圖（每個 worker 一份）
+# - 啟動時與背景作業定期整份重建（其他 worker 的異動靠這個同步）
+# - 本 worker 新增 / 更新 / 刪除航班時立即增量更新
+# - 重建期間的增量異動會記錄下來，重建完成後重放，避免被舊資料蓋掉
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+
+from app.core.config import settings
+from app.models.flight import Flight, Schedule
+from app.services import schedule_store
+from app.services.schedule_store import FLIGHT_HEADER_PROJECTION
+from app.utils.fare_engine import to_utc
+from app.utils.route_graph import Leg, RouteGraph
+
+
+_graph: Optional[RouteGraph] = None
+_pending: Optional[list] = None   # 重建進行中時的增量異動 [(flight_id, header, legs | None)]
+_build_lock = asyncio.Lock()
+
+
+def _legs(flight: Flight, schedules: List[Schedule], now: datetime) -> List[Leg]:
+    """只收已有抵達時間、且尚未出發的班次"""
+    legs = []
+    for s in schedules:
+        if s.arrival_date is None:
+            continue
+        departure = to_utc(s.departure_date)
+        if departure < now:
+            continue
+        legs.append(Leg(
+            departure=departure,
+            arrival=to_utc(s.arrival_date),
+            flight_id=flight.id,
+            flight_number=flight.flight_number,
+            schedule_id=s.id,
+            departure_city=flight.route.departure_city,
+            arrival_city=flight.route.arrival_city,
+            prices=s.prices,
+            prices_valid_until=s.prices_valid_until,
+        ))
+    return legs
+
+
+def _header(flight: Flight) -> Flight:
+    return flight.model_copy(update={"schedules": []})
+
+
+def _apply(graph: RouteGraph, flight_id: PydanticObjectId, header: Optional[Flight], legs: Optional[List[Leg]]):
+    if legs is None:
+        graph.remove_flight(flight_id)
+    else:
+        graph.upsert_flight(flight_id, header, legs)
+
+
+def _record(flight_id: PydanticObjectId, header: Optional[Flight], legs: Optional[List[Leg]]):
+    if _graph is not None:
+        _apply(_graph, flight_id, header, legs)
+    if _pending is not None:
+        _pending.append((flight_id, header, legs))
+
+
+def on_flight_saved(flight: Flight, schedules: List[Schedule]):
+    """航班寫入後呼叫（schedules 為完整班次，內嵌或 flightinstances 皆可）"""
+    _record(flight.id, _header(flight), _legs(flight, schedules, datetime.now(timezone.utc)))
+
+
+def on_flight_deleted(flight_id: PydanticObjectId):
+    _record(flight_id, None, None)
+
+
+async def rebuild() -> RouteGraph:
+    """從資料庫整份重建，完成後才替換目前的圖（搜尋不會看到建到一半的圖）"""
+    global _graph, _pending
+    async with _build_lock:
+        _pending = []
+        try:
+            graph = RouteGraph()
+            now = datetime.now(timezone.utc)
+            projection = {**FLIGHT_HEADER_PROJECTION, "schedules": 1}
+            async for doc in schedule_store.iter_listed_flights(batch_size=500, projection=projection):
+                raw_schedules = doc.pop("schedules")
+                flight = Flight.model_validate(doc)
+                schedules = [Schedule.model_validate(s) for s in raw_schedules]
+                graph.upsert_flight(flight.id, flight, _legs(flight, schedules, now))
+
+            for flight_id, header, legs in _pending:
+                _apply(graph, flight_id, header, legs)
+            _graph = graph
+        finally:
+            _pending = None
+    return _graph
+
+
+async def get_graph() -> RouteGraph:
+    if _graph is None:
+        await rebuild()
+    return _graph
+
+
+async def search(
+    origin: str,
+    destination: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    max_stops: int,
+    price_category: Optional[str] = None
+) -> List[Tuple[Tuple[Leg, ...], List[Dict[str, float]]]]:
+    """
+    搜尋轉機行程，回傳 [(legs, 每段的票價)]
+    - 票價優先用已物化的 Schedule.prices；過期的班次才用 calculate_price_grid 即時計算（與 calculate_final_price 相同）
+    - price_category：依此艙等總價排序時傳入，剪枝會把累計票價納入支配條件（沒有該艙等的班次視為無限大）
+    """
+    graph = await get_graph()
+    now = datetime.now(timezone.utc)
+    priced: Dict[PydanticObjectId, Dict[str, float]] = {}
+
+    def leg_prices(leg: Leg) -> Dict[str, float]:
+        if leg.schedule_id not in priced:
+            if leg.prices_stale(now):
+                grid = graph.flights[leg.flight_id].calculate_price_grid([leg.departure], now=now)[0]
+                priced[leg.schedule_id] = {category: round(raw) for category, raw in grid.items()}
+            else:
+                priced[leg.schedule_id] = leg.prices
+        return priced[leg.schedule_id]
+
+    def price_of(leg: Leg) -> float:
+        return leg_prices(leg).get(price_category, float("inf"))
+
+    paths = graph.search(
+        origin,
+        destination,
+        start_utc,
+        end_utc,
+        max_stops=max_stops,
+        min_connection=timedelta(minutes=settings.CONNECTION_MIN_MINUTES),
+        max_connection=timedelta(hours=settings.CONNECTION_MAX_HOURS),
+        max_expansions=settings.CONNECTION_MAX_EXPANSIONS,
+        price_of=price_of if price_category else None,
+    )
+    return [(path, [leg_prices(leg) for leg in path]) for path in paths]
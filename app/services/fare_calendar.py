@@ -0,0 +1,143 @@
+# 票價月曆：城市對在日期區間內「每個本地日 × 艙等」的最低票價
+# - 一次聚合取出區間內所有班次（內嵌與 flightinstances 兩種格式），再整批計價
+# - 結果快取在記憶體（每個 worker 一份），路線的班次或票價規則異動時失效
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+from app.core.config import settings
+from app.models.flight import Flight, Schedule
+from app.models.flight_instance import FlightInstance
+from app.utils.fare_engine import to_utc
+
+
+# (出發城市, 抵達城市) → 版本號；本 worker 寫入該路線的航班時遞增
+_route_versions: Dict[Tuple[str, str], int] = {}
+# (出發城市, 抵達城市, start_utc, end_utc, 時區) → (版本號, 到期時間, 結果)
+_cache: "OrderedDict[tuple, Tuple[int, datetime, List[dict]]]" = OrderedDict()
+
+
+def invalidate_route(departure_city: str, arrival_city: str):
+    """航班新增 / 更新 / 刪除後呼叫，讓該路線已快取的月曆失效"""
+    key = (departure_city, arrival_city)
+    _route_versions[key] = _route_versions.get(key, 0) + 1
+
+
+def fare_calendar_pipeline(
+    departure_city: str,
+    arrival_city: str,
+    start_utc: datetime,
+    end_utc: datetime
+) -> List[dict]:
+    """
+    - $match 城市對（route 索引）
+    - 內嵌 schedules 以 $filter 取區間內；已遷移航班以 $lookup 取 flightinstances（flightId + departureDate 索引）
+    - 兩者合併成同一個 schedules 陣列，只帶計價需要的欄位出資料庫
+    """
+    return [
+        {"$match": {
+            "route.departureCity": departure_city,
+            "route.arrivalCity": arrival_city,
+        }},
+        {"$lookup": {
+            "from": FlightInstance.Settings.name,
+            "let": {"flightId": "$_id"},
+            "pipeline": [
+                {"$match": {
+                    "$expr": {"$eq": ["$flightId", "$$flightId"]},
+                    "departureDate": {"$gte": start_utc, "$lte": end_utc},
+                }},
+                {"$project": {"flightId": 0}},
+            ],
+            "as": "instances",
+        }},
+        {"$project": {
+            "flightNumber": 1,
+            "route": 1,
+            "cabinClasses": 1,
+            "priceRules": 1,
+            "schedules": {"$concatArrays": [
+                {"$filter": {
+                    "input": {"$ifNull": ["$schedules", []]},
+                    "as": "s",
+                    "cond": {"$and": [
+                        {"$gte": ["$$s.departureDate", start_utc]},
+                        {"$lte": ["$$s.departureDate", end_utc]},
+                    ]},
+                }},
+                "$instances",
+            ]},
+        }},
+        {"$match": {"schedules.0": {"$exists": True}}},
+    ]
+
+
+async def _compute(
+    departure_city: str,
+    arrival_city: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    tz: ZoneInfo,
+    now: datetime
+) -> Tuple[List[dict], datetime]:
+    """回傳 (每日最低票價, 結果的有效期限)"""
+    docs = await Flight.aggregate(
+        fare_calendar_pipeline(departure_city, arrival_city, start_utc, end_utc)
+    ).to_list()
+
+    days: Dict[str, Dict[str, dict]] = {}
+    expires_at = now + timedelta(seconds=settings.FARE_CALENDAR_CACHE_TTL)
+    for doc in docs:
+        raw_schedules = doc.pop("schedules")
+        flight = Flight.model_validate(doc)
+        flight.schedules = [Schedule.model_validate(s) for s in raw_schedules]
+        # 只在記憶體中重算過期（或尚未物化）的票價，不寫回；有效期限一併算好
+        flight.refresh_schedule_prices(now=now, only_stale=True)
+
+        for s in flight.schedules:
+            if s.prices_valid_until is not None:
+                expires_at = min(expires_at, to_utc(s.prices_valid_until))
+            departure = to_utc(s.departure_date)
+            day = days.setdefault(departure.astimezone(tz).date().isoformat(), {})
+            for category, price in s.prices.items():
+                best = day.get(category)
+                if best is None or price < best["price"]:
+                    day[category] = {
+                        "price": price,
+                        "flightId": str(flight.id),
+                        "flightNumber": flight.flight_number,
+                        "scheduleId": str(s.id),
+                        "departureDate": departure.isoformat(),
+                    }
+
+    calendar = [{"date": date, "fares": days[date]} for date in sorted(days)]
+    return calendar, expires_at
+
+
+async def get_calendar(
+    departure_city: str,
+    arrival_city: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    tz: ZoneInfo
+) -> List[dict]:
+    """
+    取得月曆（有快取就直接回）
+    - 快取失效條件：本 worker 寫入過該路線、任一票價跨過早鳥期限、或超過 FARE_CALENDAR_CACHE_TTL（同步其他 worker 的異動）
+    """
+    now = datetime.now(timezone.utc)
+    key = (departure_city, arrival_city, start_utc, end_utc, tz.key)
+    version = _route_versions.get((departure_city, arrival_city), 0)
+
+    cached = _cache.get(key)
+    if cached and cached[0] == version and cached[1] > now:
+        _cache.move_to_end(key)
+        return cached[2]
+
+    calendar, expires_at = await _compute(departure_city, arrival_city, start_utc, end_utc, tz, now)
+    _cache[key] = (version, expires_at, calendar)
+    _cache.move_to_end(key)
+    while len(_cache) > settings.FARE_CALENDAR_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return calendar
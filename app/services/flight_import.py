@@ -0,0 +1,272 @@
+# 航班批次匯入（JSON / CSV）
+# - flightNumber 以一次 $in 查詢比對既有航班
+# - 不重複的出發城市只解析一次時區、不重複的城市對一次批次算飛行時間
+# - 依 FLIGHT_IMPORT_CHUNK_SIZE 分批 insert_many(ordered=False)，單筆失敗不影響同批其他航班
+# - 回傳逐筆錯誤與吞吐量
+import asyncio
+import csv
+import io
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from beanie import PydanticObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.models.flight import Flight, Schedule
+from app.services import schedule_store
+from app.services.flight_service import build_flight, on_flight_saved
+from app.utils.error_handler import raise_error
+from app.utils.flight_duration import calculate_flight_durations
+from app.utils.response import success
+from app.utils.timezone import get_time_zone_by_city
+
+
+# CSV 欄位：一列一個班次，同一 flightNumber 的多列合併成一個航班（航線與艙等取第一列）
+CSV_CABIN_COLUMNS = {
+    "ECONOMY": ("economyPrice", "economySeats"),
+    "BUSINESS": ("businessPrice", "businessSeats"),
+    "FIRST": ("firstPrice", "firstSeats"),
+}
+CSV_REQUIRED_COLUMNS = ("flightNumber", "departureCity", "arrivalCity", "departureDate")
+
+
+def parse_csv(text: str) -> Tuple[List[dict], List[List[int]], List[dict]]:
+    """
+    CSV → (航班資料列表, 每個航班來自哪些行號, 解析錯誤)
+    - departureDate 為出發城市當地時間 'YYYY-MM-DDTHH:mm:ss'；沒有班次的航班可留空
+    - 艙等欄位 economyPrice/economySeats、businessPrice/businessSeats、firstPrice/firstSeats，價格留空表示沒有該艙等
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    missing = [c for c in CSV_REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        return [], [], [{"line": 1, "message": f"缺少欄位：{', '.join(missing)}"}]
+
+    flights: Dict[str, dict] = {}
+    lines: Dict[str, List[int]] = {}
+    errors: List[dict] = []
+    rejected = set()
+    for line, row in enumerate(reader, start=2):
+        number = (row.get("flightNumber") or "").strip()
+        if not number:
+            errors.append({"line": line, "message": "缺少 flightNumber"})
+            continue
+        if number in rejected:
+            errors.append({"line": line, "flightNumber": number, "message": "同一航班的第一列資料有誤"})
+            continue
+
+        if number not in flights:
+            try:
+                cabin_classes = [
+                    {"category": category, "basePrice": float(row[price]), "totalSeats": int(row[seats])}
+                    for category, (price, seats) in CSV_CABIN_COLUMNS.items()
+                    if (row.get(price) or "").strip()
+                ]
+            except (TypeError, ValueError):
+                errors.append({"line": line, "flightNumber": number, "message": "艙等價格或座位數不是數字"})
+                rejected.add(number)
+                continue
+            flights[number] = {
+                "flightNumber": number,
+                "route": {
+                    "departureCity": (row.get("departureCity") or "").strip(),
+                    "arrivalCity": (row.get("arrivalCity") or "").strip(),
+                },
+                "cabinClasses": cabin_classes,
+                "schedules": [],
+            }
+            lines[number] = []
+
+        lines[number].append(line)
+        departure = (row.get("departureDate") or "").strip()
+        if departure:
+            flights[number]["schedules"].append({"departureDate": departure})
+
+    return list(flights.values()), [lines[n] for n in flights], errors
+
+
+async def _resolve_time_zones(cities: Iterable[str]) -> Dict[str, Optional[str]]:
+    """不重複的城市各解析一次（在執行緒池中依序執行，不阻塞 event loop、不對 Nominatim 併發）"""
+    loop = asyncio.get_running_loop()
+    return {city: await loop.run_in_executor(None, get_time_zone_by_city, city) for city in set(cities)}
+
+
+def _validate_row(row) -> Optional[str]:
+    if not isinstance(row, dict):
+        return "資料格式錯誤：每筆航班需為物件"
+    route = row.get("route")
+    if not row.get("flightNumber") or not isinstance(row["flightNumber"], str):
+        return "缺少 flightNumber"
+    if not isinstance(route, dict) or not route.get("departureCity") or not route.get("arrivalCity"):
+        return "缺少 route.departureCity / route.arrivalCity"
+    if not row.get("cabinClasses"):
+        return "缺少 cabinClasses"
+    return None
+
+
+async def import_flights(rows: List, chunk_size: Optional[int] = None) -> dict:
+    """
+    批次匯入航班（格式同 create_flight 的 payload）
+    回傳：
+      {
+        "total", "inserted", "failed",
+        "errors": [{"index": 第幾筆, "flightNumber", "message"}],
+        "elapsedMs", "rowsPerSecond"
+      }
+    """
+    started = time.perf_counter()
+    chunk_size = chunk_size or settings.FLIGHT_IMPORT_CHUNK_SIZE
+    errors: List[dict] = []
+
+    def fail(index: int, row, message: str):
+        number = row.get("flightNumber") if isinstance(row, dict) else None
+        errors.append({"index": index, "flightNumber": number, "message": message})
+
+    # 結構檢查 + 匯入資料內的重複 flightNumber
+    candidates: List[Tuple[int, dict]] = []
+    seen = set()
+    for index, row in enumerate(rows):
+        message = _validate_row(row)
+        if message is None and row["flightNumber"] in seen:
+            message = "flightNumber 在匯入資料中重複"
+        if message:
+            fail(index, row, message)
+            continue
+        seen.add(row["flightNumber"])
+        candidates.append((index, row))
+
+    # 既有 flightNumber：一次 $in
+    existing = set(await Flight.distinct("flightNumber", {"flightNumber": {"$in": list(seen)}})) if seen else set()
+
+    # 時區與飛行時間：不重複的城市 / 城市對各算一次
+    # 出發與抵達城市都先在執行緒池解析（結果有快取），之後計算抵達時間不會在 event loop 上查 Nominatim
+    time_zones = await _resolve_time_zones(
+        city for _, row in candidates for city in (row["route"]["departureCity"], row["route"]["arrivalCity"])
+    )
+    pairs = sorted({(row["route"]["departureCity"], row["route"]["arrivalCity"]) for _, row in candidates})
+    durations = dict(zip(pairs, await calculate_flight_durations(pairs)))
+
+    flights: List[Tuple[int, Flight]] = []
+    for index, row in candidates:
+        departure_city, arrival_city = row["route"]["departureCity"], row["route"]["arrivalCity"]
+        if row["flightNumber"] in existing:
+            fail(index, row, "flightNumber已存在")
+            continue
+        unresolved = [city for city in (departure_city, arrival_city) if not time_zones.get(city)]
+        if unresolved:
+            fail(index, row, f"找不到城市時區資訊：{', '.join(unresolved)}")
+            continue
+        duration = durations.get((departure_city, arrival_city))
+        if not duration:
+            fail(index, row, "無法自動推算 flightDuration，請確認城市名稱是否正確")
+            continue
+        try:
+            flights.append((index, build_flight(row, ZoneInfo(time_zones[departure_city]), duration)))
+        except Exception as e:
+            fail(index, row, f"資料格式錯誤：{e}")
+
+    inserted = 0
+    for start in range(0, len(flights), chunk_size):
+        inserted += await _insert_chunk(flights[start:start + chunk_size], fail)
+
+    elapsed = time.perf_counter() - started
+    errors.sort(key=lambda e: e["index"])
+    return {
+        "total": len(rows),
+        "inserted": inserted,
+        "failed": len(errors),
+        "errors": errors,
+        "elapsedMs": round(elapsed * 1000, 1),
+        "rowsPerSecond": round(len(rows) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+async def import_flights_csv(text: str, chunk_size: Optional[int] = None) -> dict:
+    """CSV 版 import_flights：錯誤以 CSV 行號（lines）標示，total 為合併後的航班數"""
+    rows, lines, parse_errors = parse_csv(text)
+    report = await import_flights(rows, chunk_size)
+    for error in report["errors"]:
+        error["lines"] = lines[error.pop("index")]
+    report["errors"] = parse_errors + report["errors"]
+    report["failed"] = len(report["errors"])
+    return report
+
+
+# 後台 API：Content-Type 為 text/csv 時以 CSV 解析，否則為 JSON 陣列（或 {"flights": [...]}）
+async def import_flights_upload(body: bytes, content_type: str, current_user: dict):
+    if not current_user.get("isAdmin"):
+        raise_error(403, "只有管理員可以批次匯入航班")
+
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise_error(400, "匯入資料需為 UTF-8 編碼")
+
+    if "csv" in (content_type or ""):
+        if text.count("\n") > settings.FLIGHT_IMPORT_MAX_ROWS:
+            raise_error(400, f"單次最多匯入 {settings.FLIGHT_IMPORT_MAX_ROWS} 列")
+        report = await import_flights_csv(text)
+    else:
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            raise_error(400, "匯入資料不是有效的 JSON")
+        rows = payload.get("flights") if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            raise_error(400, "匯入資料需為航班陣列")
+        if len(rows) > settings.FLIGHT_IMPORT_MAX_ROWS:
+            raise_error(400, f"單次最多匯入 {settings.FLIGHT_IMPORT_MAX_ROWS} 筆航班")
+        report = await import_flights(rows)
+
+    return success(data=report)
+
+
+async def _insert_chunk(chunk: List[Tuple[int, Flight]], fail) -> int:
+    """
+    一批航班 insert_many(ordered=False)
+    - insert_many 不會觸發 before_event，抵達時間與票價在這裡先算好
+    - 班次存到 flightinstances 時，只替寫入成功的航班寫入班次
+    """
+    external = settings.FLIGHT_SCHEDULE_STORE == "instances"
+    instances: Dict[PydanticObjectId, List[Schedule]] = {}
+    prepared: List[Tuple[int, Flight]] = []
+    for index, flight in chunk:
+        flight.id = PydanticObjectId()
+        try:
+            if external:
+                instances[flight.id] = await schedule_store.externalize_schedules(flight)
+            else:
+                await flight.fill_schedule_arrival_dates()
+                flight.refresh_schedule_prices()
+        except Exception as e:
+            # 城市時區已預先檢查，這裡只是保險：單筆失敗不影響整批匯入
+            fail(index, {"flightNumber": flight.flight_number}, f"無法計算抵達時間或票價：{e}")
+            continue
+        prepared.append((index, flight))
+    chunk = prepared
+    if not chunk:
+        return 0
+
+    failed: Dict[int, dict] = {}
+    try:
+        await Flight.insert_many([flight for _, flight in chunk], ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err for err in e.details.get("writeErrors", [])}
+
+    saved = []
+    for position, (index, flight) in enumerate(chunk):
+        err = failed.get(position)
+        if err is None:
+            saved.append(flight)
+        elif err.get("code") == 11000:
+            fail(index, {"flightNumber": flight.flight_number}, "flightNumber已存在")
+        else:
+            fail(index, {"flightNumber": flight.flight_number}, f"寫入失敗：{err.get('errmsg')}")
+
+    if external:
+        await schedule_store.insert_schedules({f.id: instances[f.id] for f in saved})
+    for flight in saved:
+        on_flight_saved(flight, instances.get(flight.id, flight.schedules))
+    return len(saved)
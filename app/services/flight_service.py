@@ -1,15 +1,91 @@
+import json
 from fastapi import HTTPException
-from typing import Optional, List
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Tuple
 from beanie import PydanticObjectId
 from zoneinfo import ZoneInfo
-from datetime import datetime, timezone, time
-from app.models.flight import Flight, CabinClass, Schedule, Route
+from datetime import datetime, timezone, time, timedelta
+from app.models.flight import Flight, CabinClass, Schedule, Route, Recurrence
 from app.models.flight_order import FlightOrder
-from app.utils.response import success
+from app.core.config import settings
+from app.services import schedule_store, connection_index, fare_calendar
+from app.utils.response import success, CustomJSONResponse
 from app.utils.error_handler import raise_error
+from app.utils import http_cache
 from app.utils.flight_time_util import calculate_arrival_date
 from app.utils.flight_duration import calculate_flight_duration
 from app.utils.timezone import get_time_zone_by_city
+from app.utils.recurrence import occurrences
+
+
+# 由前端傳入的航班資料建立 Flight（不寫入）：schedules 的 departureDate 為出發城市當地時間，轉成 UTC
+def build_flight(data: dict, tz: ZoneInfo, duration: int) -> Flight:
+    route = {**data.get("route"), "flightDuration": duration}
+    cabin_classes = data.get("cabinClasses")
+
+    fixed_schedules = []
+    for s in data.get("schedules", []):
+        local_naive = datetime.fromisoformat(s["departureDate"])   # 'YYYY-MM-DDTHH:mm:ss'
+        local_aware = local_naive.replace(tzinfo=tz)               # 指定為「出發城市當地時間」
+        utc_dt = local_aware.astimezone(timezone.utc)              # 轉成 UTC 存庫
+        available_seats = {c["category"]: c["totalSeats"] for c in cabin_classes}
+        fixed_schedules.append({
+            "departureDate": utc_dt,
+            "availableSeats": available_seats
+        })
+
+    flight_data = {
+        **data,
+        "route": route,
+        "schedules": fixed_schedules,
+        "cabinClasses": cabin_classes,
+        "recurrence": None
+    }
+    flight = Flight.model_validate(flight_data)
+    if data.get("recurrence"):
+        flight.schedules += start_recurrence(flight, data["recurrence"], tz)
+    return flight
+
+
+# 重複規則：展開 (after_utc, until_utc] 內的班次（座位為各艙等總座位數，抵達時間與票價由寫入時補上）
+# 回傳 (班次, 實際展開到的時間點)：達到 RECURRENCE_MAX_OCCURRENCES 上限時只算到最後一個產生的班次，
+# materializedUntil 只推進到那裡，剩下的由下一輪背景作業接著展開
+def expand_recurrence(
+    flight: Flight,
+    tz: ZoneInfo,
+    after_utc: datetime,
+    until_utc: datetime
+) -> Tuple[List[Schedule], datetime]:
+    limit = settings.RECURRENCE_MAX_OCCURRENCES
+    departures = occurrences(
+        flight.recurrence.rule,
+        flight.recurrence.start,
+        tz,
+        after_utc,
+        until_utc,
+        limit=limit,
+    )
+    covered_until = departures[-1] if len(departures) >= limit else until_utc
+    schedules = [
+        Schedule(departure_date=d, available_seats={c.category: c.total_seats for c in flight.cabin_classes})
+        for d in departures
+    ]
+    return schedules, covered_until
+
+
+# 設定重複規則，並立即產生第一個滾動視窗（SCHEDULE_HORIZON_DAYS 天）內的班次，之後由背景作業往後補
+def start_recurrence(flight: Flight, recurrence: dict, tz: ZoneInfo) -> List[Schedule]:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    horizon = now + timedelta(days=settings.SCHEDULE_HORIZON_DAYS)
+    try:
+        flight.recurrence = Recurrence.model_validate(recurrence)
+        if flight.recurrence.start.tzinfo is not None:
+            flight.recurrence.start = flight.recurrence.start.astimezone(tz).replace(tzinfo=None)
+        schedules, covered_until = expand_recurrence(flight, tz, now, horizon)
+    except ValueError as e:
+        raise_error(400, f"重複規則格式錯誤：{e}")
+    flight.recurrence.materialized_until = covered_until
+    return schedules
 
 
 # 創建新航班
@@ -20,7 +96,6 @@ async def create_flight(data: dict):
         raise_error(400, "flightNumber已存在")
 
     route = data.get("route")
-    schedules = data.get("schedules", [])
     cabin_classes = data.get("cabinClasses")
     if not cabin_classes:
         raise_error(400, "缺少 cabinClasses")
@@ -37,29 +112,19 @@ async def create_flight(data: dict):
     if not duration:
         raise_error(400, "無法自動推算 flightDuration，請確認城市名稱是否正確")
 
-    route["flightDuration"] = duration
-
-    fixed_schedules = []
-    for s in schedules:
-        local_naive = datetime.fromisoformat(s["departureDate"])   # 'YYYY-MM-DDTHH:mm:ss'
-        local_aware = local_naive.replace(tzinfo=tz)               # 指定為「出發城市當地時間」
-        utc_dt = local_aware.astimezone(timezone.utc)              # 轉成 UTC 存庫
-        available_seats = {c["category"]: c["totalSeats"] for c in cabin_classes}
-        fixed_schedules.append({
-            "departureDate": utc_dt,
-            "availableSeats": available_seats
-        })
-
-    flight_data = {
-        **data,
-        "route": route,
-        "schedules": fixed_schedules,
-        "cabinClasses": cabin_classes
-    }    
+    flight = build_flight(data, tz, duration)
+    if not schedule_store.use_instances(flight):
+        await flight.insert()
+        on_flight_saved(flight, flight.schedules)
+        return success(data=flight)
 
-    flight = Flight.model_validate(flight_data) 
+    # 班次存到 flightinstances：先決定航班 _id，再分別寫入航班與班次
+    flight.id = PydanticObjectId()
+    instances = await schedule_store.externalize_schedules(flight)
     await flight.insert()
-    return success(data=flight)
+    await schedule_store.write_schedules(flight.id, instances)
+    on_flight_saved(flight, instances)
+    return success(data={**flight.model_dump(by_alias=True), "schedules": instances})
 
 
 
@@ -72,6 +137,15 @@ async def update_flight(flight_id: str, data: dict):
     route = data.get("route", {})
     cabin_classes = data.get("cabinClasses")
     schedules = data.get("schedules")
+    recurrence = data.get("recurrence")
+    # 傳入 schedules 或新的重複規則時，班次整批替換
+    replace_schedules = bool(schedules) or bool(recurrence)
+
+    old_route = flight.route.model_copy()
+
+    # 已遷移的航班不把班次載回記憶體：整批替換時直接寫新班次，否則只對班次文件做定點更新
+    external = schedule_store.use_instances(flight)
+    was_external = flight.schedules_external
 
     if "departureCity" in route:
         tz_name = get_time_zone_by_city(route["departureCity"])
@@ -90,28 +164,122 @@ async def update_flight(flight_id: str, data: dict):
         flight.route.flight_duration = duration
         flight.route.arrival_city = route["arrivalCity"]
 
-    if schedules and flight.route.departure_city:
+    if ("recurrence" in data or schedules) and not recurrence:
+        # 停止產生新班次：明確清除規則，或以 schedules 整批替換班次但沒有給新規則（否則背景作業會繼續接在後面補班次）
+        flight.recurrence = None
+
+    if replace_schedules and flight.route.departure_city:
         tz_name = get_time_zone_by_city(flight.route.departure_city)
         if not tz_name:
             raise_error(400, f"找不到城市時區資訊：{flight.route.departure_city}")
         tz = ZoneInfo(tz_name)
 
         updated_schedules = []
-        for s in schedules:
+        for s in schedules or []:
             local_naive = datetime.fromisoformat(s["departureDate"])
             local_aware = local_naive.replace(tzinfo=tz)
             utc_dt = local_aware.astimezone(timezone.utc)
             # flight.cabin_classes 已經是 CabinClass 模型列表
             available_seats = {c.category: c.total_seats for c in flight.cabin_classes}
-            updated_schedules.append({
-                "departureDate": utc_dt,
-                "availableSeats": available_seats
-            })
+            updated_schedules.append(Schedule(
+                departure_date=utc_dt,
+                available_seats=available_seats
+            ))
+        if recurrence:
+            updated_schedules += start_recurrence(flight, recurrence, tz)
         flight.schedules = updated_schedules
 
+    if not external:
+        await flight.save()
+        on_flight_saved(flight, flight.schedules, old_route)
+        return success(data=flight)
+
+    if was_external and not replace_schedules:
+        # 班次不替換：只寫航班本身；路線或艙等有異動時才分批重算班次的抵達時間 / 票價（不動座位）
+        # 回應不含 schedules（不為了回應讀出全部班次），需要時改查航班明細
+        await flight.save()
+        route_changed = flight.route != old_route
+        if route_changed or cabin_classes:
+            upcoming = await schedule_store.recompute_instances(flight, arrivals=route_changed, prices=bool(cabin_classes))
+            on_flight_saved(flight, upcoming, old_route)
+        return success(data=flight.model_dump(by_alias=True, exclude={"schedules"}))
+
+    # 有傳 schedules / 重複規則，或第一次從內嵌轉出：整批寫入（含座位）
+    instances = await schedule_store.externalize_schedules(flight)
     await flight.save()
-    return success(data=flight)
+    await schedule_store.write_schedules(flight.id, instances)
+    on_flight_saved(flight, instances, old_route)
+    return success(data={**flight.model_dump(by_alias=True), "schedules": instances})
+
+
+
+# 航班寫入後：更新轉機航線圖、讓新舊路線的票價月曆快取失效
+def on_flight_saved(flight: Flight, schedules: List[Schedule], old_route: Optional[Route] = None):
+    connection_index.on_flight_saved(flight, schedules)
+    fare_calendar.invalidate_route(flight.route.departure_city, flight.route.arrival_city)
+    if old_route is not None:
+        fare_calendar.invalidate_route(old_route.departure_city, old_route.arrival_city)
+
+
+
+# 搜尋模式的聚合管線：路線 + 出發時間區間都在資料庫端過濾
+def search_flights_pipeline(
+    departure_city: str,
+    arrival_city: str,
+    start_utc: datetime,
+    end_utc: datetime
+) -> List[dict]:
+    """
+    - $match：城市對 + 至少一筆 schedule 落在 [start_utc, end_utc]（可走 route 索引）
+    - $project + $filter：只回傳區間內的 schedules，其餘欄位（艙等、價格規則）不出資料庫
+    """
+    in_window = {"$gte": start_utc, "$lte": end_utc}
+    return [
+        {"$match": {
+            "route.departureCity": departure_city,
+            "route.arrivalCity": arrival_city,
+            "schedules": {"$elemMatch": {"departureDate": in_window}},
+        }},
+        {"$project": {
+            "flightNumber": 1,
+            "route": 1,
+            "schedules": {"$filter": {
+                "input": "$schedules",
+                "as": "s",
+                "cond": {"$and": [
+                    {"$gte": ["$$s.departureDate", start_utc]},
+                    {"$lte": ["$$s.departureDate", end_utc]},
+                ]},
+            }},
+        }},
+    ]
+
+
+# 出發城市的「本地日界」→ UTC 區間：[start_date 00:00, end_date 23:59:59.999]，並回傳出發城市時區
+def _local_day_window(departure_city: str, start_date: str, end_date: str):
+    # 嚴格驗證日期格式
+    try:
+        start_d = datetime.strptime(start_date, "%Y-%m-%d").date()
+    except Exception:
+        raise_error(400, f"startDate 格式不正確：{start_date}（需 'YYYY-MM-DD'）")
+    try:
+        end_d = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except Exception:
+        raise_error(400, f"endDate 格式不正確：{end_date}（需 'YYYY-MM-DD'）")
 
+    # 依城市求時區（字串）→ 轉 ZoneInfo
+    tz_name = get_time_zone_by_city(departure_city)
+    if not tz_name:
+        raise_error(400, f"找不到城市時區資訊：{departure_city}")
+    tz = ZoneInfo(tz_name)
+
+    # 本地日界 → UTC
+    start_local = datetime.combine(start_d, time(0, 0, 0), tzinfo=tz)
+    end_local   = datetime.combine(end_d,   time(23, 59, 59, 999000), tzinfo=tz)
+    start_utc = start_local.astimezone(timezone.utc)
+    end_utc   = end_local.astimezone(timezone.utc)
+
+    return start_utc, end_utc, tz
 
 
 # 獲取所有航班列表 || (日期開始 && 日期結束 && 起飛城市 && 目的城市)
@@ -119,12 +287,19 @@ async def list_flights(
     departure_city: Optional[str] = None,
     arrival_city: Optional[str] = None,
     start_date: Optional[str] = None,   # 'YYYY-MM-DD'
-    end_date: Optional[str] = None      # 'YYYY-MM-DD'
+    end_date: Optional[str] = None,     # 'YYYY-MM-DD'
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    stream: bool = False
 ):
     """
     對齊 Node 版 getAllFlights：
     - 搜尋模式：四參數必填；用起飛城市時區把 start/end 的「本地日界」轉成 UTC，篩 schedule.departureDate（UTC）
-    - 非搜尋模式：回全部，但只回有至少一筆 schedule 的航班
+    - 非搜尋模式：只回有至少一筆 schedule 的航班
+      - 沒帶 cursor / limit：與原本相同，一次回傳全部
+      - 分頁（依 _id）：cursor 為上一頁回應 header X-Next-Cursor 的值；limit 為每頁筆數（上限 FLIGHT_PAGE_SIZE_MAX），
+        只帶 cursor 時每頁 FLIGHT_PAGE_SIZE 筆
+      - stream=True：改回 NDJSON 串流（從 cursor 之後直到結尾，或最多 limit 筆）
     """
     is_search_mode = any([departure_city, arrival_city, start_date, end_date])
 
@@ -133,84 +308,192 @@ async def list_flights(
         raise_error(400, "搜尋航班需要同時提供：出發地、目的地、起始時間、結束時間")
 
     if is_search_mode:
-        # 嚴格驗證日期格式
-        try:
-            start_d = datetime.strptime(start_date, "%Y-%m-%d").date()
-        except Exception:
-            raise_error(400, f"startDate 格式不正確：{start_date}（需 'YYYY-MM-DD'）")
-        try:
-            end_d = datetime.strptime(end_date, "%Y-%m-%d").date()
-        except Exception:
-            raise_error(400, f"endDate 格式不正確：{end_date}（需 'YYYY-MM-DD'）")
-
-        # 依城市求時區（字串）→ 轉 ZoneInfo
-        tz_name = get_time_zone_by_city(departure_city)
-        if not tz_name:
-            raise_error(400, f"找不到城市時區資訊：{departure_city}")
-        tz = ZoneInfo(tz_name)
+        start_utc, end_utc, _ = _local_day_window(departure_city, start_date, end_date)
 
-        # 本地日界 → UTC
-        start_local = datetime.combine(start_d, time(0, 0, 0), tzinfo=tz)
-        end_local   = datetime.combine(end_d,   time(23, 59, 59, 999000), tzinfo=tz)
-        start_utc = start_local.astimezone(timezone.utc)
-        end_utc   = end_local.astimezone(timezone.utc)
-
-        # 先用城市過濾，再在記憶體內以區間篩選 schedules
-        flights: List[Flight] = await Flight.find(
-            (Flight.route.departure_city == departure_city) &
-            (Flight.route.arrival_city == arrival_city)
+        # 篩選交給 MongoDB：$match 城市與區間，$filter 只留下區間內的 schedules
+        # 已遷移的航班改查 flightinstances（只撈區間內的小文件）
+        flights = await Flight.aggregate(
+            search_flights_pipeline(departure_city, arrival_city, start_utc, end_utc)
         ).to_list()
+        flights += await schedule_store.search_external_schedules(
+            departure_city, arrival_city, start_utc, end_utc
+        )
 
-        result = []
-        for f in flights:
-            filtered = []
-            for s in (f.schedules or []):
-                # 讀取 departureDate（兼容子模型或 dict）
-                dep = getattr(s, "departure_date", None)
-                if dep is None and isinstance(s, dict):
-                    dep = s.get("departureDate")
-                if not isinstance(dep, datetime):
-                    continue
-                # 若是 naive，視為 UTC；再確保是 UTC aware
-                if dep.tzinfo is None:
-                    dep = dep.replace(tzinfo=timezone.utc)
-                dep = dep.astimezone(timezone.utc)
-
-                if start_utc <= dep <= end_utc:
-                    filtered.append(s)
-
-            if filtered:
-                result.append({
-                    "_id": str(f.id),
-                    "flightNumber": f.flight_number,
-                    "route": f.route.model_dump(by_alias=True, exclude_none=True),
-                    "schedules": filtered
-                })
-
-        return success(result)
-
-    # 非搜尋模式：全部航班（只回有至少一筆 schedule 的）
-    flights: List[Flight] = await Flight.find_all().to_list()
+        return success([_flight_listing(f) for f in flights])
+
+    # 非搜尋模式：只回有至少一筆 schedule 的；帶 cursor / limit 時依 _id 做 keyset 分頁
+    after = _parse_flight_cursor(cursor)
+    if stream:
+        return StreamingResponse(_stream_flight_listings(after, limit), media_type="application/x-ndjson")
+
+    paginate = bool(cursor or limit)
+    limit = min(limit or settings.FLIGHT_PAGE_SIZE, settings.FLIGHT_PAGE_SIZE_MAX) if paginate else None
     result = []
-    for f in flights:
-        if f.schedules:
-            result.append({
-                "_id": str(f.id),
-                "flightNumber": f.flight_number,
-                "route": f.route.model_dump(by_alias=True, exclude_none=True),
-                "schedules": f.schedules
-            })
-    return success(data=result)
+    scanned = 0
+    last_id = None
+    async for f in schedule_store.iter_listed_flights(after, limit):
+        scanned += 1
+        last_id = f["_id"]
+        if f["schedules"]:
+            result.append(_flight_listing(f))
+
+    resp = success(data=result)
+    # 掃滿一頁代表後面可能還有：下一頁游標放在 header，data 維持原本的陣列格式
+    if paginate and scanned == limit:
+        resp.headers["X-Next-Cursor"] = str(last_id)
+    return resp
+
+
+def _parse_flight_cursor(cursor: Optional[str]) -> Optional[PydanticObjectId]:
+    if not cursor:
+        return None
+    try:
+        return PydanticObjectId(cursor)
+    except Exception:
+        raise_error(400, f"cursor 格式不正確：{cursor}")
+
+
+# 列表 / 搜尋回應中班次的欄位（內部欄位如 version、pricesValidUntil 不輸出）
+SCHEDULE_LISTING_FIELDS = ("_id", "departureDate", "arrivalDate", "availableSeats", "prices")
+
+
+def _flight_listing(f: dict) -> dict:
+    """列表 / 搜尋輸出格式（與原本 model_dump(exclude_none=True) 相同，省略值為 None 的欄位）"""
+    return {
+        "_id": str(f["_id"]),
+        "flightNumber": f["flightNumber"],
+        "route": {k: v for k, v in f["route"].items() if v is not None},
+        "schedules": [
+            {k: s[k] for k in SCHEDULE_LISTING_FIELDS if s.get(k) is not None}
+            for s in f["schedules"]
+        ],
+    }
+
+
+async def _stream_flight_listings(after: Optional[PydanticObjectId], limit: Optional[int]):
+    """NDJSON：一行一個航班，邊讀 Motor cursor 邊送出，不在記憶體累積整份列表"""
+    async for f in schedule_store.iter_listed_flights(after, limit):
+        if f["schedules"]:
+            line = json.dumps(_flight_listing(f), ensure_ascii=False, default=CustomJSONResponse.json_encoder)
+            yield (line + "\n").encode("utf-8")
+
+
+# 轉機行程搜尋（直飛、一次、兩次轉機），查詢常駐記憶體的航線圖，不逐一查詢轉機城市
+async def search_connections(
+    departure_city: Optional[str],
+    arrival_city: Optional[str],
+    start_date: Optional[str],   # 'YYYY-MM-DD'
+    end_date: Optional[str],     # 'YYYY-MM-DD'
+    max_stops: int = 2,
+    sort_by: str = "duration",
+    category: str = "ECONOMY",
+    limit: int = 20
+):
+    """
+    - 出發日區間與 list_flights 搜尋模式相同（出發城市本地日界）
+    - 每段轉機至少 CONNECTION_MIN_MINUTES 分鐘、至多 CONNECTION_MAX_HOURS 小時
+    - 總價為各段同艙等票價加總（只列出每段都有的艙等）
+    - sort_by="duration"：總飛行時間 → 轉機次數 → category 總價；"price"：category 總價 → 總飛行時間
+    """
+    if not all([departure_city, arrival_city, start_date, end_date]):
+        raise_error(400, "搜尋轉機航班需要同時提供：出發地、目的地、起始時間、結束時間")
+    if sort_by not in ("duration", "price"):
+        raise_error(400, f"sortBy 只能是 duration 或 price：{sort_by}")
+    if category not in SEAT_CATEGORIES:
+        raise_error(400, f"不支援的艙等：{category}")
+
+    start_utc, end_utc, _ = _local_day_window(departure_city, start_date, end_date)
+    found = await connection_index.search(
+        departure_city, arrival_city, start_utc, end_utc, max_stops,
+        price_category=category if sort_by == "price" else None,
+    )
+
+    itineraries = []
+    for legs, leg_prices in found:
+        categories = set(leg_prices[0]).intersection(*leg_prices[1:])
+        itineraries.append({
+            "departureDate": legs[0].departure.isoformat(),
+            "arrivalDate": legs[-1].arrival.isoformat(),
+            "durationMinutes": int((legs[-1].arrival - legs[0].departure).total_seconds() // 60),
+            "stops": len(legs) - 1,
+            "layoverMinutes": [
+                int((nxt.departure - prev.arrival).total_seconds() // 60)
+                for prev, nxt in zip(legs, legs[1:])
+            ],
+            "prices": {c: sum(p[c] for p in leg_prices) for c in categories},
+            "legs": [{
+                "flightId": str(leg.flight_id),
+                "flightNumber": leg.flight_number,
+                "scheduleId": str(leg.schedule_id),
+                "departureCity": leg.departure_city,
+                "arrivalCity": leg.arrival_city,
+                "departureDate": leg.departure.isoformat(),
+                "arrivalDate": leg.arrival.isoformat(),
+                "prices": prices,
+            } for leg, prices in zip(legs, leg_prices)],
+        })
+
+    def price_of(it):
+        return it["prices"].get(category, float("inf"))
+
+    if sort_by == "price":
+        itineraries.sort(key=lambda it: (price_of(it), it["durationMinutes"]))
+    else:
+        itineraries.sort(key=lambda it: (it["durationMinutes"], it["stops"], price_of(it)))
+    return success(data=itineraries[:limit])
+
+
+# 票價月曆：城市對在日期區間內，每個本地日（出發城市時區）× 艙等的最低票價
+async def get_fare_calendar(
+    departure_city: Optional[str],
+    arrival_city: Optional[str],
+    start_date: Optional[str],   # 'YYYY-MM-DD'
+    end_date: Optional[str]      # 'YYYY-MM-DD'
+):
+    if not all([departure_city, arrival_city, start_date, end_date]):
+        raise_error(400, "票價月曆需要同時提供：出發地、目的地、起始時間、結束時間")
+
+    start_utc, end_utc, tz = _local_day_window(departure_city, start_date, end_date)
+    days = (end_utc - start_utc).days + 1
+    if days < 1:
+        raise_error(400, "endDate 不可早於 startDate")
+    if days > settings.FARE_CALENDAR_MAX_DAYS:
+        raise_error(400, f"日期區間最多 {settings.FARE_CALENDAR_MAX_DAYS} 天")
+
+    calendar = await fare_calendar.get_calendar(departure_city, arrival_city, start_utc, end_utc, tz)
+    return success(data=calendar)
 
 
 # 獲取單個航班詳情
-async def get_flight(flight_id: str):
-    flight = await Flight.get(flight_id)
+async def get_flight(flight_id: str, if_none_match: Optional[str] = None):
+    try:
+        flight_oid = PydanticObjectId(flight_id)
+    except Exception:
+        raise_error(404, "找不到該航班")
+
+    # 先以版本欄位算出 ETag：與客戶端快取相同時直接回 304，不載入班次、不跑計價
+    # （在讀取資料之前取版本，回應內容只會比 ETag 新，不會讓客戶端留著舊資料卻帶新 ETag）
+    now = datetime.now(timezone.utc)
+    fingerprint = await schedule_store.get_flight_fingerprint(flight_oid, now)
+    if fingerprint is None:
+        raise_error(404, "找不到該航班")
+    etag = http_cache.make_etag(flight_oid, *fingerprint)
+    if http_cache.etag_matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+
+    flight = await Flight.get(flight_oid)
     if not flight:
         raise_error(404, "找不到該航班")
 
+    # 優先回傳已物化的票價；過期（或舊資料尚未物化）的班次才即時批次計算，不寫回
+    schedules = await schedule_store.get_schedules(flight)
+    stale = [s.prices_stale(now) for s in schedules]
+    live_prices = iter(flight.calculate_price_grid(
+        [s.departure_date for s, is_stale in zip(schedules, stale) if is_stale], now=now
+    ))
+
     formatted_schedules = []
-    for idx, s in enumerate(flight.schedules or []):
+    for idx, s in enumerate(schedules):
         # 取出出發/到達時間
         dep_dt = s.departure_date
         arr_dt = s.arrival_date
@@ -230,11 +513,9 @@ async def get_flight(flight_id: str):
         else:
             arr_dt = None  # 理論上你的 before_event 會補好，這裡保險處理
 
-        # 計算每個艙等的價格（await 你的 async 方法）
-        prices = {}
-        for c in flight.cabin_classes or []:
-            raw = await flight.calculate_final_price(c.category, dep_dt)
-            prices[c.category] = round(raw)
+        # 每個艙等的價格（四捨五入與逐筆計算相同）
+        raw_prices = next(live_prices) if stale[idx] else s.prices
+        prices = {category: round(raw) for category, raw in raw_prices.items()}
 
         # 取 schedule 的 _id/id（嵌入式模型預設沒有 id，就退回用索引）
         sched_id = (
@@ -251,12 +532,12 @@ async def get_flight(flight_id: str):
             "prices": prices,
         })
 
-    return success(data={
+    return http_cache.with_etag(success(data={
         "_id": str(flight.id),
         "flightNumber": flight.flight_number,
         "route": flight.route.model_dump(by_alias=True, exclude_none=True),  # camelCase: departureCity/arrivalCity/flightDuration
         "schedules": formatted_schedules,
-    })
+    }), etag)
 
 
 
@@ -266,6 +547,9 @@ async def delete_flight(flight_id: str):
     if not flight:
         raise_error(404, "找不到該航班")
     await flight.delete()
+    connection_index.on_flight_deleted(flight.id)
+    fare_calendar.invalidate_route(flight.route.departure_city, flight.route.arrival_city)
+    await schedule_store.delete_schedules(flight.id)
     return success(message="刪除成功")
 
 
@@ -282,6 +566,10 @@ async def get_all_flight_orders():
         raise_error(500, "獲取機票訂單失敗")
 
 
+# 艙等白名單：category 會組進欄位路徑（availableSeats.<category>），必須先驗證
+SEAT_CATEGORIES = ("ECONOMY", "BUSINESS", "FIRST")
+
+
 # 創建航班訂單 
 async def create_flight_order(data: dict, user_id: str):
     from uuid import uuid4
@@ -302,22 +590,8 @@ async def create_flight_order(data: dict, user_id: str):
     if not all([flight_id, category, passengers]):
         raise_error(400, "缺少必要的訂單信息")
 
-    # 找航班
-    flight = await Flight.get(flight_oid)
-    if not flight:
-        raise_error(404, "找不到該航班")
-
-    if not flight.schedules:
-        raise_error(404, "該航班沒有班次")
-
-    # 找到對應的 schedule
-    schedule = next((s for s in flight.schedules if str(s.id) == str(schedule_oid)), None)
-    if not schedule:
-        raise_error(404, f"找不到對應的班次 scheduleId={schedule_id}")
-
-    # 檢查座位
-    if schedule.available_seats.get(category, 0) < len(passengers):
-        raise_error(400, "座位數量不足")
+    if category not in SEAT_CATEGORIES:
+        raise_error(400, f"無效的艙等：{category}")
 
     # 檢查是否已有相同待處理的訂單
     query = {
@@ -333,32 +607,49 @@ async def create_flight_order(data: dict, user_id: str):
     if existing_order:
         raise_error(409, "您已有相同航班的待處理訂單")
 
-    # 計算價格
-    base_price = round(await flight.calculate_final_price(category, schedule.departure_date))
-    tax = round(base_price * 0.1)
-    total_price = round((base_price + tax) * len(passengers))
-
-    # 訂單編號
-    order_number = f"FO{str(uuid4()).split('-')[0]}"
-
-    order = FlightOrder(
-        userId=user_oid,         
-        flightId=flight_oid,      
-        orderNumber=order_number,
-        passengerInfo=passengers,
-        category=category,
-        scheduleId=schedule_oid, 
-        price={
-            "basePrice": base_price,
-            "tax": tax,
-            "totalPrice": total_price
-        }
-    )
-    await order.insert()
-
+    # 原子扣位（同時取回該班次與計價欄位）；失敗時再區分是找不到還是座位不足
+    reserved = await schedule_store.reserve_seats(flight_oid, schedule_oid, category, len(passengers))
+    if not reserved:
+        if not await Flight.find(Flight.id == flight_oid).count():
+            raise_error(404, "找不到該航班")
+        if not await schedule_store.schedule_exists(flight_oid, schedule_oid):
+            raise_error(404, f"找不到對應的班次 scheduleId={schedule_id}")
+        raise_error(400, "座位數量不足")
 
+    try:
+        flight, schedule = reserved
 
+        # 價格：使用已物化的票價，過期時才即時計算
+        if not schedule.prices_stale(datetime.now(timezone.utc)) and category in schedule.prices:
+            base_price = round(schedule.prices[category])
+        else:
+            base_price = round(await flight.calculate_final_price(category, schedule.departure_date))
+        tax = round(base_price * 0.1)
+        total_price = round((base_price + tax) * len(passengers))
+
+        # 訂單編號
+        order_number = f"FO{str(uuid4()).split('-')[0]}"
+
+        order = FlightOrder(
+            userId=user_oid,         
+            flightId=flight_oid,      
+            orderNumber=order_number,
+            passengerInfo=passengers,
+            category=category,
+            scheduleId=schedule_oid, 
+            price={
+                "basePrice": base_price,
+                "tax": tax,
+                "totalPrice": total_price
+            }
+        )
+        await order.insert()
+    except Exception:
+        # 訂單沒建立成功，把剛扣的座位還回去
+        await schedule_store.release_seats(flight_oid, schedule_oid, {category: len(passengers)})
+        raise
 
+    return success(data=order)
 
 
 
@@ -382,24 +673,68 @@ async def cancel_order(order_id: str, user_id: str):
     if not order:
         raise_error(404, "找不到該訂單")
 
-    if order.userId != user_id:
+    if str(order.user_id) != str(user_id):
         raise_error(403, "無權限取消此訂單")
 
     if order.status != "PENDING":
         raise_error(400, "只能取消待付款的訂單")
 
-    flight = await Flight.get(order.flightId)
-    if not flight:
-        raise_error(404, "找不到相關航班")
+    # 以 status=PENDING 為條件更新，併發重複取消時只有一個請求會成功（座位不會被歸還兩次）
+    now = datetime.now(timezone.utc)
+    result = await FlightOrder.find_one({"_id": order.id, "status": "PENDING"}).update(
+        {"$set": {"status": "CANCELLED", "updatedAt": now}}
+    )
+    if not result or not result.modified_count:
+        raise_error(400, "只能取消待付款的訂單")
 
-    schedule = next((s for s in flight.schedules if str(s["_id"]) == order.scheduleId), None)
-    if not schedule:
-        raise_error(404, "找不到對應航班班次")
+    # $inc 只動該班次的艙等座位，不整份覆寫航班
+    await schedule_store.release_seats(order.flight_id, order.schedule_id, {order.category: len(order.passenger_info)})
 
     order.status = "CANCELLED"
-    await order.save()
+    order.updated_at = now
+    return success(data=order)
 
-    schedule["availableSeats"][order.category] += len(order.passengerInfo)
-    await flight.save()
 
-    return success(data=order)
+# 後台用：批次取消某班次的所有待付款訂單（航班異動時使用）
+async def cancel_schedule_orders(flight_id: str, schedule_id: str, current_user: dict):
+    """
+    - 一次 update_many 把訂單標成 CANCELLED，並寫入本批次的 cancelBatch 識別碼
+    - 依 cancelBatch 聚合出各艙等要歸還的座位數（只算這一批真正被取消的訂單）
+    - 一次 $inc 歸還所有艙等座位
+    """
+    from uuid import uuid4
+
+    if not current_user.get("isAdmin"):
+        raise_error(403, "只有管理員可以批次取消訂單")
+
+    try:
+        flight_oid = PydanticObjectId(flight_id)
+        schedule_oid = PydanticObjectId(schedule_id)
+    except Exception:
+        raise_error(400, f"無效的 ObjectId: flightId={flight_id}, scheduleId={schedule_id}")
+
+    batch = uuid4().hex
+    now = datetime.now(timezone.utc)
+    await FlightOrder.find({
+        "flightId": flight_oid,
+        "scheduleId": schedule_oid,
+        "status": "PENDING",
+    }).update_many({"$set": {"status": "CANCELLED", "cancelBatch": batch, "updatedAt": now}})
+
+    released = await FlightOrder.aggregate([
+        {"$match": {"cancelBatch": batch}},
+        {"$group": {
+            "_id": "$category",
+            "orders": {"$sum": 1},
+            "seats": {"$sum": {"$size": "$passengerInfo"}},
+        }},
+    ]).to_list()
+
+    counts = {r["_id"]: r["seats"] for r in released}
+    await schedule_store.release_seats(flight_oid, schedule_oid, counts)
+
+    return success(data={
+        "cancelBatch": batch,
+        "cancelledOrders": sum(r["orders"] for r in released),
+        "releasedSeats": counts,
+    })
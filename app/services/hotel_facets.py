@@ -0,0 +1,128 @@
+# 飯店篩選條件（類型、城市、評分區間、設施）的常駐點陣索引（每個 worker 一份，見 app/utils/facet_index.py）
+# - 啟動時與背景作業定期整份重建（其他 worker 的異動靠這個同步）
+# - 本 worker 新增 / 更新 / 刪除飯店時立即增量更新
+# - 重建期間的增量異動會記錄下來，重建完成後重放，避免被舊資料蓋掉
+import asyncio
+from typing import Dict, List, Optional
+
+from beanie import PydanticObjectId
+from bson import ObjectId
+
+from app.db import get_db
+from app.models.hotel import Facilities, Hotel
+from app.utils.error_handler import raise_error
+from app.utils.facet_index import FacetIndex
+
+
+# 評分區間：「8+」代表評分 >= 8，區間彼此包含（9 分的飯店同時屬於 9+ / 8+ / 7+ / 6+）
+RATING_BUCKETS = (9, 8, 7, 6)
+FACILITIES = tuple(Facilities.model_fields)
+# 設施是「全部都要有」，其他 facet 是「任一符合」
+CONJUNCTIVE = ("facilities",)
+FACET_FIELDS = {"type": 1, "city": 1, "rating": 1, "facilities": 1}
+
+_index: Optional[FacetIndex] = None
+_pending: Optional[list] = None   # 重建進行中時的增量異動 [(hotel_id, facets | None)]
+_build_lock = asyncio.Lock()
+
+
+def hotel_facets(doc: dict) -> Dict[str, List[str]]:
+    """飯店文件（資料庫欄位名稱）→ {facet: [值]}"""
+    rating = doc.get("rating")
+    facilities = doc.get("facilities") or {}
+    return {
+        "type": [doc["type"]] if doc.get("type") else [],
+        "city": [doc["city"].strip()] if (doc.get("city") or "").strip() else [],
+        "rating": [f"{b}+" for b in RATING_BUCKETS if rating is not None and rating >= b],
+        "facilities": [f for f in FACILITIES if facilities.get(f)],
+    }
+
+
+def parse_selection(
+    hotel_type: Optional[str] = None,
+    city: Optional[str] = None,
+    rating: Optional[str] = None,
+    facilities: Optional[str] = None
+) -> Dict[str, List[str]]:
+    """查詢參數（逗號分隔的多個值）→ 篩選條件；沒有任何條件時回空 dict"""
+    def split(value: Optional[str]) -> List[str]:
+        return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+    selection = {"type": split(hotel_type), "city": split(city), "rating": split(rating), "facilities": split(facilities)}
+    unknown = [f for f in selection["facilities"] if f not in FACILITIES]
+    if unknown:
+        raise_error(400, f"未知的設施：{', '.join(unknown)}（可用：{', '.join(FACILITIES)}）")
+    buckets = {f"{b}+" for b in RATING_BUCKETS}
+    if any(r not in buckets for r in selection["rating"]):
+        raise_error(400, f"rating 需為 {' / '.join(f'{b}+' for b in RATING_BUCKETS)}")
+    return {facet: values for facet, values in selection.items() if values}
+
+
+def _apply(index: FacetIndex, hotel_id, facets: Optional[dict]):
+    if facets is None:
+        index.remove(hotel_id)
+    else:
+        index.upsert(hotel_id, facets)
+
+
+def _record(hotel_id, facets: Optional[dict]):
+    if _index is not None:
+        _apply(_index, hotel_id, facets)
+    if _pending is not None:
+        _pending.append((hotel_id, facets))
+
+
+def on_hotel_saved(hotel: Hotel):
+    _record(hotel.id, hotel_facets(hotel.model_dump(by_alias=True, include=set(FACET_FIELDS))))
+
+
+def on_hotel_deleted(hotel_id: PydanticObjectId):
+    _record(hotel_id, None)
+
+
+async def rebuild() -> FacetIndex:
+    """從資料庫整份重建（只讀 facet 需要的欄位），完成後才替換目前的索引"""
+    global _index, _pending
+    async with _build_lock:
+        _pending = []
+        try:
+            cursor = get_db()[Hotel.Settings.name].find({}, FACET_FIELDS)
+            items = [(doc["_id"], hotel_facets(doc)) async for doc in cursor]
+            index = FacetIndex.build(items, conjunctive=CONJUNCTIVE)
+            for hotel_id, facets in _pending:
+                _apply(index, hotel_id, facets)
+            _index = index
+        finally:
+            _pending = None
+    return _index
+
+
+async def get_index() -> FacetIndex:
+    if _index is None:
+        await rebuild()
+    return _index
+
+
+async def match_ids(selection: Dict[str, List[str]]) -> List[ObjectId]:
+    """符合篩選條件的飯店 _id（給搜尋的 _id $in 條件用）"""
+    index = await get_index()
+    return [ObjectId(hotel_id) for hotel_id in index.ids(index.match(selection))]
+
+
+async def facet_counts(selection: Dict[str, List[str]]) -> dict:
+    """
+    目前條件下各 facet 值的飯店數（筆數由多到少），以及符合全部條件的總數
+    計數只反映 facet 條件，名稱 / 價格 / 日期 / 位置等條件不列入
+    """
+    index = await get_index()
+    counts = index.counts(selection)
+    return {
+        "total": index.match(selection).bit_count(),
+        "facets": {
+            facet: [
+                {"value": value, "count": count}
+                for value, count in sorted(counts.get(facet, {}).items(), key=lambda kv: (-kv[1], kv[0]))
+            ]
+            for facet in FACET_FIELDS
+        },
+    }
@@ -0,0 +1,81 @@
+# 飯店最低價（cheapestPrice）物化：房型異動時標記飯店，由背景作業以 $set 重算；搜尋只讀不寫
+# - 最低價為該飯店所有房型「一般（非假日）每晚價格」的最小值；假日價格只適用特定日期，不列入
+# - 另外物化 minNightlyPrice（含假日價格的最低每晚價格），是搜尋以 maxPrice 預先排除飯店時可靠的下界；
+#   房型新增 / 更新時立即以 $min 壓低，其他 worker 不必等背景重算也不會誤排除
+# - 標記只存在本 worker 的記憶體；其他 worker 的房型異動由定期全量重算補上
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.db import get_db
+from app.models.hotel import Hotel
+from app.models.room import Room
+from app.utils.room_pricing import RoomPriceTable
+
+
+_dirty: Set[ObjectId] = set()
+
+
+def mark_dirty(*hotel_ids):
+    """房型新增 / 更新 / 刪除後呼叫：這些飯店的最低價會在下一輪背景作業重算"""
+    _dirty.update(ObjectId(str(h)) for h in hotel_ids if h)
+
+
+async def lower_price_floor(room: Room):
+    """
+    房型新增 / 更新後立即壓低飯店的 minNightlyPrice（條件式 $set，等同 $min）
+    - 飯店還沒有這個欄位（未知）時不寫入：單一房型的價格不是整間飯店的下界
+    - 價格調高不處理，由背景重算改成精確值（期間下界偏低只是少排除一些，結果仍正確）
+    """
+    floor = RoomPriceTable(room.pricing, room.holidays).floor()
+    if floor is None:
+        return
+    await get_db()[Hotel.Settings.name].update_one(
+        {"_id": ObjectId(str(room.hotel_id)), "minNightlyPrice": {"$gt": floor}},
+        {"$set": {"minNightlyPrice": floor, "updatedAt": datetime.now(timezone.utc)}, "$inc": {"version": 1}},
+    )
+
+
+def take_dirty() -> List[ObjectId]:
+    """取出並清空目前標記的飯店"""
+    hotel_ids = list(_dirty)
+    _dirty.clear()
+    return hotel_ids
+
+
+async def refresh_cheapest_prices(hotel_ids: Optional[Iterable[ObjectId]] = None) -> int:
+    """
+    重算飯店最低價（cheapestPrice）與價格下界（minNightlyPrice），hotel_ids 為 None 時重算所有有房型的飯店
+    - 房型只讀 hotelId、pricing 與 holidays，以 hotelId 索引（或全表串流）取回
+    - 只對有變動的飯店 $set（同時推進 version / updatedAt，明細頁 ETag 隨之改變）
+    - 房型全部刪除、或沒有任何有效價格的飯店保留原值
+    - 回傳實際更新的飯店數
+    """
+    query = {} if hotel_ids is None else {"hotelId": {"$in": list(hotel_ids)}}
+    if "hotelId" in query and not query["hotelId"]["$in"]:
+        return 0
+
+    fields: Dict[ObjectId, Dict[str, float]] = {}
+    cursor = get_db()[Room.Settings.name].find(query, {"hotelId": 1, "pricing": 1, "holidays": 1})
+    async for doc in cursor:
+        table = RoomPriceTable(doc.get("pricing"), doc.get("holidays"))
+        hotel = fields.setdefault(doc.get("hotelId"), {})
+        for field, price in (("cheapestPrice", table.baseline()), ("minNightlyPrice", table.floor())):
+            if price is not None and (field not in hotel or price < hotel[field]):
+                hotel[field] = price
+
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"_id": hotel_id, "$or": [{field: {"$ne": price}} for field, price in prices.items()]},
+            {"$set": {**prices, "updatedAt": now}, "$inc": {"version": 1}},
+        )
+        for hotel_id, prices in fields.items()
+        if prices
+    ]
+    if not ops:
+        return 0
+    result = await get_db()[Hotel.Settings.name].bulk_write(ops, ordered=False)
+    return result.modified_count
@@ -1,8 +1,14 @@
+from fastapi import HTTPException
+import logging
 from app.utils.response import success
 from app.models.hotel import Hotel
 from app.models.room import Room
 from app.utils.error_handler import raise_error
-from typing import Optional
+from app.utils import http_cache
+from app.services import hotel_facets, hotel_suggestions, room_inventory
+from app.core.config import settings
+from app.db import get_db
+from typing import Dict, List, Optional, Set, Tuple
 from beanie import PydanticObjectId, Link
 from pydantic import BaseModel
 from bson import DBRef, ObjectId
@@ -21,11 +27,18 @@ async def get_hotel_name_suggestions(name: str):
     if not name.strip():
         raise_error(400, "請輸入搜尋名稱")
 
-    hotels = await Hotel.find({
-        "name": {"$regex": name, "$options": "i"}
-    }, projection={"_id": 1, "name": 1}).limit(10).to_list()
+    # 查常駐的 n-gram 索引，不對資料庫下無法用索引的 $regex
+    return success(data=await hotel_suggestions.suggest(name))
 
-    return success(data=hotels)
+# 篩選條件的即時計數（類型 / 城市 / 評分區間 / 設施，查常駐的點陣索引）
+async def get_hotel_facets(
+    hotel_type: Optional[str] = None,
+    city: Optional[str] = None,
+    rating: Optional[str] = None,
+    facilities: Optional[str] = None
+):
+    selection = hotel_facets.parse_selection(hotel_type, city, rating, facilities)
+    return success(data=await hotel_facets.facet_counts(selection))
 
 # 查詢熱門飯店
 async def get_popular_hotels():
@@ -54,7 +67,264 @@ def clean_for_json(obj):
 
 
 
+# 飯店 + 房型一次取回：飯店一次 find（不含 rooms 關聯），所有房型一次 $in（hotel_id 索引）後在記憶體分組
+# 回傳 [(hotel, rooms)]，順序同飯店查詢結果
+async def fetch_hotels_with_rooms(query: dict) -> List[Tuple[Hotel, List[Room]]]:
+    docs = await get_db()[Hotel.Settings.name].find(query, {"rooms": 0}).to_list(length=None)
+    return await _attach_rooms(docs)
+
+
+async def _attach_rooms(docs: List[dict]) -> List[Tuple[Hotel, List[Room]]]:
+    if not docs:
+        return []
+
+    rooms_by_hotel: Dict[ObjectId, List[Room]] = {}
+    rooms = await Room.find({"hotelId": {"$in": [d["_id"] for d in docs]}}).to_list()
+    for room in rooms:
+        rooms_by_hotel.setdefault(room.hotel_id, []).append(room)
+
+    return [(Hotel.model_validate(d), rooms_by_hotel.get(d["_id"], [])) for d in docs]
+
+
+# 一間飯店在入住區間的可訂房型與最低總價（回應格式）；沒有房型回 None
+# 搜尋只讀不寫：資料庫中的 cheapestPrice 由背景作業依房型物化（見 app/services/hotel_price.py）
+def _price_hotel(hotel: Hotel, rooms: List[Room], start_date: Optional[str], end_date: Optional[str]) -> Optional[dict]:
+    if not rooms:
+        return None
+
+    cheapest_price = None
+    available_rooms = []
+    for room in rooms:
+        price = room.calculate_total_price(start_date, end_date)
+        if not price or price <= 0:
+            continue
+
+        if cheapest_price is None or price < cheapest_price:
+            cheapest_price = price
+
+        room_data = room.model_dump(by_alias=True, exclude_none=True)
+        room_data["hotelId"] = str(room.hotel_id)
+        room_data["roomTotalPrice"] = price
+        available_rooms.append(room_data)
+
+    hotel_data = hotel.model_dump(by_alias=True, exclude_none=True, exclude={"rooms"})
+    hotel_data["availableRooms"] = available_rooms
+    hotel_data["cheapestPrice"] = cheapest_price or hotel.cheapest_price or 0
+    return hotel_data
+
+
+def _in_price_range(hotel_data: dict, min_price: Optional[float], max_price: Optional[float]) -> bool:
+    price = hotel_data.get("cheapestPrice")
+    return (
+        price is not None
+        and (min_price is None or price >= min_price)
+        and (max_price is None or price <= max_price)
+    )
+
+
+# 附近飯店搜尋的條件：point + 半徑（公里），或地圖可視範圍 bbox='minLng,minLat,maxLng,maxLat'
+# - 只給 bbox 時以範圍中心排序距離；bbox 以經緯度範圍過濾（與地圖畫面一致），不含跨換日線的範圍
+# - 回傳 {"near": [lng, lat], "max_distance": 公尺 | None, "query": bbox 條件}；都沒給時回 None
+def parse_geo_filter(
+    lat: Optional[float],
+    lng: Optional[float],
+    radius_km: Optional[float],
+    bbox: Optional[str]
+) -> Optional[dict]:
+    if lat is None and lng is None and not bbox:
+        return None
+    if (lat is None) != (lng is None):
+        raise_error(400, "lat 與 lng 需同時提供")
+    if lat is not None and not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise_error(400, "lat / lng 超出範圍")
+
+    query = {}
+    near = [lng, lat] if lat is not None else None
+    max_distance = None
+    if bbox:
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+        except ValueError:
+            raise_error(400, "bbox 格式需為 minLng,minLat,maxLng,maxLat")
+        if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+            raise_error(400, "bbox 範圍不正確（不支援跨換日線）")
+        query = {
+            "coordinates.latitude": {"$gte": min_lat, "$lte": max_lat},
+            "coordinates.longitude": {"$gte": min_lng, "$lte": max_lng},
+        }
+        near = near or [(min_lng + max_lng) / 2, (min_lat + max_lat) / 2]
+
+    if not bbox or radius_km is not None:
+        radius_km = settings.HOTEL_NEAR_DEFAULT_RADIUS_KM if radius_km is None else radius_km
+        if not 0 < radius_km <= settings.HOTEL_NEAR_MAX_RADIUS_KM:
+            raise_error(400, f"radiusKm 需介於 0 到 {settings.HOTEL_NEAR_MAX_RADIUS_KM}")
+        max_distance = radius_km * 1000
+
+    return {"near": near, "max_distance": max_distance, "query": query}
+
+
+async def _available_rooms(
+    hotels: List[Tuple[Hotel, List[Room]]],
+    start_date: Optional[str],
+    end_date: Optional[str]
+) -> Optional[Set[ObjectId]]:
+    """本頁所有房型中，入住區間每晚都還有空房的房型（一次查庫存帳）；沒有指定日期時回 None（不過濾）"""
+    stay = room_inventory.stay_range(start_date, end_date)
+    if not stay:
+        return None
+    capacities = {room.id: room.inventory for _, rooms in hotels for room in rooms}
+    return await room_inventory.available_rooms(capacities, *stay)
+
+
+# 搜尋排序：sort 參數 → (排序欄位, 方向)；同值再以 _id 遞增排序，(欄位值, _id) 即為 keyset 游標
+# - price 依資料庫中物化的 cheapestPrice（每晚起價）排序，不是入住區間的總價
+# - rating 由高到低，沒有評分的飯店排在最後
+# - distance 只能用在附近飯店搜尋（$geoNear 產生的 distanceMeters 欄位；不用 distance，避免蓋掉 Hotel.distance）
+HOTEL_SORTS: Dict[str, Tuple[str, int]] = {
+    "price": ("cheapestPrice", 1),
+    "rating": ("rating", -1),
+    "distance": ("distanceMeters", 1),
+}
+
+
+def _after_filter(field: str, direction: int, after: Tuple[Optional[float], ObjectId]) -> dict:
+    """
+    排在 after=(欄位值, _id) 之後的條件（與 MongoDB 排序一致：null 小於任何數字）
+    - 遞增：null 在最前面；遞減：null 在最後面
+    """
+    value, last_id = after
+    same = {field: value, "_id": {"$gt": last_id}}
+    if value is None:
+        return {"$or": [same, {field: {"$ne": None}}]} if direction == 1 else same
+    if direction == 1:
+        return {"$or": [{field: {"$gt": value}}, same]}
+    return {"$or": [{field: {"$lt": value}}, same, {field: None}]}
+
+
+def _parse_hotel_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[float], ObjectId]]:
+    if not cursor:
+        return None
+    try:
+        value, hotel_id = cursor.rsplit(":", 1)
+        return (None if value == "None" else float(value)), ObjectId(hotel_id)
+    except Exception:
+        raise_error(400, f"cursor 格式不正確：{cursor}")
+
+
+def _price_prune(max_price: Optional[float], start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """
+    計價前先在資料庫排除不可能符合 maxPrice 的飯店（只排除能證明不符合的）
+    - 沒有入住日期：房型不計價，比對的就是資料庫中的 cheapestPrice，直接以它過濾
+    - 有入住日期：比對的是有計價房型的最低總價（都沒計價時退回 cheapestPrice）；
+      總價不會低於 minNightlyPrice（含假日價格的最低每晚價格），兩者都大於 maxPrice 才排除，
+      minNightlyPrice 未知（None / 尚未物化）的飯店不排除
+    minPrice 沒有可用的上界，只能在計價後過濾
+    """
+    if max_price is None:
+        return {}
+    if not start_date or not end_date:
+        return {"cheapestPrice": {"$lte": max_price}}
+    return {"$or": [
+        {"cheapestPrice": {"$lte": max_price}},
+        {"minNightlyPrice": {"$lte": max_price}},
+        {"minNightlyPrice": None},
+    ]}
+
+
+# 附近飯店：$geoNear（2dsphere 索引）帶出 distanceMeters 後再依 sort 排序；依距離排序時以 minDistance 跳過前幾頁
+def hotels_near_pipeline(
+    geo: dict,
+    query: dict,
+    sort: str,
+    after: Optional[Tuple[Optional[float], ObjectId]],
+    limit: int
+) -> List[dict]:
+    field, direction = HOTEL_SORTS[sort]
+    geo_near = {
+        "near": {"type": "Point", "coordinates": geo["near"]},
+        "key": "location",
+        "distanceField": "distanceMeters",
+        "spherical": True,
+        "query": {**query, **geo["query"]},
+    }
+    if geo["max_distance"] is not None:
+        geo_near["maxDistance"] = geo["max_distance"]
+    pipeline = [{"$geoNear": geo_near}]
+    if after is not None:
+        if sort == "distance":
+            geo_near["minDistance"] = after[0]
+        pipeline.append({"$match": _after_filter(field, direction, after)})
+    pipeline += [
+        {"$sort": {field: direction, "_id": 1}},
+        {"$limit": limit},
+        {"$project": {"rooms": 0}},
+    ]
+    return pipeline
+
+
+async def search_hotels(
+    query: dict,
+    geo: Optional[dict],
+    sort: str,
+    min_price: Optional[float],
+    max_price: Optional[float],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    after: Optional[Tuple[Optional[float], ObjectId]],
+    limit: int
+):
+    """
+    飯店搜尋的一頁：先在資料庫過濾（含 maxPrice 的預先排除）、排序、取 limit 筆，只對這一頁的飯店取房型與計價
+    - 有入住日期時，依庫存帳排除區間內已客滿的房型；房型全部客滿的飯店不列出
+    - 附近飯店搜尋時每筆多一個 distanceMeters（公尺）；飯店本身的 distance 欄位照原樣回傳
+    - minPrice / maxPrice 以計價後的 cheapestPrice 精確過濾，因此一頁可能少於 limit 筆
+    - 取滿一頁時，下一頁游標放在 header X-Next-Cursor
+    """
+    field, direction = HOTEL_SORTS[sort]
+    query = {**query, **_price_prune(max_price, start_date, end_date)}
+    collection = get_db()[Hotel.Settings.name]
+
+    if geo:
+        docs = await collection.aggregate(
+            hotels_near_pipeline(geo, query, sort, after, limit)
+        ).to_list(length=None)
+    else:
+        if after is not None:
+            query = {"$and": [query, _after_filter(field, direction, after)]}
+        docs = await collection.find(
+            query, {"rooms": 0}, sort=[(field, direction), ("_id", 1)], limit=limit
+        ).to_list(length=None)
+
+    next_cursor = None
+    if len(docs) == limit:
+        last = docs[-1]
+        next_cursor = f"{last.get(field)!r}:{last['_id']}"
+    distances = {d["_id"]: d.pop("distanceMeters") for d in docs} if geo else {}
+
+    hotels = await _attach_rooms(docs)
+    available = await _available_rooms(hotels, start_date, end_date)
+
+    result = []
+    for hotel, rooms in hotels:
+        if available is not None:
+            rooms = [r for r in rooms if r.id in available]
+        hotel_data = _price_hotel(hotel, rooms, start_date, end_date)
+        if hotel_data is None or not _in_price_range(hotel_data, min_price, max_price):
+            continue
+        if geo:
+            hotel_data["distanceMeters"] = round(distances[hotel.id])
+        result.append(hotel_data)
+
+    resp = success(data=clean_for_json(result), exclude_fields=["rooms"])
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+    return resp
+
+
 # 搜尋飯店資料 (依篩選條件)
+# - sort：price（預設）/ rating / distance（附近飯店搜尋預設）；帶 lat/lng 或 bbox 時為附近飯店搜尋
+# - cursor：上一頁回應 header X-Next-Cursor 的值；limit：每頁筆數（上限 HOTEL_PAGE_SIZE_MAX）
+# - hotel_type / city / rating（評分區間，如 8+）/ facilities：逗號分隔，先由點陣索引算出符合的飯店再交給資料庫
 async def list_hotels(
     name: Optional[str] = None,
     hotel_id: Optional[str] = None,
@@ -62,119 +332,104 @@ async def list_hotels(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    bbox: Optional[str] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    hotel_type: Optional[str] = None,
+    city: Optional[str] = None,
+    rating: Optional[str] = None,
+    facilities: Optional[str] = None
 ):
     query = {}
-    safe_data = []
 
     # 條件設定
     if name:
         query["name"] = {"$regex": name, "$options": "i"}
     if hotel_id:
+        if not ObjectId.is_valid(hotel_id):
+            raise_error(400, "hotelId 格式不正確")
         query["_id"] = ObjectId(hotel_id)
     if popular:
         query["popularHotel"] = True
 
-    print("🟡 hotel_id 傳入參數 =", hotel_id)
-    print("🟡 query =", query)
+    selection = hotel_facets.parse_selection(hotel_type, city, rating, facilities)
+    if selection:
+        ids = await hotel_facets.match_ids(selection)
+        if "_id" in query:
+            ids = [i for i in ids if i == query["_id"]]
+        query["_id"] = {"$in": ids}
+
+    geo = parse_geo_filter(lat, lng, radius_km, bbox)
+    sort = sort or ("distance" if geo else "price")
+    if sort not in HOTEL_SORTS:
+        raise_error(400, f"sort 需為 {' / '.join(HOTEL_SORTS)}")
+    if sort == "distance" and not geo:
+        raise_error(400, "依距離排序需提供 lat / lng 或 bbox")
+    after = _parse_hotel_cursor(cursor)
+    limit = min(limit or settings.HOTEL_PAGE_SIZE, settings.HOTEL_PAGE_SIZE_MAX)
+
+    # 附近飯店搜尋：參數已在上面驗證，$geoNear 的錯誤（例如缺少 2dsphere 索引）直接拋出，不當成查無結果
+    if geo:
+        return await search_hotels(query, geo, sort, min_price, max_price, start_date, end_date, after, limit)
+
     try:
         # 單查 hotel，不用房型與價格
         is_single_query = (
             hotel_id and not name and not min_price and not max_price and not start_date and not end_date
+            and not selection
         )
         if is_single_query:
             hotel = await Hotel.get(ObjectId(hotel_id))
             if not hotel:
                 raise_error(404, "找不到此飯店")
             return success(data=hotel)
-        
-        # 多查 hotel，需帶房型與價格
-        hotels = await Hotel.find(query).to_list()
-        if not hotels:
-            raise_error(404, "找不到符合條件的飯店")
-
-        updated_hotels = []
-        for hotel in hotels:
-            current_hotel_id = ObjectId(str(hotel.id))
-
-            # 若 query 中有 hotel_id，這裡自然只查該飯店的房型
-            rooms = await Room.find(Room.hotel_id == current_hotel_id).to_list()
-
-            if not rooms:
-                print(f"此飯店無房型: {hotel.name}")
-                continue
-
-            cheapest_price = None
-            available_rooms = []
-
-            for idx, room in enumerate(rooms):
-                print(f"➡️ 房型[{idx}]：{room.title}")
-                print(f"   🧩 start_date={start_date}, end_date={end_date}")
-
-                price = room.calculate_total_price(start_date, end_date)
-                print(f"   🧮 計算結果：{price}")
-
-                if not price or price <= 0:
-                    continue
 
-                if cheapest_price is None or price < cheapest_price:
-                    cheapest_price = price
+        # 多查 hotel：分頁後只對本頁的飯店帶房型與價格
+        return await search_hotels(query, geo, sort, min_price, max_price, start_date, end_date, after, limit)
 
-                room_data = room.model_dump(by_alias=True, exclude_none=True)
-                room_data["hotelId"] = str(
-                    getattr(room, "hotelId", getattr(room, "hotel_id", current_hotel_id))
-                )
-                room_data["roomTotalPrice"] = price
-                available_rooms.append(room_data)
+    except HTTPException:
+        raise
+    except Exception:
+        logging.exception("list_hotels 查詢失敗 query=%s", query)
 
-            # --- 更新最低價 ---
-            if cheapest_price is not None and (hotel.cheapest_price != cheapest_price):
-                try:
-                    hotel.cheapest_price = cheapest_price
-                    await hotel.save()
-                except Exception as e:
-                    print(f"⚠️ 更新 hotel.cheapest_price 失敗: {e}")
+    return success(data=[], exclude_fields=["rooms"])
 
-            hotel_data = hotel.model_dump(by_alias=True, exclude_none=True, exclude={"rooms"})
-            hotel_data["availableRooms"] = available_rooms
-            hotel_data["cheapestPrice"] = cheapest_price or hotel.cheapest_price or 0
-            updated_hotels.append(hotel_data)
 
-        if min_price is not None or max_price is not None:
-            updated_hotels = [
-                h for h in updated_hotels
-                if h.get("cheapestPrice") is not None
-                and (min_price is None or h["cheapestPrice"] >= min_price)
-                and (max_price is None or h["cheapestPrice"] <= max_price)
-            ]
-
-        safe_data = clean_for_json(updated_hotels)
-
-    except Exception as e:
-        import traceback
-        print(f"例外型別: {type(e)}")
-        print(f"例外內容: {e}")
-        print(traceback.format_exc())
-        safe_data = []
-
-    return success(data=safe_data, exclude_fields=["rooms"])
 
 
 
+# 取得單一飯店
+async def get_hotel(hotel_id: str, if_none_match: Optional[str] = None):
+    try:
+        hotel_oid = PydanticObjectId(hotel_id)
+    except Exception:
+        raise_error(404, "找不到該飯店")
 
+    # 先只讀版本欄位：與客戶端快取相同時直接回 304，不載入整份飯店資料
+    header = await get_db()[Hotel.Settings.name].find_one({"_id": hotel_oid}, {"version": 1, "updatedAt": 1})
+    if not header:
+        raise_error(404, "找不到該飯店")
+    etag = http_cache.make_etag(hotel_oid, header.get("version", 0), header.get("updatedAt"))
+    if http_cache.etag_matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
 
-# 取得單一飯店
-async def get_hotel(hotel_id: str):
-    hotel = await Hotel.get(hotel_id)
+    hotel = await Hotel.get(hotel_oid)
     if not hotel:
         raise_error(404, "找不到該飯店")
-    return success(data=hotel)
+    return http_cache.with_etag(success(data=hotel), etag)
 
 
 # 新增飯店
 async def create_hotel(data):
     hotel = Hotel(**data)
     await hotel.insert()
+    hotel_suggestions.on_hotel_saved(hotel)
+    hotel_facets.on_hotel_saved(hotel)
     return success(data=hotel)
 
 # 更新飯店
@@ -188,6 +443,8 @@ async def update_hotel(hotel_id: str, data: dict):
         setattr(hotel, k, v)
 
     await hotel.save()
+    hotel_suggestions.on_hotel_saved(hotel)
+    hotel_facets.on_hotel_saved(hotel)
     return success(data=hotel)
 
 
@@ -197,4 +454,6 @@ async def delete_hotel(hotel_id: str):
     if not hotel:
         raise_error(404, "找不到該飯店")
     await hotel.delete()
+    hotel_suggestions.on_hotel_deleted(hotel.id)
+    hotel_facets.on_hotel_deleted(hotel.id)
     return success(message="刪除成功")
@@ -0,0 +1,75 @@
+# 飯店名稱自動完成用的常駐索引（每個 worker 一份，見 app/utils/suggestion_index.py）
+# - 啟動時與背景作業定期整份重建（其他 worker 的異動靠這個同步）
+# - 本 worker 新增 / 更新 / 刪除飯店時立即增量更新
+# - 重建期間的增量異動會記錄下來，重建完成後重放，避免被舊資料蓋掉
+import asyncio
+from typing import List, Optional
+
+from beanie import PydanticObjectId
+
+from app.core.config import settings
+from app.db import get_db
+from app.models.hotel import Hotel
+from app.utils.suggestion_index import SuggestionIndex
+
+
+_index: Optional[SuggestionIndex] = None
+_pending: Optional[list] = None   # 重建進行中時的增量異動 [(hotel_id, (name, popular, rating) | None)]
+_build_lock = asyncio.Lock()
+
+
+def _apply(index: SuggestionIndex, hotel_id, fields: Optional[tuple]):
+    if fields is None:
+        index.remove(hotel_id)
+    else:
+        index.upsert(hotel_id, *fields)
+
+
+def _record(hotel_id, fields: Optional[tuple]):
+    if _index is not None:
+        _apply(_index, hotel_id, fields)
+    if _pending is not None:
+        _pending.append((hotel_id, fields))
+
+
+def on_hotel_saved(hotel: Hotel):
+    _record(hotel.id, (hotel.name, bool(hotel.popular_hotel), hotel.rating))
+
+
+def on_hotel_deleted(hotel_id: PydanticObjectId):
+    _record(hotel_id, None)
+
+
+async def rebuild() -> SuggestionIndex:
+    """從資料庫整份重建（只讀排名需要的欄位），完成後才替換目前的索引"""
+    global _index, _pending
+    async with _build_lock:
+        _pending = []
+        try:
+            cursor = get_db()[Hotel.Settings.name].find({}, {"name": 1, "popularHotel": 1, "rating": 1})
+            items = [
+                (doc["_id"], doc.get("name") or "", bool(doc.get("popularHotel")), doc.get("rating"))
+                async for doc in cursor
+            ]
+            index = SuggestionIndex.build(items)
+            for hotel_id, fields in _pending:
+                _apply(index, hotel_id, fields)
+            _index = index
+        finally:
+            _pending = None
+    return _index
+
+
+async def get_index() -> SuggestionIndex:
+    if _index is None:
+        await rebuild()
+    return _index
+
+
+async def suggest(name: str, limit: Optional[int] = None) -> List[dict]:
+    """名稱包含輸入字串的飯店（任意位置、不分大小寫與全半形），熱門優先、再依評分排序"""
+    index = await get_index()
+    return [
+        {"_id": hotel_id, "name": hotel_name}
+        for hotel_id, hotel_name in index.suggest(name, limit or settings.HOTEL_SUGGESTION_LIMIT)
+    ]
@@ -1,13 +1,41 @@
 from fastapi import HTTPException
-from beanie import PydanticObjectId
-from datetime import datetime, timezone
+from beanie import Link, PydanticObjectId
+from datetime import date, datetime, timezone
 from app.models.order import Order
 from app.models.hotel import Hotel
 from app.models.room import Room
 from app.models.user import User
 from app.utils.response import success
 from app.utils.error_handler import raise_error
-from typing import Dict, Optional
+from app.services import room_inventory
+from bson import DBRef, ObjectId
+from typing import Dict, Optional, Tuple
+
+
+# 會佔用房型庫存的訂單狀態
+HOLDING_STATUSES = ("pending", "confirmed")
+
+
+def ref_id(value) -> ObjectId:
+    """Order.hotelId / roomId 可能是 Link、DBRef 或 id 字串"""
+    if isinstance(value, Link):
+        value = value.ref
+    if isinstance(value, DBRef):
+        value = value.id
+    return ObjectId(str(value))
+
+
+def _holding(order: Order) -> Optional[Tuple[ObjectId, date, date]]:
+    """訂單目前佔用的庫存：(房型 _id, 入住日, 退房日)；已取消 / 已完成的訂單不佔用"""
+    if order.status not in HOLDING_STATUSES:
+        return None
+    stay = room_inventory.stay_range(order.check_in_date, order.check_out_date)
+    return (ref_id(order.room_id), *stay) if stay else None
+
+
+async def _reserve_room(room_id, start, end) -> bool:
+    room = await Room.get(room_id)
+    return bool(room) and await room_inventory.reserve(room.id, room.inventory, start, end)
 
 
 # 取得全部訂單
@@ -69,7 +97,20 @@ async def create_order(data: Dict, user: User):
         totalPrice=total_price_with_fee,
         createdAt=datetime.now(timezone.utc)
     )
-    await order.insert()
+
+    # 入住區間取自驗證後的訂單欄位，與之後取消 / 刪除時歸還的是同幾晚
+    stay = room_inventory.stay_range(order.check_in_date, order.check_out_date)
+    if not stay:
+        raise_error(400, "入住 / 退房日期不正確")
+    # 先扣庫存再建立訂單；同一晚同時搶最後一間時只有一筆會成功
+    if not await room_inventory.reserve(room.id, room.inventory, *stay):
+        raise_error(409, "此房型在入住期間已客滿")
+
+    try:
+        await order.insert()
+    except Exception:
+        await room_inventory.release(room.id, *stay)
+        raise
     return success(data=order, code=201)
 
 
@@ -80,9 +121,34 @@ async def update_order(order_id: str, data: Dict):
     if not order:
         raise_error(404, '訂單找不到')
 
+    before = _holding(order)
     for k, v in data.items():
         setattr(order, k, v)
-    await order.save()
+    after = _holding(order)
+
+    # 取消、或改了房型 / 日期：先歸還原本的庫存再扣新的
+    # 扣不到、或訂單寫入失敗時，新扣的還回去、原本的補回（訂單沒改成，原本那幾晚仍由它佔用）
+    changed = before != after
+    if changed:
+        if before:
+            await room_inventory.release(*before)
+        try:
+            if after and not await _reserve_room(*after):
+                raise_error(409, "此房型在入住期間已客滿")
+        except Exception:
+            if before:
+                await room_inventory.restore(*before)
+            raise
+
+    try:
+        await order.save()
+    except Exception:
+        if changed:
+            if after:
+                await room_inventory.release(*after)
+            if before:
+                await room_inventory.restore(*before)
+        raise
     return success(data=order)
 
 
@@ -93,5 +159,8 @@ async def delete_order(order_id: str):
     if not order:
         raise_error(404, '訂單找不到')
 
+    holding = _holding(order)
     await order.delete()
+    if holding:
+        await room_inventory.release(*holding)
     return success(message="訂單刪除成功")
@@ -0,0 +1,169 @@
+# 房型庫存帳（room-night ledger）：每個房型每個月一份文件，booked[日 - 1] 為該晚已訂出的間數
+# - _id = "<roomId>:<YYYY-MM>"，查詢與更新都走 _id 索引，不需要額外索引
+# - 可訂間數為 Room.inventory；帳上只記已訂數量，調整房型間數不用改帳
+# - 訂房：每個月份一次條件式 $inc（該月涉及的每一晚都還有空房才會寫入）；跨月訂房若後面月份失敗，已扣的月份補回
+# - 釋放：以 pipeline update 扣回並夾在 0 以上（帳建立前的舊訂單取消時不會變成負數）
+# - 日期一律以 UTC 日期為準：帶時區的時間先轉成 UTC，沒有時區的視為 UTC（與資料庫存回的 datetime 一致）
+# - 批次查詢 [start, end) 是否有空房：一次 _id $in 取回所有房型涉及的月份，每晚直接以索引比對
+import calendar
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from bson import ObjectId
+from dateutil.parser import parse as parse_date
+from pymongo import UpdateOne
+
+from app.db import get_db
+
+
+COLLECTION = "roominventory"
+
+
+def to_date(value: Union[str, datetime, date]) -> date:
+    """
+    訂單 / 查詢參數的日期可能是字串或 datetime，帳以日期（入住的那一晚）為單位
+    帶時區的先轉成 UTC 再取日期：請求字串與資料庫存回的 UTC datetime 會得到同一天，扣與還的是同幾晚
+    """
+    if isinstance(value, str):
+        value = parse_date(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date()
+    return value
+
+
+def stay_range(start, end) -> Optional[Tuple[date, date]]:
+    """入住區間 [start, end)；缺少日期或退房不晚於入住時回 None"""
+    if not start or not end:
+        return None
+    start, end = to_date(start), to_date(end)
+    return (start, end) if start < end else None
+
+
+def nights_by_month(start: date, end: date) -> Dict[str, List[int]]:
+    """[start, end) 的每晚依月份分組：{"YYYY-MM": [當月的日期索引]}"""
+    months: Dict[str, List[int]] = {}
+    day = start
+    while day < end:
+        months.setdefault(f"{day.year:04d}-{day.month:02d}", []).append(day.day - 1)
+        day += timedelta(days=1)
+    return months
+
+
+def ledger_id(room_id, month: str) -> str:
+    return f"{room_id}:{month}"
+
+
+def empty_month(month: str) -> List[int]:
+    year, mon = map(int, month.split("-"))
+    return [0] * calendar.monthrange(year, mon)[1]
+
+
+async def _ensure_months(collection, room_id: ObjectId, months: Iterable[str]):
+    """確保房型各月份的帳存在（booked 全 0）；已存在的不動"""
+    await collection.bulk_write([
+        UpdateOne(
+            {"_id": ledger_id(room_id, month)},
+            {"$setOnInsert": {"roomId": room_id, "month": month, "booked": empty_month(month)}},
+            upsert=True,
+        )
+        for month in months
+    ], ordered=False)
+
+
+async def _release_month(collection, room_id: ObjectId, month: str, days: List[int], quantity: int):
+    await collection.update_one(
+        {"_id": ledger_id(room_id, month)},
+        [{"$set": {"booked": {"$map": {
+            "input": {"$range": [0, {"$size": "$booked"}]},
+            "as": "i",
+            "in": {"$cond": [
+                {"$in": ["$$i", days]},
+                {"$max": [0, {"$subtract": [{"$arrayElemAt": ["$booked", "$$i"]}, quantity]}]},
+                {"$arrayElemAt": ["$booked", "$$i"]},
+            ]},
+        }}}}],
+    )
+
+
+async def reserve(room_id, capacity: int, start: date, end: date, quantity: int = 1) -> bool:
+    """
+    在 [start, end) 每晚各訂 quantity 間；任何一晚超過 capacity 時整段都不訂，回 False
+    同一個月份內是單一條件式 update，並發訂房不會超賣
+    """
+    months = nights_by_month(start, end)
+    if not months:
+        return True
+    if quantity > capacity:
+        return False
+
+    room_id = ObjectId(str(room_id))
+    collection = get_db()[COLLECTION]
+    await _ensure_months(collection, room_id, months)
+
+    reserved = []
+    for month, days in months.items():
+        result = await collection.update_one(
+            {"_id": ledger_id(room_id, month), **{f"booked.{d}": {"$lte": capacity - quantity} for d in days}},
+            {"$inc": {f"booked.{d}": quantity for d in days}},
+        )
+        if result.modified_count != 1:
+            for done in reserved:
+                await _release_month(collection, room_id, done, months[done], quantity)
+            return False
+        reserved.append(month)
+    return True
+
+
+async def release(room_id, start: date, end: date, quantity: int = 1):
+    """歸還 [start, end) 每晚各 quantity 間（取消訂單、或建立訂單失敗時的補償）"""
+    room_id = ObjectId(str(room_id))
+    collection = get_db()[COLLECTION]
+    for month, days in nights_by_month(start, end).items():
+        await _release_month(collection, room_id, month, days, quantity)
+
+
+async def restore(room_id, start: date, end: date, quantity: int = 1):
+    """
+    補回剛釋放、但訂單實際上仍佔用的庫存（改訂單失敗時的補償）：不檢查可訂間數，一定寫入
+    釋放後的空檔若已被其他訂單訂走，帳上會超過可訂間數，但與訂單的實際佔用一致
+    """
+    months = nights_by_month(start, end)
+    if not months:
+        return
+    room_id = ObjectId(str(room_id))
+    collection = get_db()[COLLECTION]
+    await _ensure_months(collection, room_id, months)
+    await collection.bulk_write([
+        UpdateOne({"_id": ledger_id(room_id, month)}, {"$inc": {f"booked.{d}": quantity for d in days}})
+        for month, days in months.items()
+    ], ordered=False)
+
+
+async def available_rooms(
+    capacities: Dict[ObjectId, int],
+    start: date,
+    end: date,
+    quantity: int = 1
+) -> Set[ObjectId]:
+    """
+    capacities={房型 _id: 可訂間數}；回傳 [start, end) 每晚都還有 quantity 間空房的房型
+    所有房型涉及的月份一次查回；沒有帳的月份代表還沒有任何訂房
+    """
+    months = nights_by_month(start, end)
+    rooms = {r for r, capacity in capacities.items() if capacity >= quantity}
+    if not months or not rooms:
+        return rooms
+
+    full: Set[ObjectId] = set()
+    cursor = get_db()[COLLECTION].find(
+        {"_id": {"$in": [ledger_id(r, m) for r in rooms for m in months]}},
+        {"roomId": 1, "month": 1, "booked": 1},
+    )
+    async for doc in cursor:
+        room_id, booked = doc["roomId"], doc["booked"]
+        limit = capacities[room_id] - quantity
+        if any(booked[d] > limit for d in months[doc["month"]]):
+            full.add(room_id)
+    return rooms - full
@@ -4,6 +4,7 @@ from app.models.room import Room
 from app.models.hotel import Hotel
 from app.utils.response import success
 from app.utils.error_handler import raise_error
+from app.services import hotel_price
 
 
 # 建立房型
@@ -14,6 +15,8 @@ async def create_room(data):
 
     room = Room(**data)
     await room.insert()
+    await hotel_price.lower_price_floor(room)
+    hotel_price.mark_dirty(room.hotel_id)
     return success(data=room)
 
 
@@ -30,6 +33,7 @@ async def update_room(room_id: str, data: dict):
     # model_dump: 把模型轉回 dict
     #   - exclude_unset=True: 只保留有提供的欄位 (適合做部分更新)
     #   - by_alias=True 時會用 alias 名稱輸出 (例如 roomType 而不是 room_type)
+    old_hotel_id = room.hotel_id
     update_data = Room.model_validate(data).model_dump(exclude_unset=True)
     for k, v in update_data.items():
         # setattr(room, "room_type", "Twin Room")  等於 room.room_type = "Twin Room"
@@ -38,6 +42,8 @@ async def update_room(room_id: str, data: dict):
 
     room.update_timestamp()
     await room.save()
+    await hotel_price.lower_price_floor(room)
+    hotel_price.mark_dirty(old_hotel_id, room.hotel_id)
 
     return success(data=room)
 
@@ -49,6 +55,7 @@ async def delete_room(room_id: str):
         raise_error(404, "找不到該房型")
 
     await room.delete()
+    hotel_price.mark_dirty(room.hotel_id)
     return success(message="刪除成功")
 
 
@@ -0,0 +1,419 @@
+# 航班班次的存取層：同時支援「內嵌在 Flight.schedules」與「flightinstances 獨立 collection」兩種格式
+# - 已遷移的航班 schedulesExternal=True，班次在 flightinstances；其餘仍讀內嵌陣列（相容讀取）
+# - service 只透過這裡讀寫班次，不直接碰 flight.schedules
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from app.core.config import settings
+from app.db import get_db
+from app.models.flight import EarlyBirdDiscount, Flight, Schedule
+from app.models.flight_instance import FlightInstance
+from app.utils.fare_engine import to_utc
+from app.utils.flight_time_util import arrival_calculator
+
+
+# 計價 / 回應所需的航班欄位（不含 schedules）
+FLIGHT_HEADER_PROJECTION = {
+    "flightNumber": 1,
+    "route": 1,
+    "cabinClasses": 1,
+    "priceRules": 1,
+    "schedulesExternal": 1,
+}
+
+# 航班列表所需的欄位（含內嵌 schedules）
+FLIGHT_LISTING_PROJECTION = {
+    "flightNumber": 1,
+    "route": 1,
+    "schedules": 1,
+    "schedulesExternal": 1,
+}
+
+
+def _flights():
+    return get_db()[Flight.Settings.name]
+
+
+def _instances():
+    return get_db()[FlightInstance.Settings.name]
+
+
+def use_instances(flight: Flight) -> bool:
+    """這個航班的班次是否該寫到 flightinstances（已遷移，或設定為新寫入一律用 instances）"""
+    return flight.schedules_external or settings.FLIGHT_SCHEDULE_STORE == "instances"
+
+
+# ----------- 讀取 -----------
+
+async def get_schedules(
+    flight: Flight,
+    start_utc: Optional[datetime] = None,
+    end_utc: Optional[datetime] = None
+) -> List[Schedule]:
+    """取航班的班次（可限定出發時間區間），依出發時間排序"""
+    if not flight.schedules_external:
+        schedules = flight.schedules or []
+        if start_utc or end_utc:
+            schedules = [
+                s for s in schedules
+                if (not start_utc or to_utc(s.departure_date) >= start_utc)
+                and (not end_utc or to_utc(s.departure_date) <= end_utc)
+            ]
+        return schedules
+
+    query = {"flightId": flight.id}
+    if start_utc or end_utc:
+        window = {}
+        if start_utc:
+            window["$gte"] = start_utc
+        if end_utc:
+            window["$lte"] = end_utc
+        query["departureDate"] = window
+    instances = await FlightInstance.find(query).sort("departureDate").to_list()
+    return [i.to_schedule() for i in instances]
+
+
+async def get_schedules_by_flight(flight_ids: Iterable[PydanticObjectId]) -> Dict[PydanticObjectId, List[dict]]:
+    """多個已遷移航班的班次（原始文件，不含 flightId），一次 $in 查詢後依航班分組"""
+    grouped: Dict[PydanticObjectId, List[dict]] = {}
+    cursor = _instances().find({"flightId": {"$in": list(flight_ids)}}).sort("departureDate", 1)
+    async for doc in cursor:
+        grouped.setdefault(doc.pop("flightId"), []).append(doc)
+    return grouped
+
+
+async def iter_listed_flights(
+    after: Optional[PydanticObjectId] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 100,
+    projection: Optional[dict] = None
+) -> AsyncIterator[dict]:
+    """
+    依 _id 遞增逐筆產出「至少可能有班次」的航班（原始文件 + schedules），直接讀 Motor cursor
+    - after：keyset 游標，只取 _id 大於它的航班；limit：最多掃描幾筆
+    - projection 預設為列表欄位；需包含 schedules 與 schedulesExternal
+    - 每 batch_size 筆一次 $in 補上已遷移航班的班次，記憶體只保留一個批次
+    - 已遷移但沒有任何班次的航班仍會產出（schedules 為空），由呼叫端決定是否略過
+    """
+    query: dict = {"$or": [{"schedules.0": {"$exists": True}}, {"schedulesExternal": True}]}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    cursor = _flights().find(
+        query,
+        projection or FLIGHT_LISTING_PROJECTION,
+        sort=[("_id", 1)],
+        limit=limit or 0,
+        batch_size=batch_size,
+    )
+
+    batch: List[dict] = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            for f in await _attach_external_schedules(batch):
+                yield f
+            batch = []
+    for f in await _attach_external_schedules(batch):
+        yield f
+
+
+async def _attach_external_schedules(flights: List[dict]) -> List[dict]:
+    """已遷移航班的 schedules 改從 flightinstances 補上（一次 $in），並移除 schedulesExternal 欄位"""
+    external_ids = [f["_id"] for f in flights if f.get("schedulesExternal")]
+    external = await get_schedules_by_flight(external_ids) if external_ids else {}
+    for f in flights:
+        if f.pop("schedulesExternal", False):
+            f["schedules"] = external.get(f["_id"], [])
+        else:
+            f.setdefault("schedules", [])
+    return flights
+
+
+async def search_external_schedules(
+    departure_city: str,
+    arrival_city: str,
+    start_utc: datetime,
+    end_utc: datetime
+) -> List[dict]:
+    """
+    已遷移航班的日期區間搜尋：先取路線相符的航班（不含班次），
+    再以 (flightId, departureDate) 索引只撈區間內的班次文件
+    """
+    flights = await _flights().find(
+        {
+            "route.departureCity": departure_city,
+            "route.arrivalCity": arrival_city,
+            "schedulesExternal": True,
+        },
+        {"flightNumber": 1, "route": 1},
+    ).to_list(length=None)
+    if not flights:
+        return []
+
+    grouped: Dict[PydanticObjectId, List[dict]] = {}
+    cursor = _instances().find({
+        "flightId": {"$in": [f["_id"] for f in flights]},
+        "departureDate": {"$gte": start_utc, "$lte": end_utc},
+    }).sort("departureDate", 1)
+    async for doc in cursor:
+        grouped.setdefault(doc.pop("flightId"), []).append(doc)
+
+    return [{**f, "schedules": grouped[f["_id"]]} for f in flights if f["_id"] in grouped]
+
+
+async def schedule_exists(flight_oid: PydanticObjectId, schedule_oid: PydanticObjectId) -> bool:
+    if await _is_external(flight_oid):
+        return bool(await FlightInstance.find({"_id": schedule_oid, "flightId": flight_oid}).count())
+    return bool(await Flight.find({"_id": flight_oid, "schedules._id": schedule_oid}).count())
+
+
+async def get_flight_fingerprint(flight_oid: PydanticObjectId, now: datetime) -> Optional[tuple]:
+    """
+    航班明細是否變動的判斷依據（不載入班次內容、不計價），找不到航班回 None
+    - 航班 version / updatedAt：整份寫入、內嵌班次的訂位與補班次都會推進
+    - 已遷移：班次數與各班次 version 合計（訂位只 $inc 班次文件，不動航班）
+    - 票價只會在出發前 daysInAdvance 天跨過早鳥門檻時改變：計入「已跨過門檻的班次數」，
+      與背景重算票價的時間點無關
+    """
+    header = await _flights().find_one(
+        {"_id": flight_oid},
+        {
+            "version": 1,
+            "updatedAt": 1,
+            "schedulesExternal": 1,
+            "priceRules.earlyBirdDiscount.daysInAdvance": 1,
+            "schedules.departureDate": 1,
+        },
+    )
+    if not header:
+        return None
+
+    early_bird = (header.get("priceRules") or {}).get("earlyBirdDiscount") or {}
+    days = early_bird.get("daysInAdvance", EarlyBirdDiscount().days_in_advance)
+    threshold = now + timedelta(days=days)
+
+    if not header.get("schedulesExternal"):
+        departures = [to_utc(s["departureDate"]) for s in header.get("schedules") or []]
+        schedules = (len(departures), 0, sum(1 for d in departures if d < threshold))
+    else:
+        rows = await _instances().aggregate([
+            {"$match": {"flightId": flight_oid}},
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "version": {"$sum": "$version"},
+                "passed": {"$sum": {"$cond": [{"$lt": ["$departureDate", threshold]}, 1, 0]}},
+            }},
+        ]).to_list(length=1)
+        schedules = (rows[0]["count"], rows[0]["version"], rows[0]["passed"]) if rows else (0, 0, 0)
+
+    return (header.get("version", 0), header.get("updatedAt"), *schedules)
+
+
+# ----------- 座位 -----------
+
+async def reserve_seats(
+    flight_oid: PydanticObjectId,
+    schedule_oid: PydanticObjectId,
+    category: str,
+    count: int
+) -> Optional[Tuple[Flight, Schedule]]:
+    """
+    原子扣位：單一條件式 update，座位不足時不會有任何寫入
+    - 依航班的 schedulesExternal 決定格式，不以 flightinstances 是否有文件判斷（遷移中途的複本不是正本）
+    - 已遷移：直接對班次文件 $inc，條件為 availableSeats.<category> >= count
+    - 內嵌：$elemMatch 條件 + 位置運算子 $inc 只動到指定 schedule 的指定艙等，不讀整份航班、不覆寫文件；
+      條件同時要求尚未切換，讀到旗標後才被遷移的航班改走已遷移的路徑
+    - 兩種格式都同時 $inc version（航班明細的 ETag 依此判斷座位異動）
+    - 成功回傳 (不含其他班次的 Flight, 扣位後的 Schedule)；失敗回 None
+    """
+    seats_path = f"availableSeats.{category}"
+
+    header = await _flights().find_one({"_id": flight_oid}, FLIGHT_HEADER_PROJECTION)
+    if not header:
+        return None
+
+    if not header.get("schedulesExternal"):
+        reserved = await _flights().find_one_and_update(
+            {
+                "_id": flight_oid,
+                "schedulesExternal": {"$ne": True},
+                "schedules": {"$elemMatch": {"_id": schedule_oid, seats_path: {"$gte": count}}},
+            },
+            {"$inc": {f"schedules.$.{seats_path}": -count, "version": 1}},
+            projection={**FLIGHT_HEADER_PROJECTION, "schedules": {"$elemMatch": {"_id": schedule_oid}}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if reserved:
+            flight = Flight.model_validate(reserved)
+            return flight, flight.schedules[0]
+        if not await _is_external(flight_oid):
+            return None
+
+    instance = await _instances().find_one_and_update(
+        {"_id": schedule_oid, "flightId": flight_oid, seats_path: {"$gte": count}},
+        {"$inc": {seats_path: -count, "version": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not instance:
+        return None
+    return Flight.model_validate(header), FlightInstance.model_validate(instance).to_schedule()
+
+
+async def release_seats(
+    flight_oid: PydanticObjectId,
+    schedule_oid: PydanticObjectId,
+    counts: Dict[str, int]
+) -> bool:
+    """
+    釋放座位（取消訂單、或建立訂單失敗時的補償）
+    counts: {category: 要歸還的座位數}；多個艙等合併成同一個 $inc
+    - 與 reserve_seats 相同，依 schedulesExternal 決定寫入內嵌陣列或 flightinstances
+    - 航班或班次已不存在時回 False
+    """
+    counts = {category: n for category, n in counts.items() if n}
+    if not counts:
+        return True
+
+    if not await _is_external(flight_oid):
+        result = await _flights().update_one(
+            {"_id": flight_oid, "schedulesExternal": {"$ne": True}, "schedules._id": schedule_oid},
+            {"$inc": {**{f"schedules.$.availableSeats.{category}": n for category, n in counts.items()}, "version": 1}},
+        )
+        if result.modified_count or not await _is_external(flight_oid):
+            return result.modified_count == 1
+
+    result = await _instances().update_one(
+        {"_id": schedule_oid, "flightId": flight_oid},
+        {"$inc": {**{f"availableSeats.{category}": n for category, n in counts.items()}, "version": 1}},
+    )
+    return result.modified_count == 1
+
+
+async def _is_external(flight_oid: PydanticObjectId) -> bool:
+    return bool(await _flights().count_documents({"_id": flight_oid, "schedulesExternal": True}, limit=1))
+
+
+# ----------- 寫入 -----------
+
+async def externalize_schedules(flight: Flight) -> List[Schedule]:
+    """
+    把 flight.schedules 移出文件：先算好抵達時間與票價（原本由 before_event 負責），
+    再清空內嵌陣列並標記 schedulesExternal，回傳要寫入 flightinstances 的班次
+    """
+    await flight.fill_schedule_arrival_dates()
+    flight.refresh_schedule_prices()
+    schedules = list(flight.schedules)
+    flight.schedules = []
+    flight.schedules_external = True
+    return schedules
+
+
+async def write_schedules(flight_id: PydanticObjectId, schedules: List[Schedule]):
+    """
+    整批替換已遷移航班的班次（含座位），並刪除不在清單中的舊班次
+    只更新計算欄位、不動座位的情況請用 recompute_instances
+    """
+    ops = []
+    for s in schedules:
+        doc = FlightInstance.document_from_schedule(flight_id, s)
+        doc.pop("_id")
+        ops.append(UpdateOne({"_id": s.id}, {"$set": doc}, upsert=True))
+
+    await _instances().delete_many({"flightId": flight_id, "_id": {"$nin": [s.id for s in schedules]}})
+    if ops:
+        await _instances().bulk_write(ops, ordered=False)
+
+
+async def recompute_instances(
+    flight: Flight,
+    arrivals: bool,
+    prices: bool,
+    batch_size: int = 500
+) -> List[Schedule]:
+    """
+    已遷移航班的路線 / 艙等異動後重算班次：分批讀 flightinstances，只 $set 抵達時間及/或票價
+    - 不把全部班次載入 flight.schedules，也不動座位（不會蓋掉同時進行的訂位）
+    - 回傳尚未出發的班次（轉機航線圖只需要這些）
+    """
+    now = datetime.now(timezone.utc)
+    calculate = None
+    if arrivals:
+        calculate = arrival_calculator(
+            flight.route.departure_city, flight.route.arrival_city, flight.route.flight_duration
+        )
+
+    async def flush(batch: List[Schedule]):
+        if prices:
+            flight.model_copy(update={"schedules": batch}).refresh_schedule_prices(now=now)
+        ops = []
+        for s in batch:
+            fields = {}
+            if calculate:
+                s.departure_date = to_utc(s.departure_date)
+                s.arrival_date = calculate(s.departure_date)
+                fields["arrivalDate"] = s.arrival_date
+            if prices:
+                fields["prices"] = s.prices
+                fields["pricesValidUntil"] = s.prices_valid_until
+            ops.append(UpdateOne({"_id": s.id}, {"$set": fields}))
+        if ops:
+            await _instances().bulk_write(ops, ordered=False)
+        upcoming.extend(s for s in batch if to_utc(s.departure_date) >= now)
+
+    upcoming: List[Schedule] = []
+    batch: List[Schedule] = []
+    cursor = _instances().find({"flightId": flight.id}, batch_size=batch_size)
+    async for doc in cursor:
+        batch.append(Schedule.model_validate(doc))
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    await flush(batch)
+    return upcoming
+
+
+async def insert_schedules(schedules_by_flight: Dict[PydanticObjectId, List[Schedule]]):
+    """新航班的班次一次 insert_many 寫入（批次匯入用；班次 _id 皆為新產生，不會衝突）"""
+    docs = [
+        FlightInstance.document_from_schedule(flight_id, s)
+        for flight_id, schedules in schedules_by_flight.items()
+        for s in schedules
+    ]
+    if docs:
+        await _instances().insert_many(docs, ordered=False)
+
+
+async def append_schedules(
+    flight: Flight,
+    schedules: List[Schedule],
+    expected_until: Optional[datetime],
+    new_until: datetime
+) -> bool:
+    """
+    重複規則產生的新班次：以 recurrence.materializedUntil 做樂觀鎖，多個 worker 同時執行時只有一個會寫入
+    - 內嵌：同一個 update $push 新班次並推進 materializedUntil（不覆寫既有班次的座位）
+    - 已遷移：先推進 materializedUntil，成功後才寫入 flightinstances
+    - 已被其他 worker 處理（materializedUntil 已變動）時回 False
+    """
+    update = {"$set": {"recurrence.materializedUntil": new_until}}
+    if not flight.schedules_external and schedules:
+        update["$push"] = {"schedules": {"$each": [s.model_dump(by_alias=True) for s in schedules]}}
+        update["$inc"] = {"version": 1}
+
+    result = await _flights().update_one(
+        {"_id": flight.id, "recurrence.materializedUntil": expected_until},
+        update,
+    )
+    if not result.modified_count:
+        return False
+    if flight.schedules_external:
+        await insert_schedules({flight.id: schedules})
+    return True
+
+
+async def delete_schedules(flight_id: PydanticObjectId):
+    await _instances().delete_many({"flightId": flight_id})
@@ -7,6 +7,7 @@ from passlib.hash import bcrypt
 from beanie import PydanticObjectId
 from typing import Dict
 from app.models.flight import Flight
+from app.db import get_db
 
 
 # 取得單一使用者與其訂單
@@ -26,10 +27,15 @@ async def get_user(user_id: str, current_user: User):
     #  航班訂單
     raw_flight_orders = await FlightOrder.find(FlightOrder.user_id == user_oid).to_list()
     all_flight_order = []
+    # 只需要航線資訊：一次 $in 查詢並只投影 route，不把航班的所有班次拉回來
+    flight_ids = list({order.flight_id for order in raw_flight_orders})
+    routes = {}
+    if flight_ids:
+        cursor = get_db()[Flight.Settings.name].find({"_id": {"$in": flight_ids}}, {"route": 1})
+        routes = {f["_id"]: f.get("route") async for f in cursor}
     for order in raw_flight_orders:
-        flight = await Flight.get(order.flight_id)
         order_data = order.model_dump(by_alias=True, exclude_none=True)
-        order_data["route"] = flight.route if flight else None
+        order_data["route"] = routes.get(order.flight_id)
         all_flight_order.append(order_data)
 
     return success(
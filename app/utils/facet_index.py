@@ -0,0 +1,145 @@
+# utils/facet_index.py
+# 篩選條件（facet）的點陣索引：每個項目分配一個連續的序號，每個 facet 值一個 bitset（Python int）
+# - 篩選：同一個 facet 內的值 OR（type=hotel 或 resort），不同 facet 之間 AND；conjunctive 的 facet 內也用 AND（設施：wifi 且 pool）
+# - 計數：每個值的 bitset 與篩選結果 AND 後 popcount；一般 facet 計數時排除自己的條件（可以看到「改選其他值」有幾筆）
+# - 刪除的序號會回收給之後新增的項目，序號保持緊密
+from typing import Dict, Hashable, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+
+def _bitset(ordinals: Iterable[int], size: int) -> int:
+    data = bytearray((size + 7) // 8)
+    for o in ordinals:
+        data[o >> 3] |= 1 << (o & 7)
+    return int.from_bytes(data, "little")
+
+
+def _ordinals(bits: int) -> Iterator[int]:
+    """bitset 中所有為 1 的序號（逐 byte 掃描，不對大整數反覆位移）"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for i, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield (i << 3) + low.bit_length() - 1
+            byte ^= low
+
+
+class FacetIndex:
+    def __init__(self, conjunctive: Iterable[str] = ()):
+        self._conjunctive: Set[str] = set(conjunctive)
+        self._ordinal: Dict[str, int] = {}                 # str(id) → 序號
+        self._items: List[Optional[Tuple[str, Dict[str, Tuple[str, ...]]]]] = []   # 序號 → (str(id), facets)
+        self._free: List[int] = []
+        self._alive = 0
+        self._bits: Dict[str, Dict[str, int]] = {}         # facet → 值 → bitset
+
+    def __len__(self) -> int:
+        return len(self._ordinal)
+
+    @classmethod
+    def build(
+        cls,
+        items: Iterable[Tuple[Hashable, Mapping[str, Iterable[str]]]],
+        conjunctive: Iterable[str] = ()
+    ) -> "FacetIndex":
+        """整批建立：先收集每個值的序號，再一次組成 bitset"""
+        index = cls(conjunctive)
+        postings: Dict[str, Dict[str, List[int]]] = {}
+        for item_id, facets in items:
+            key = str(item_id)
+            if key in index._ordinal:
+                continue
+            ordinal = len(index._items)
+            facets = {f: tuple(dict.fromkeys(values)) for f, values in facets.items()}
+            index._ordinal[key] = ordinal
+            index._items.append((key, facets))
+            for facet, values in facets.items():
+                for value in values:
+                    postings.setdefault(facet, {}).setdefault(value, []).append(ordinal)
+
+        size = len(index._items)
+        index._alive = (1 << size) - 1
+        index._bits = {
+            facet: {value: _bitset(ordinals, size) for value, ordinals in values.items()}
+            for facet, values in postings.items()
+        }
+        return index
+
+    def upsert(self, item_id: Hashable, facets: Mapping[str, Iterable[str]]):
+        self.remove(item_id)
+        key = str(item_id)
+        ordinal = self._free.pop() if self._free else len(self._items)
+        facets = {f: tuple(dict.fromkeys(values)) for f, values in facets.items()}
+        if ordinal == len(self._items):
+            self._items.append(None)
+        self._items[ordinal] = (key, facets)
+        self._ordinal[key] = ordinal
+
+        bit = 1 << ordinal
+        self._alive |= bit
+        for facet, values in facets.items():
+            bits = self._bits.setdefault(facet, {})
+            for value in values:
+                bits[value] = bits.get(value, 0) | bit
+
+    def remove(self, item_id: Hashable):
+        ordinal = self._ordinal.pop(str(item_id), None)
+        if ordinal is None:
+            return
+        _, facets = self._items[ordinal]
+        self._items[ordinal] = None
+        self._free.append(ordinal)
+
+        mask = ~(1 << ordinal)
+        self._alive &= mask
+        for facet, values in facets.items():
+            bits = self._bits[facet]
+            for value in values:
+                bits[value] &= mask
+                if not bits[value]:
+                    del bits[value]
+
+    def _facet_mask(self, facet: str, values: Iterable[str]) -> int:
+        bits = self._bits.get(facet, {})
+        if facet in self._conjunctive:
+            mask = self._alive
+            for value in values:
+                mask &= bits.get(value, 0)
+            return mask
+        mask = 0
+        for value in values:
+            mask |= bits.get(value, 0)
+        return mask
+
+    def match(self, selection: Mapping[str, Iterable[str]]) -> int:
+        """符合所有已選條件的項目 bitset；沒有任何條件時為全部項目"""
+        mask = self._alive
+        for facet, values in selection.items():
+            if values:
+                mask &= self._facet_mask(facet, values)
+        return mask
+
+    def ids(self, bits: int) -> List[str]:
+        """bitset 對應的項目 id（str），依序號排序"""
+        return [self._items[o][0] for o in _ordinals(bits)]
+
+    def counts(self, selection: Mapping[str, Iterable[str]]) -> Dict[str, Dict[str, int]]:
+        """
+        每個 facet 值在目前條件下的筆數：{facet: {值: 筆數}}
+        一般 facet 以「其他 facet 的條件」為基準計數；conjunctive 的 facet 以全部條件為基準（再勾選一項後剩幾筆）
+        """
+        masks = {f: self._facet_mask(f, values) for f, values in selection.items() if values}
+        everything = self._alive
+        for mask in masks.values():
+            everything &= mask
+
+        result: Dict[str, Dict[str, int]] = {}
+        for facet, values in self._bits.items():
+            if facet in self._conjunctive or facet not in masks:
+                base = everything
+            else:
+                base = self._alive
+                for f, mask in masks.items():
+                    if f != facet:
+                        base &= mask
+            result[facet] = {value: (bits & base).bit_count() for value, bits in values.items()}
+        return result
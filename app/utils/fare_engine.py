@@ -0,0 +1,91 @@
+# utils/fare_engine.py
+# 批次票價計算：一次算完「所有 schedule × 所有艙等」，結果與 Flight.calculate_final_price 逐筆計算相同
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# 旺季區間是「含頭含尾」，轉成半開區間 [start, end + 1µs) 方便切段
+_RESOLUTION = timedelta(microseconds=1)
+
+
+def to_utc(dt: datetime) -> datetime:
+    """naive 視為 UTC，aware 轉成 UTC"""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+class PeakSeasonIndex:
+    """
+    旺季區間索引：把可能重疊的旺季切成互不重疊的小段，每段預先決定乘數
+    - 與逐筆計算一致：同一時間落在多個旺季時，取 peak_season_dates 中「最先出現」的那個
+    - 查詢為 bisect，O(log n)
+    """
+
+    def __init__(self, periods: Sequence):
+        intervals = [(to_utc(p.start), to_utc(p.end) + _RESOLUTION, p.multiplier) for p in periods]
+        self.bounds: List[datetime] = sorted({t for s, e, _ in intervals for t in (s, e)})
+        self.multipliers: List[Optional[float]] = []
+        for left in self.bounds:
+            hit = next((m for s, e, m in intervals if s <= left < e), None)
+            self.multipliers.append(hit)
+
+    def multiplier_at(self, dep: datetime) -> Optional[float]:
+        """dep 需為 UTC-aware；不在任何旺季回 None"""
+        i = bisect_right(self.bounds, dep) - 1
+        return self.multipliers[i] if i >= 0 else None
+
+
+def schedule_multipliers(
+    price_rules,
+    departure_dates: Sequence[datetime],
+    now: Optional[datetime] = None
+) -> List[float]:
+    """
+    計算每個出發時間的總乘數（與艙等無關，所以每個 schedule 只算一次）
+    - 乘法順序與 calculate_final_price 相同（旺季 → 假日 → 早鳥），確保浮點結果一致
+    """
+    now = now or datetime.now(timezone.utc)
+    peak = PeakSeasonIndex(price_rules.peak_season_dates)
+    holiday = price_rules.holiday_multiplier
+    early_bird = price_rules.early_bird_discount
+    early_bird_cutoff = now + timedelta(days=early_bird.days_in_advance)
+
+    result = []
+    for raw in departure_dates:
+        dep = to_utc(raw)
+        multiplier = 1.0
+        peak_multiplier = peak.multiplier_at(dep)
+        if peak_multiplier is not None:
+            multiplier *= peak_multiplier
+        if dep.weekday() in (5, 6):
+            multiplier *= holiday
+        # dep - now >= timedelta(days=n)  ⇔  dep >= now + timedelta(days=n)
+        if dep >= early_bird_cutoff:
+            multiplier *= early_bird.discount
+        result.append(multiplier)
+    return result
+
+
+def price_grid(
+    cabin_classes: Sequence,
+    price_rules,
+    departure_dates: Sequence[datetime],
+    categories: Optional[Sequence[str]] = None,
+    now: Optional[datetime] = None
+) -> List[Dict[str, float]]:
+    """
+    回傳與 departure_dates 同序的價格表：[{category: price, ...}, ...]
+    - categories 預設為航班所有艙等；不存在的艙等基礎價視為 0（與逐筆計算一致）
+    - now 整批只取一次
+    """
+    base: Dict[str, float] = {}
+    for c in cabin_classes:
+        base.setdefault(c.category, c.base_price)
+    if categories is None:
+        categories = list(base)
+    bases: List[Tuple[str, float]] = [(cat, base.get(cat, 0.0)) for cat in categories]
+
+    return [
+        {cat: price * m for cat, price in bases}
+        for m in schedule_multipliers(price_rules, departure_dates, now)
+    ]
@@ -1,23 +1,133 @@
-from geopy.distance import geodesic
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from app.utils.gazetteer import normalize_city_name
 from app.utils.timezone import get_coords_by_city
 
 
-async def calculate_flight_duration(departure_city: str, arrival_city: str) -> int:
+# 飛機平均速度（km/h）
+CRUISE_SPEED_KMH = 900
+
+# WGS-84 橢球參數（與 geopy geodesic 相同）
+_WGS84_A = 6378137.0
+_WGS84_F = 1 / 298.257223563
+_WGS84_B = (1 - _WGS84_F) * _WGS84_A
+_EARTH_MEAN_RADIUS_KM = 6371.0088
+
+# 城市對距離矩陣（公里）：key 為正規化後排序的城市對，A→B 與 B→A 共用
+_pair_distance_km: Dict[Tuple[str, str], float] = {}
+
+Coords = Tuple[float, float]
+
+
+def _pair_key(city_a: str, city_b: str) -> Tuple[str, str]:
+    a, b = normalize_city_name(city_a), normalize_city_name(city_b)
+    return (a, b) if a <= b else (b, a)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """球面大圓距離（公里），Vincenty 不收斂時的後備算法"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * _EARTH_MEAN_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def vincenty_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
-    根據兩城市的經緯度計算飛行時間（分鐘）
-    假設平均速度為 900 km/h，使用 geopy 套件來取得球面直線距離
+    Vincenty 反算公式：WGS-84 橢球上的距離（公里）
+    - 與 geopy geodesic 的差距在毫米等級，換算成分鐘後結果相同
+    - 近乎對蹠點時不收斂，改用 haversine
     """
-    dep_coords = await get_coords_by_city(departure_city)
-    arr_coords = await get_coords_by_city(arrival_city)
+    if lat1 == lat2 and lon1 == lon2:
+        return 0.0
+    a, b, f = _WGS84_A, _WGS84_B, _WGS84_F
+    L = math.radians(lon2 - lon1)
+    U1 = math.atan((1 - f) * math.tan(math.radians(lat1)))
+    U2 = math.atan((1 - f) * math.tan(math.radians(lat2)))
+    sinU1, cosU1 = math.sin(U1), math.cos(U1)
+    sinU2, cosU2 = math.sin(U2), math.cos(U2)
+
+    lam = L
+    for _ in range(200):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+        sin_sigma = math.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+        if sin_sigma == 0:
+            return 0.0
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cosU1 * cosU2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sm = cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha if cos2_alpha else 0.0
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        lam_prev = lam
+        lam = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2))
+        )
+        if abs(lam - lam_prev) < 1e-12:
+            break
+    else:
+        return haversine_km(lat1, lon1, lat2, lon2)
+
+    u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sm + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sm ** 2)
+        - B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)
+    ))
+    return b * A * (sigma - delta_sigma) / 1000
+
+
+def duration_from_km(distance_km: float, speed_kmh: float = CRUISE_SPEED_KMH) -> int:
+    """距離（公里）→ 飛行時間（分鐘）"""
+    return round(distance_km / speed_kmh * 60)
 
-    if not dep_coords or not arr_coords:
-        return None
 
-    # 計算地球表面距離（公里）
-    distance_km = geodesic(dep_coords, arr_coords).km
+def durations_for_coords(
+    pairs: Sequence[Tuple[Coords, Coords]],
+    speed_kmh: float = CRUISE_SPEED_KMH
+) -> List[int]:
+    """純計算的批次版：[((lat, lng), (lat, lng)), ...] → 分鐘數列表，不做任何查詢"""
+    return [duration_from_km(vincenty_km(a[0], a[1], b[0], b[1]), speed_kmh) for a, b in pairs]
 
-    # 飛機平均速度（km/h）
-    speed_kmh = 900
-    duration_hours = distance_km / speed_kmh
 
-    return round(duration_hours * 60)  # 轉換成分鐘回傳
\ No newline at end of file
+async def pair_distances_km(pairs: Iterable[Tuple[str, str]]) -> List[Optional[float]]:
+    """
+    批次取得城市對距離（公里）
+    - 先查距離矩陣；沒算過的城市對，其城市各解析一次（依序進行，避免 fallback 時打爆 Nominatim）
+    - 查不到座標的城市對回 None（不寫入矩陣，下次仍會重試）
+    """
+    pairs = list(pairs)
+    missing = {(dep, arr) for dep, arr in pairs if _pair_key(dep, arr) not in _pair_distance_km}
+
+    if missing:
+        coords: Dict[str, Optional[Coords]] = {}
+        for city in {c for pair in missing for c in pair}:
+            coords[city] = await get_coords_by_city(city)
+        for dep, arr in missing:
+            a, b = coords.get(dep), coords.get(arr)
+            if a and b:
+                _pair_distance_km[_pair_key(dep, arr)] = vincenty_km(a[0], a[1], b[0], b[1])
+
+    return [_pair_distance_km.get(_pair_key(dep, arr)) for dep, arr in pairs]
+
+
+async def calculate_flight_durations(
+    pairs: Iterable[Tuple[str, str]],
+    speed_kmh: float = CRUISE_SPEED_KMH
+) -> List[Optional[int]]:
+    """
+    批次版 calculate_flight_duration：[(出發城市, 抵達城市), ...] → 分鐘數列表（查不到為 None）
+    - 距離矩陣與速度無關，調整巡航速度假設時只需重算除法
+    """
+    distances = await pair_distances_km(pairs)
+    return [duration_from_km(d, speed_kmh) if d is not None else None for d in distances]
+
+
+async def calculate_flight_duration(departure_city: str, arrival_city: str) -> int:
+    """
+    根據兩城市的經緯度計算飛行時間（分鐘）
+    假設平均速度為 900 km/h，距離取 WGS-84 橢球面距離並記在城市對距離矩陣中
+    """
+    (duration,) = await calculate_flight_durations([(departure_city, arrival_city)])
+    return duration
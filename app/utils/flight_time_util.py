@@ -1,4 +1,6 @@
 from datetime import datetime, timezone, timedelta
+from typing import Callable
+from zoneinfo import ZoneInfo
 from app.utils.timezone import get_time_zone_by_city
 from dateutil import tz
 
@@ -35,4 +37,29 @@ def calculate_arrival_date(
 
     # 轉換成抵達城市當地時間，再轉為 UTC 存儲
     arrival_local = arrival_utc.astimezone(arr_tz)
-    return arrival_local.astimezone(tz.UTC)
\ No newline at end of file
+    return arrival_local.astimezone(tz.UTC)
+
+
+def arrival_calculator(
+    dep_city: str,
+    arr_city: str,
+    duration_min: int
+) -> Callable[[datetime], datetime]:
+    """
+    批次版 calculate_arrival_date：兩個城市的時區只解析一次，回傳 dep → arrival(UTC) 的函式
+    - 使用 ZoneInfo（標準庫、內部有快取），計算結果與 calculate_arrival_date 相同：
+      departure 的「牆上時間」視為出發城市當地時間，加上飛行時間後以 UTC 回傳
+    """
+    dep_tz_str = get_time_zone_by_city(dep_city)
+    arr_tz_str = get_time_zone_by_city(arr_city)
+
+    if not dep_tz_str or not arr_tz_str:
+        raise ValueError(f"Invalid timezone: {dep_city} or {arr_city}")
+
+    dep_tz = ZoneInfo(dep_tz_str)
+    duration = timedelta(minutes=duration_min)
+
+    def calculate(departure_date: datetime) -> datetime:
+        return departure_date.replace(tzinfo=dep_tz).astimezone(timezone.utc) + duration
+
+    return calculate
@@ -0,0 +1,69 @@
+# utils/gazetteer.py
+# 離線城市表：城市名稱 → (lat, lng, IANA 時區)，不需網路
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+
+_DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "cities.tsv"
+
+# 正規化時去掉的標點，以及常見的「市 / City」字尾
+_PUNCT_RE = re.compile(r"[.\-'’,()]+")
+_SPACE_RE = re.compile(r"\s+")
+_SUFFIXES = (" city", "市")
+
+
+class City(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+    tz: str
+
+
+def normalize_city_name(name: str) -> str:
+    """
+    城市名稱正規化：
+      - NFKD 拆解後去掉重音符號（São Paulo → sao paulo、Zürich → zurich）
+      - casefold 忽略大小寫，標點轉空白並合併連續空白
+      - 臺 → 台，去掉「市 / City」字尾（台北市 → 台北、Taipei City → taipei）
+    """
+    if not name:
+        return ""
+    s = unicodedata.normalize("NFKD", name)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = s.casefold().replace("臺", "台")
+    s = _SPACE_RE.sub(" ", _PUNCT_RE.sub(" ", s)).strip()
+    for suffix in _SUFFIXES:
+        if s.endswith(suffix) and len(s) > len(suffix):
+            s = s[: -len(suffix)].rstrip()
+    return s
+
+
+@lru_cache(maxsize=1)
+def _index() -> Dict[str, City]:
+    """
+    載入城市表並建立「正規化名稱 → City」索引（每個 process 只載入一次）
+    - 正式名稱與所有別名都指向同一筆 City；重複的別名以先出現者為準
+    """
+    index: Dict[str, City] = {}
+    with open(_DATA_PATH, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            name, lat, lng, tz_name, aliases = line.rstrip("\n").split("\t")
+            city = City(name, float(lat), float(lng), tz_name)
+            for key in (name, *aliases.split("|")):
+                index.setdefault(normalize_city_name(key), city)
+    return index
+
+
+def lookup_city(name: str) -> Optional[City]:
+    """查城市表，查不到回 None"""
+    return _index().get(normalize_city_name(name))
+
+
+def warm_up() -> int:
+    """預先載入城市表（啟動時呼叫，避免第一個請求付載入成本），回傳索引筆數"""
+    return len(_index())
@@ -0,0 +1,116 @@
+# utils/geo_cache.py
+# 跨 process / 跨重啟的地理查詢快取（SQLite 檔案，所有 uvicorn worker 共用）
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Optional, Tuple
+
+from app.core.config import settings
+
+
+# 快取未命中時的哨兵值（None 是合法的「負向快取」結果，不能拿來表示未命中）
+MISS = object()
+
+_local = threading.local()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _conn() -> sqlite3.Connection:
+    """
+    每個執行緒一條連線（sync 查詢是在 executor 執行緒裡跑的）
+    - WAL 模式：多個 worker 同時讀寫不互相阻塞
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        path = settings.GEO_CACHE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS geo_cache ("
+            " kind TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT,"            # JSON；NULL 代表負向結果（查過但查不到）
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, key))"
+        )
+        _local.conn = conn
+    return conn
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get(kind: str, key: str) -> Any:
+    """
+    讀快取：
+      - 命中 → 回傳值（負向結果為 None）
+      - 未命中或已過期 → 回傳 MISS
+    """
+    try:
+        row = _conn().execute(
+            "SELECT value, expires_at FROM geo_cache WHERE kind = ? AND key = ?",
+            (kind, key),
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"[geo_cache] read error: {e}")
+        _count(f"{kind}.error")
+        return MISS
+
+    if row is None or row[1] < time.time():
+        _count(f"{kind}.miss")
+        return MISS
+    if row[0] is None:
+        _count(f"{kind}.negative_hit")
+        return None
+    _count(f"{kind}.hit")
+    return json.loads(row[0])
+
+
+def put(kind: str, key: str, value: Any, ttl: Optional[float] = None):
+    """寫快取；value 為 None 時視為負向結果，使用較短的 TTL"""
+    if ttl is None:
+        ttl = settings.GEO_CACHE_NEGATIVE_TTL if value is None else settings.GEO_CACHE_TTL
+    try:
+        _conn().execute(
+            "INSERT OR REPLACE INTO geo_cache (kind, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (kind, key, None if value is None else json.dumps(value), time.time() + ttl),
+        )
+        _count(f"{kind}.store")
+    except sqlite3.Error as e:
+        print(f"[geo_cache] write error: {e}")
+        _count(f"{kind}.error")
+
+
+def purge_expired() -> int:
+    """刪除過期資料，回傳刪除筆數"""
+    return _conn().execute("DELETE FROM geo_cache WHERE expires_at < ?", (time.time(),)).rowcount
+
+
+def stats() -> dict:
+    """
+    回傳本 process 的命中統計與快取檔內的筆數
+    - counters: {"coords.hit": 3, "coords.miss": 1, "tz.negative_hit": 2, ...}
+    """
+    with _stats_lock:
+        counters = dict(_stats)
+    try:
+        rows: Tuple[int, int] = _conn().execute(
+            "SELECT COUNT(*), SUM(value IS NULL) FROM geo_cache WHERE expires_at >= ?",
+            (time.time(),),
+        ).fetchone()
+    except sqlite3.Error:
+        rows = (0, 0)
+    return {
+        "pid": os.getpid(),
+        "counters": counters,
+        "entries": rows[0] or 0,
+        "negativeEntries": rows[1] or 0,
+    }
@@ -0,0 +1,41 @@
+# utils/http_cache.py
+# HTTP 條件式請求：強 ETag、If-None-Match 比對、304 回應，以及各路由的 Cache-Control
+# - ETag 由文件版本等欄位產生，不依賴回應內容：不必先組出回應（或跑計價）就能判斷是否回 304
+import hashlib
+from typing import Optional
+
+from starlette.responses import Response
+
+from app.core.config import settings
+
+
+def make_etag(*parts) -> str:
+    """由版本欄位（_id、version、updatedAt…）產生強 ETag"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 比對：依 RFC 9110 用弱比較（忽略 W/ 前綴），'*' 表示任何版本都算相符"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def with_etag(resp: Response, etag: str) -> Response:
+    resp.headers["ETag"] = etag
+    return resp
+
+
+def apply_cache_control(resp: Response, route: str) -> Response:
+    """套用路由的 Cache-Control 政策（settings.CACHE_CONTROL）；200 與 304 都要帶，瀏覽器與 CDN 才會沿用"""
+    policy = settings.CACHE_CONTROL.get(route)
+    if policy and resp.status_code in (200, 304):
+        resp.headers["Cache-Control"] = policy
+    return resp
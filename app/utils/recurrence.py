@@ -0,0 +1,57 @@
+# utils/recurrence.py
+# RFC 5545 重複規則（RRULE）展開：以出發城市的「當地牆上時間」展開，再轉成 UTC
+# - 夏令時間：每天 08:30 在切換前後都是當地 08:30（UTC 時間會跟著位移）
+# - 切換當天不存在的時間（例如 02:30）會順延到切換後（03:30）；重複的時間取第一次
+from datetime import datetime, timedelta, timezone
+from typing import List
+from zoneinfo import ZoneInfo
+
+from dateutil.rrule import rrule, rrulestr
+
+
+# 只接受以「小時」以上為單位的規則，避免 FREQ=SECONDLY 之類的規則一次展開出大量班次
+ALLOWED_FREQUENCIES = {"YEARLY", "MONTHLY", "WEEKLY", "DAILY", "HOURLY"}
+
+
+def parse_rule(rule: str, start_local: datetime) -> rrule:
+    """
+    rule：'FREQ=DAILY;UNTIL=20260301T000000'（可帶 'RRULE:' 前綴；UNTIL 為當地時間，不加 Z）
+    start_local：第一個出發時間（出發城市當地時間，naive）
+    規則不合法時拋出 ValueError
+    """
+    text = (rule or "").strip()
+    if text.upper().startswith("RRULE:"):
+        text = text[len("RRULE:"):]
+    parts = dict(p.split("=", 1) for p in text.upper().split(";") if "=" in p)
+    if "DTSTART" in text.upper():
+        raise ValueError("重複規則不可包含 DTSTART，請改用 start 欄位")
+    if parts.get("UNTIL", "").endswith("Z"):
+        raise ValueError("UNTIL 請使用出發城市當地時間（不加 Z）")
+    if parts.get("FREQ") not in ALLOWED_FREQUENCIES:
+        raise ValueError(f"FREQ 只支援 {', '.join(sorted(ALLOWED_FREQUENCIES))}")
+    return rrulestr(text, dtstart=start_local.replace(tzinfo=None))
+
+
+def occurrences(
+    rule: str,
+    start_local: datetime,
+    tz: ZoneInfo,
+    after_utc: datetime,
+    until_utc: datetime,
+    limit: int
+) -> List[datetime]:
+    """
+    (after_utc, until_utc] 區間內的出發時間（UTC-aware，遞增），最多 limit 筆
+    - 只展開區間內的部分：當地時間的搜尋範圍前後各放寬一天（涵蓋任何 UTC 偏移），再以 UTC 精確過濾
+    """
+    lo = after_utc.astimezone(tz).replace(tzinfo=None) - timedelta(days=1)
+    hi = until_utc.astimezone(tz).replace(tzinfo=None) + timedelta(days=1)
+
+    result = []
+    for local in parse_rule(rule, start_local).xafter(lo, inc=True):
+        if local > hi or len(result) >= limit:
+            break
+        departure = local.replace(tzinfo=tz).astimezone(timezone.utc)
+        if after_utc < departure <= until_utc:
+            result.append(departure)
+    return result
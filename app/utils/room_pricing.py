@@ -0,0 +1,102 @@
+# utils/room_pricing.py
+# 房型價格表：把 pricing（星期規則）與 holidays（特定日期）編譯成查表結構，計算住宿區間的總價
+# - 假日：'YYYY-MM-DD' → 價格（同一天有多筆時取第一筆，與逐晚掃描相同）
+# - 星期：7 格陣列（週日=0，沿用 Node 的編號），每格取第一條包含該天的規則；沒有規則的日子不計價
+# - 每晚價格以 list 重複 / 切片展開後逐晚以 += 累加（不用 sum()：Python 3.12 起浮點數 sum() 改用補償加總，
+#   小數價格的結果會與原本的逐晚累加不同）
+# - 以 (房型 _id, updatedAt) 快取編譯結果：房型更新後 updatedAt 改變，自然改用新的價格表
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+
+_cache: "OrderedDict[tuple, RoomPriceTable]" = OrderedDict()
+
+
+def _number(value) -> float:
+    """匯入資料可能殘留 Extended JSON（{"$numberInt": "2000"}）"""
+    return float(value.get("$numberInt", value)) if isinstance(value, dict) else float(value)
+
+
+def _field(item, name: str):
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+class RoomPriceTable:
+    __slots__ = ("weekdays", "holidays")
+
+    def __init__(self, pricing, holidays):
+        # weekdays[node_day]：該星期幾的價格；None 表示沒有規則
+        self.weekdays: List[Optional[float]] = [None] * 7
+        for p in pricing or []:
+            price = _field(p, "price")
+            price = _number(price) if isinstance(price, dict) else float(price or 0)
+            for d in _field(p, "days_of_week") or []:
+                day = int(d["$numberInt"]) if isinstance(d, dict) and "$numberInt" in d else int(d)
+                if 0 <= day < 7 and self.weekdays[day] is None:
+                    self.weekdays[day] = price
+
+        # 只保留格式與 date.isoformat() 完全相同的日期（其他寫法逐晚比對時本來就不會命中）
+        self.holidays: Dict[date, float] = {}
+        for h in holidays or []:
+            text = _field(h, "date")
+            try:
+                day = date.fromisoformat(text)
+            except (TypeError, ValueError):
+                continue
+            if day.isoformat() == text and day not in self.holidays:
+                self.holidays[day] = _number(_field(h, "price"))
+
+    def nightly(self, start: date, end: date) -> List[float]:
+        """[start, end) 每晚的價格（沒有規則的日子為 0）"""
+        nights = (end - start).days
+        if nights <= 0:
+            return []
+        first = (start.weekday() + 1) % 7  # Python週一=0 → Node週日=0
+        week = [0.0 if p is None else p for p in self.weekdays[first:] + self.weekdays[:first]]
+        prices = (week * (nights // 7 + 1))[:nights]
+        for day, price in self.holidays.items():
+            if start <= day < end:
+                prices[(day - start).days] = price
+        return prices
+
+    def total(self, start: date, end: date) -> float:
+        total = 0.0
+        for price in self.nightly(start, end):
+            total += price
+        return total
+
+    def baseline(self) -> Optional[float]:
+        """最低的一般（非假日）每晚價格；沒有大於 0 的星期規則時回 None"""
+        prices = [p for p in self.weekdays if p is not None and p > 0]
+        return min(prices) if prices else None
+
+    def floor(self) -> Optional[float]:
+        """
+        任何有計價（總價 > 0）的住宿區間總價下界：星期規則與假日價格中最低的正價格
+        - 有負價格時沒有可用的下界，回 0；沒有任何正價格（永遠不會計價）時回 None
+        """
+        prices = [p for p in self.weekdays if p is not None] + list(self.holidays.values())
+        if any(p < 0 for p in prices):
+            return 0.0
+        positive = [p for p in prices if p > 0]
+        return min(positive) if positive else None
+
+
+def get_price_table(room) -> RoomPriceTable:
+    """取房型的價格表（同一份房型資料只編譯一次；尚未存檔的房型不快取）"""
+    if room.id is None:
+        return RoomPriceTable(room.pricing, room.holidays)
+
+    key = (room.id, room.updated_at)
+    table = _cache.get(key)
+    if table is not None:
+        _cache.move_to_end(key)
+        return table
+
+    table = _cache[key] = RoomPriceTable(room.pricing, room.holidays)
+    while len(_cache) > settings.ROOM_PRICE_TABLE_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return table
@@ -0,0 +1,153 @@
+# utils/route_graph.py
+# 轉機航線圖：城市 → 依出發時間排序的班次（Leg），常駐記憶體，支援以航班為單位增量更新
+# 搜尋為時間相依的最短路徑：依抵達時間由早到晚展開，轉機需滿足最短 / 最長轉機時間
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from itertools import count
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from beanie import PydanticObjectId
+
+from app.utils.fare_engine import to_utc
+
+
+class Leg(NamedTuple):
+    """單一班次（出發 / 抵達皆為 UTC-aware）"""
+    departure: datetime
+    arrival: datetime
+    flight_id: PydanticObjectId
+    flight_number: str
+    schedule_id: PydanticObjectId
+    departure_city: str
+    arrival_city: str
+    prices: dict
+    prices_valid_until: Optional[datetime]
+
+    def prices_stale(self, now: datetime) -> bool:
+        """與 Schedule.prices_stale 相同"""
+        if not self.prices:
+            return True
+        return self.prices_valid_until is not None and to_utc(self.prices_valid_until) < now
+
+
+class RouteGraph:
+    """
+    - _by_city：出發城市 → {航班 _id: 該航班從此城市出發的 legs}，增量更新只動到單一航班
+    - _sorted：出發城市 → (出發時間, legs) 兩個平行陣列，供 bisect 取時間區間；異動後延遲重建
+    """
+
+    def __init__(self):
+        self.flights: Dict[PydanticObjectId, object] = {}
+        self._cities_by_flight: Dict[PydanticObjectId, Set[str]] = {}
+        self._by_city: Dict[str, Dict[PydanticObjectId, List[Leg]]] = {}
+        self._sorted: Dict[str, Tuple[List[datetime], List[Leg]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(legs) for by_flight in self._by_city.values() for legs in by_flight.values())
+
+    def upsert_flight(self, flight_id: PydanticObjectId, header, legs: Iterable[Leg]):
+        """
+        以新的 legs 取代該航班原本的所有 legs
+        header：不含 schedules 的 Flight（過期票價即時計算用）
+        """
+        self.remove_flight(flight_id)
+        cities: Set[str] = set()
+        for leg in legs:
+            self._by_city.setdefault(leg.departure_city, {}).setdefault(flight_id, []).append(leg)
+            cities.add(leg.departure_city)
+        self.flights[flight_id] = header
+        self._cities_by_flight[flight_id] = cities
+        for city in cities:
+            self._sorted.pop(city, None)
+
+    def remove_flight(self, flight_id: PydanticObjectId):
+        self.flights.pop(flight_id, None)
+        for city in self._cities_by_flight.pop(flight_id, ()):
+            by_flight = self._by_city.get(city, {})
+            by_flight.pop(flight_id, None)
+            if not by_flight:
+                self._by_city.pop(city, None)
+            self._sorted.pop(city, None)
+
+    def departures(self, city: str, earliest: datetime, latest: datetime) -> List[Leg]:
+        """city 出發、出發時間落在 [earliest, latest] 的 legs（依出發時間排序）"""
+        if city not in self._sorted:
+            by_flight = self._by_city.get(city)
+            if not by_flight:
+                return []
+            legs = sorted((leg for legs in by_flight.values() for leg in legs), key=lambda leg: leg.departure)
+            self._sorted[city] = ([leg.departure for leg in legs], legs)
+
+        times, legs = self._sorted[city]
+        return legs[bisect_left(times, earliest):bisect_right(times, latest)]
+
+    def search(
+        self,
+        origin: str,
+        destination: str,
+        start_utc: datetime,
+        end_utc: datetime,
+        max_stops: int,
+        min_connection: timedelta,
+        max_connection: timedelta,
+        max_expansions: int,
+        price_of: Optional[Callable[[Leg], float]] = None
+    ) -> List[Tuple[Leg, ...]]:
+        """
+        找出從 origin 在 [start_utc, end_utc] 出發、最多轉機 max_stops 次抵達 destination 的行程
+        - 部分行程依「目前抵達時間」放進 heap，由早到晚展開
+        - 支配剪枝：同一城市已有「出發較晚（或相同）、抵達較早、段數不多於」的部分行程時，
+          那些行程的轉機視窗（抵達 + 最長轉機時間）以內的班次不再由目前這筆展開，只展開視窗之後的班次；
+          目的地不需要轉機，被支配即略過
+        - 有 price_of（每段票價）時，支配條件再加上「累計票價不高於」，依價格排序時較便宜但較慢的行程不會被剪掉
+        - 同一行程不重複經過城市；最多展開 max_expansions 次，延遲有上限
+        """
+        seq = count()
+        heap: List[tuple] = []
+
+        def push(path: Tuple[Leg, ...]):
+            # 抵達時間相同時，出發較晚、段數較少的先出列，確保被支配的行程一定較晚出列
+            heapq.heappush(heap, (path[-1].arrival, -path[0].departure.timestamp(), len(path), next(seq), path))
+
+        for leg in self.departures(origin, start_utc, end_utc):
+            if leg.arrival_city != origin:
+                push((leg,))
+
+        labels: Dict[str, List[Tuple[datetime, datetime, int, float]]] = {}
+        found: List[Tuple[Leg, ...]] = []
+        expansions = 0
+        while heap and expansions < max_expansions:
+            arrival, _, legs, _, path = heapq.heappop(heap)
+            expansions += 1
+
+            # heap 依抵達時間出列，已記錄的 label 抵達時間一定不晚於目前這筆，
+            # 因此支配者的轉機視窗起點不晚於目前這筆；只有視窗終點（抵達 + max_connection）可能比較早
+            city = path[-1].arrival_city
+            first_departure = path[0].departure
+            price = sum(price_of(leg) for leg in path) if price_of else 0.0
+            city_labels = labels.setdefault(city, [])
+            covered_until = max(
+                (arr for arr, dep, n, p in city_labels if dep >= first_departure and n <= legs and p <= price),
+                default=None,
+            )
+            if covered_until is not None and (city == destination or covered_until >= arrival):
+                continue
+            city_labels.append((arrival, first_departure, legs, price))
+
+            if city == destination:
+                found.append(path)
+                continue
+            if legs > max_stops:
+                continue
+            visited = {origin, *(leg.arrival_city for leg in path)}
+            earliest = arrival + min_connection
+            if covered_until is not None:
+                earliest = max(earliest, covered_until + max_connection)
+            for leg in self.departures(city, earliest, arrival + max_connection):
+                if covered_until is not None and leg.departure <= covered_until + max_connection:
+                    continue
+                if leg.arrival_city not in visited:
+                    push(path + (leg,))
+
+        return found
@@ -0,0 +1,84 @@
+# utils/suggestion_index.py
+# 名稱自動完成索引：正規化後的名稱切成 1-gram / 2-gram，查詢以「最少命中的 gram」的倒排清單為候選
+# - 任意位置都能比對（中文名稱常從中間打字，例如「晶華」找「台北晶華酒店」），不依賴斷詞
+# - 每個倒排清單依排名（熱門優先、評分高優先、名稱）排序，依序驗證子字串、湊滿 limit 筆即停止
+# - 以單一項目為單位增量更新（新增 / 更新 / 刪除）
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+
+def normalize(text: str) -> str:
+    """NFKC（全形 → 半形）+ casefold，連續空白合併成一個"""
+    return " ".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+
+
+def _grams(text: str) -> Set[str]:
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class _Entry(NamedTuple):
+    key: tuple      # 排名用：(非熱門, -評分, 正規化名稱, id)
+    name: str
+
+
+class SuggestionIndex:
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}   # str(id) → 項目
+        self._postings: Dict[str, List[tuple]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[Hashable, str, bool, Optional[float]]]) -> "SuggestionIndex":
+        """整批建立：先全部加入再一次排序各倒排清單（避免逐筆 insort 的平方成本）"""
+        index = cls()
+        for item_id, name, popular, rating in items:
+            index._add(item_id, name, popular, rating, insert=list.append)
+        for posting in index._postings.values():
+            posting.sort()
+        return index
+
+    def upsert(self, item_id: Hashable, name: str, popular: bool = False, rating: Optional[float] = None):
+        self.remove(item_id)
+        self._add(item_id, name, popular, rating, insert=insort)
+
+    def _add(self, item_id, name, popular, rating, insert):
+        normalized = normalize(name)
+        if not normalized:
+            return
+        key = (not popular, -(rating or 0), normalized, str(item_id))
+        self._entries[key[3]] = _Entry(key, name)
+        for gram in _grams(normalized):
+            insert(self._postings.setdefault(gram, []), key)
+
+    def remove(self, item_id: Hashable):
+        entry = self._entries.pop(str(item_id), None)
+        if entry is None:
+            return
+        for gram in _grams(entry.key[2]):
+            posting = self._postings[gram]
+            del posting[bisect_left(posting, entry.key)]
+            if not posting:
+                del self._postings[gram]
+
+    def suggest(self, query: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """名稱包含 query 的項目，依排名取前 limit 筆：[(id, 原始名稱)]"""
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+
+        grams = [q] if len(q) == 1 else [q[i:i + 2] for i in range(len(q) - 1)]
+        postings = [self._postings.get(g) for g in grams]
+        if any(p is None for p in postings):
+            return []
+        candidates = min(postings, key=len)
+
+        results = []
+        for key in candidates:
+            if len(q) <= 2 or q in key[2]:
+                results.append((key[3], self._entries[key[3]].name))
+                if len(results) >= limit:
+                    break
+        return results
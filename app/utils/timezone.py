@@ -1,40 +1,66 @@
 # utils/timezone.py
 from __future__ import annotations  # 讓型別註解延後解析（前向參照更安全；本檔雖未用到，保留作為通用設定）
-from typing import Optional, Tuple    # Optional[T] 表示可能是 T 或 None；Tuple[float, float] 用於 (lat, lng)
+from typing import Iterable, Optional, Tuple  # Optional[T] 表示可能是 T 或 None；Tuple[float, float] 用於 (lat, lng)
 from functools import lru_cache       # LRU 快取裝飾器，避免重複查詢造成延遲或打爆外部服務
-from geopy.geocoders import Nominatim # OSM 的地理編碼器：用地名換經緯度（需要網路，具速率限制）
-from timezonefinder import TimezoneFinder  # 依經緯度推 IANA 時區（純本地計算、無網路）
 import asyncio                         # 把同步 I/O 丟到執行緒池，避免阻塞事件迴圈
+from app.core.config import settings
+from app.utils.gazetteer import lookup_city, normalize_city_name  # 離線城市表：優先使用，純本地查表
+from app.utils import geo_cache       # 跨 worker / 跨重啟的持久快取（SQLite）
 
 
 
-# 建立單例（全域共用，避免重複初始化）
-# - user_agent 必填，遵守 Nominatim 使用規範
-# - timeout 防止外部請求卡住太久
-_geolocator = Nominatim(user_agent="boolingChallenge.flights (contact: w444555888@yahoo.com.tw)", timeout=5)
-# TimezoneFinder 內部會載入時區邊界資料，實例化一次重複使用
-_tf = TimezoneFinder()
+# 外部服務改為延遲建立：離線城市表命中時完全不需要它們
+# - Nominatim：OSM 的地理編碼器（需要網路，具速率限制），只在城市表查不到且允許 fallback 時使用
+#   user_agent 必填，遵守 Nominatim 使用規範；timeout 防止外部請求卡住太久
+# - TimezoneFinder：內部會載入時區邊界資料，實例化成本高，同樣只在 fallback 時建立一次
+@lru_cache(maxsize=1)
+def _get_geolocator():
+    from geopy.geocoders import Nominatim
+    return Nominatim(user_agent="boolingChallenge.flights (contact: w444555888@yahoo.com.tw)", timeout=5)
+
+
+@lru_cache(maxsize=1)
+def _get_tf():
+    from timezonefinder import TimezoneFinder
+    return TimezoneFinder()
 
 
 @lru_cache(maxsize=1024)
 def _coords_by_city_sync(city_name: str) -> Optional[Tuple[float, float]]:
     """
     同步版：由城市名稱取得 (latitude, longitude)。
-    - 這是「同步 + 可快取」函式，本身會做網路 I/O，不要在事件迴圈中直接呼叫
-    - 快取 1024 組輸入 → 輸出，可大幅降低對 Nominatim 的呼叫次數。
+    - 先查離線城市表（微秒級、無網路）；查不到且 settings.GEOCODER_FALLBACK 開啟時才打 Nominatim
+    - fallback 會做網路 I/O，不要在事件迴圈中直接呼叫
+    - 快取兩層：process 內 LRU 1024 組，再來是所有 worker 共用的 geo_cache（含負向結果）
     回傳：
       - (lat, lng) 例如 (25.0375, 121.5637)
       - 查不到或發生錯誤時回 None
     """
     if not city_name:
         return None
+    city = lookup_city(city_name)
+    if city:
+        return (city.latitude, city.longitude)
+
+    key = normalize_city_name(city_name)
+    cached = geo_cache.get("coords", key)
+    if cached is not geo_cache.MISS:
+        return tuple(cached) if cached else None
+
+    if not settings.GEOCODER_FALLBACK:
+        return None
     try:
         # exactly_one=True：若有多個同名城市，僅取第一筆（語意與 Node 版 city-timezones 取第一筆一致）
-        loc = _geolocator.geocode(city_name, exactly_one=True)
+        loc = _get_geolocator().geocode(city_name, exactly_one=True)
         if not loc:
+            # 負向快取：確定查不到的城市短期內不再重打 Nominatim
+            geo_cache.put("coords", key, None)
             return None
-        return (loc.latitude, loc.longitude)
+        coords = (loc.latitude, loc.longitude)
+        geo_cache.put("coords", key, coords)
+        return coords
     except Exception as e:
+        # 網路錯誤不寫入持久快取，下次仍會重試
         print(f"[get_coords_by_city] geocode error: {e}")
         return None
 
@@ -69,7 +95,8 @@ def get_time_zone_by_city(city_name: str) -> Optional[str]:
     """
     由城市名稱取得 IANA 時區字串（例如 "Asia/Taipei"）。
     作法：
-      1) 先用「同步 + 快取」的 _coords_by_city_sync(city) 取得經緯度
+      0) 先查離線城市表，命中就直接回傳表內的時區
+      1) 否則用「同步 + 快取」的 _coords_by_city_sync(city) 取得經緯度
       2) 再用 TimezoneFinder 依座標推回 IANA 時區（純本地運算，無網路）
     回傳：
       - 時區字串（如 "Asia/Taipei"）
@@ -78,6 +105,15 @@ def get_time_zone_by_city(city_name: str) -> Optional[str]:
       - 這裡選擇同步函式是因為第二步為本地計算且非常快；
         第一階段查座標已由 LRU 快取保護，多數情況不會重打外部服務。
     """
+    city = lookup_city(city_name)
+    if city:
+        return city.tz
+
+    key = normalize_city_name(city_name)
+    cached = geo_cache.get("tz", key)
+    if cached is not geo_cache.MISS:
+        return cached
+
     coords = _coords_by_city_sync(city_name)
     if not coords:
         return None
@@ -87,9 +123,26 @@ def get_time_zone_by_city(city_name: str) -> Optional[str]:
         # - timezone_at：標準判斷，點位落在時區多邊形內
         # - certain_timezone_at：更嚴格/更慢的確認（邊界情形）
         # - closest_timezone_at：都找不到時取最近時區（海上或邊界附近）
-        return (_tf.timezone_at(lat=lat, lng=lng)
-                or _tf.certain_timezone_at(lat=lat, lng=lng)
-                or _tf.closest_timezone_at(lat=lat, lng=lng))
+        tf = _get_tf()
+        tz_name = (tf.timezone_at(lat=lat, lng=lng)
+                   or tf.certain_timezone_at(lat=lat, lng=lng)
+                   or tf.closest_timezone_at(lat=lat, lng=lng))
+        geo_cache.put("tz", key, tz_name)
+        return tz_name
     except Exception as e:
         print(f"[get_time_zone_by_city] error: {e}")
         return None
+
+
+async def warm_up_city_cache(city_names: Iterable[str]) -> int:
+    """
+    啟動時預熱：把既有航班用到的城市逐一解析一次，寫進 LRU 與持久快取
+    - 在執行緒池中依序執行，避免同時對 Nominatim 發出大量請求
+    - 回傳成功解析出時區的城市數
+    """
+    loop = asyncio.get_running_loop()
+    resolved = 0
+    for name in {n for n in city_names if n}:
+        if await loop.run_in_executor(None, get_time_zone_by_city, name):
+            resolved += 1
+    return resolved
@@ -0,0 +1,73 @@
+# benchmarks/_common.py
+# 基準測試共用工具：連線到獨立的 bench 資料庫、計時與統計
+import os
+import time
+import statistics
+from typing import Awaitable, Callable, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+
+from app.models.user import User
+from app.models.hotel import Hotel
+from app.models.room import Room
+from app.models.order import Order
+from app.models.flight import Flight
+from app.models.flight_order import FlightOrder
+from app.models.flight_instance import FlightInstance
+from app import db as app_db
+
+
+# 預設使用本機獨立資料庫，避免污染開發資料
+BENCH_MONGODB_URI = os.getenv("BENCH_MONGODB", "mongodb://localhost:27017/pycrawler_bench")
+
+
+async def init_bench_db(drop: bool = True):
+    """連到 bench 資料庫並初始化 Beanie；drop=True 時先清空整個資料庫"""
+    client = AsyncIOMotorClient(BENCH_MONGODB_URI)
+    db = client.get_default_database()
+    if drop:
+        await client.drop_database(db.name)
+    await init_beanie(
+        database=db,
+        document_models=[User, Hotel, Room, Order, Flight, FlightOrder, FlightInstance]
+    )
+    app_db._db = db  # service 內的原生 Motor 操作透過 get_db() 取得 collection
+    return db
+
+
+async def measure(fn: Callable[[], Awaitable], runs: int = 50, warmup: int = 3) -> List[float]:
+    """重複執行 fn，回傳每次耗時（毫秒）"""
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def measure_sync(fn: Callable[[], object], runs: int = 50, warmup: int = 3) -> List[float]:
+    """同步版 measure"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def p95(samples: List[float]) -> float:
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100)[94]
+
+
+def report(label: str, samples: List[float], extra: str = ""):
+    print(
+        f"{label:<28} p50={statistics.median(samples):9.3f}ms  "
+        f"p95={p95(samples):9.3f}ms  n={len(samples)}  {extra}"
+    )
@@ -0,0 +1,116 @@
+# benchmarks/bench_connections.py
+# 轉機搜尋延遲：以合成航線圖（數萬筆班次）量測 RouteGraph.search 的 p50 / p95
+# 不需要資料庫
+#
+# 執行：python -m benchmarks.bench_connections [--cities 60] [--routes 600] [--days 60]
+import argparse
+import random
+from itertools import cycle
+from datetime import datetime, timedelta, timezone
+
+from beanie import PydanticObjectId
+
+from app.core.config import settings
+from app.utils.route_graph import Leg, RouteGraph
+from benchmarks._common import measure_sync, report
+
+
+def build(n_cities: int, n_routes: int, n_days: int, seed: int = 7):
+    rng = random.Random(seed)
+    cities = [f"CITY{i:03d}" for i in range(n_cities)]
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    graph = RouteGraph()
+
+    pairs = set()
+    while len(pairs) < n_routes:
+        a, b = rng.sample(cities, 2)
+        pairs.add((a, b))
+
+    for i, (a, b) in enumerate(sorted(pairs)):
+        flight_id = PydanticObjectId()
+        hour = rng.randrange(24)
+        duration = timedelta(minutes=rng.randrange(60, 14 * 60, 5))
+        legs = []
+        for d in range(n_days):
+            dep = start + timedelta(days=d, hours=hour)
+            legs.append(Leg(
+                departure=dep,
+                arrival=dep + duration,
+                flight_id=flight_id,
+                flight_number=f"BX{i:04d}",
+                schedule_id=PydanticObjectId(),
+                departure_city=a,
+                arrival_city=b,
+                prices={"ECONOMY": rng.randrange(3000, 20000)},
+                prices_valid_until=None,
+            ))
+        graph.upsert_flight(flight_id, None, legs)
+    return graph, cities, start
+
+
+def _leg(dep_city: str, arr_city: str, departure: datetime, arrival: datetime) -> Leg:
+    return Leg(
+        departure=departure, arrival=arrival, flight_id=PydanticObjectId(), flight_number=f"{dep_city}{arr_city}",
+        schedule_id=PydanticObjectId(), departure_city=dep_city, arrival_city=arr_city,
+        prices={"ECONOMY": 1000}, prices_valid_until=None,
+    )
+
+
+def check_connection_window():
+    """
+    回歸檢查：出發較晚、抵達較早的行程不可把轉機視窗較晚的行程整個剪掉
+    A 09:00→10:00 與 B 07:00→12:00 都是 TPE→HKG；C 在 B 抵達 23 小時後出發（A 要等 25 小時，超過上限）
+    B+C 是唯一合法的行程
+    """
+    day = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    b_arrival = day + timedelta(hours=12)
+    c_departure = b_arrival + timedelta(hours=23)
+    graph = RouteGraph()
+    for leg in (
+        _leg("TPE", "HKG", day + timedelta(hours=9), day + timedelta(hours=10)),
+        _leg("TPE", "HKG", day + timedelta(hours=7), b_arrival),
+        _leg("HKG", "LHR", c_departure, c_departure + timedelta(hours=13)),
+    ):
+        graph.upsert_flight(leg.flight_id, None, [leg])
+
+    found = graph.search(
+        "TPE", "LHR", day, day + timedelta(days=1), max_stops=1,
+        min_connection=timedelta(minutes=45), max_connection=timedelta(hours=24), max_expansions=100,
+    )
+    assert [tuple(leg.departure for leg in path) for path in found] == [(day + timedelta(hours=7), c_departure)], found
+
+
+def main(n_cities: int, n_routes: int, n_days: int, max_stops: int, runs: int):
+    check_connection_window()
+    graph, cities, start = build(n_cities, n_routes, n_days)
+    rng = random.Random(11)
+    queries = [tuple(rng.sample(cities, 2)) for _ in range(runs)]
+    window = (start + timedelta(days=7), start + timedelta(days=8))
+    it = cycle(queries)
+
+    def one():
+        origin, destination = next(it)
+        return graph.search(
+            origin,
+            destination,
+            *window,
+            max_stops=max_stops,
+            min_connection=timedelta(minutes=settings.CONNECTION_MIN_MINUTES),
+            max_connection=timedelta(hours=settings.CONNECTION_MAX_HOURS),
+            max_expansions=settings.CONNECTION_MAX_EXPANSIONS,
+        )
+
+    found = sum(len(one()) for _ in range(runs))
+    print(f"cities={n_cities} routes={n_routes} legs={len(graph)} maxStops={max_stops}")
+    report("RouteGraph.search", measure_sync(one, runs, warmup=0), f"itineraries={found}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cities", type=int, default=60)
+    parser.add_argument("--routes", type=int, default=600)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--max-stops", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    main(args.cities, args.routes, args.days, args.max_stops, args.runs)
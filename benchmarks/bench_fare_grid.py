@@ -0,0 +1,68 @@
+# benchmarks/bench_fare_grid.py
+# 比較票價計算：逐筆 await Flight.calculate_final_price vs 批次 price_grid，並驗證結果完全相同
+# 不需要資料庫
+#
+# 執行：python -m benchmarks.bench_fare_grid [--schedules 365] [--peaks 12]
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.models.flight import CabinClass, Flight, PeakSeasonPeriod, PriceRules
+from app.utils.fare_engine import price_grid
+from benchmarks._common import measure, measure_sync, report
+
+
+def build(n_schedules: int, n_peaks: int):
+    start = datetime.now(timezone.utc).replace(microsecond=0)
+    cabins = [
+        CabinClass(category="ECONOMY", basePrice=4800, totalSeats=180),
+        CabinClass(category="BUSINESS", basePrice=15800, totalSeats=30),
+        CabinClass(category="FIRST", basePrice=32000, totalSeats=8),
+    ]
+    peaks = [
+        PeakSeasonPeriod(
+            start=start + timedelta(days=30 * i),
+            end=start + timedelta(days=30 * i + 10),
+            multiplier=1.2 + 0.05 * (i % 3),
+        )
+        for i in range(n_peaks)
+    ]
+    # 刻意放一個與其他旺季重疊的長區間，驗證「取最先出現的旺季」語意
+    peaks.append(PeakSeasonPeriod(start=start, end=start + timedelta(days=400), multiplier=1.5))
+    rules = PriceRules(peakSeasonDates=peaks)
+    # 不經過 Beanie 初始化，直接以 namespace 充當 Flight 實例呼叫未綁定方法
+    flight = SimpleNamespace(cabin_classes=cabins, price_rules=rules)
+    dates = [start + timedelta(days=d, hours=8) for d in range(n_schedules)]
+    return flight, dates
+
+
+async def scalar(flight, dates):
+    grid = []
+    for dep in dates:
+        row = {}
+        for c in flight.cabin_classes:
+            row[c.category] = await Flight.calculate_final_price(flight, c.category, dep)
+        grid.append(row)
+    return grid
+
+
+async def main(n_schedules: int, n_peaks: int, runs: int):
+    flight, dates = build(n_schedules, n_peaks)
+
+    expected = await scalar(flight, dates)
+    actual = price_grid(flight.cabin_classes, flight.price_rules, dates)
+    assert expected == actual, "批次結果與逐筆計算不一致"
+
+    print(f"schedules={n_schedules} cabins={len(flight.cabin_classes)} peaks={n_peaks + 1}")
+    report("scalar calculate_final_price", await measure(lambda: scalar(flight, dates), runs))
+    report("batch price_grid", measure_sync(lambda: price_grid(flight.cabin_classes, flight.price_rules, dates), runs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schedules", type=int, default=365)
+    parser.add_argument("--peaks", type=int, default=12)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.schedules, args.peaks, args.runs))
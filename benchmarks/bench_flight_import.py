@@ -0,0 +1,63 @@
+# benchmarks/bench_flight_import.py
+# 比較匯入 N 個航班：逐筆 create_flight vs import_flights（$in 比對、城市一次解析、分批 insert_many）
+# 城市皆在離線城市表內，不會走網路
+#
+# 執行：python -m benchmarks.bench_flight_import [--flights 500] [--schedules 30]
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from itertools import permutations
+
+from app.services.flight_import import import_flights
+from app.services.flight_service import create_flight
+from benchmarks._common import init_bench_db
+
+
+CITIES = ["Taipei", "Tokyo", "Osaka", "Seoul", "Hong Kong", "Shanghai", "Kaohsiung", "Busan", "Fukuoka", "Beijing"]
+
+
+def build_rows(n_flights: int, n_schedules: int, prefix: str):
+    pairs = list(permutations(CITIES, 2))
+    start = datetime(2030, 1, 1, 8, 0)
+    rows = []
+    for i in range(n_flights):
+        dep, arr = pairs[i % len(pairs)]
+        rows.append({
+            "flightNumber": f"{prefix}{i:05d}",
+            "route": {"departureCity": dep, "arrivalCity": arr},
+            "cabinClasses": [
+                {"category": "ECONOMY", "basePrice": 4800, "totalSeats": 180},
+                {"category": "BUSINESS", "basePrice": 15800, "totalSeats": 30},
+            ],
+            "schedules": [
+                {"departureDate": (start + timedelta(days=d, hours=i % 12)).isoformat()}
+                for d in range(n_schedules)
+            ],
+        })
+    return rows
+
+
+async def main(n_flights: int, n_schedules: int):
+    await init_bench_db()
+
+    rows = build_rows(n_flights, n_schedules, "SQ")
+    t0 = time.perf_counter()
+    for row in rows:
+        await create_flight(row)
+    sequential = time.perf_counter() - t0
+
+    report = await import_flights(build_rows(n_flights, n_schedules, "BK"))
+    assert report["inserted"] == n_flights, report["errors"][:5]
+
+    print(f"flights={n_flights} schedules/flight={n_schedules}")
+    print(f"{'sequential create_flight':<28} {sequential * 1000:10.1f}ms  {n_flights / sequential:8.1f} flights/s")
+    print(f"{'import_flights':<28} {report['elapsedMs']:10.1f}ms  {report['rowsPerSecond']:8.1f} flights/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flights", type=int, default=500)
+    parser.add_argument("--schedules", type=int, default=30)
+    args = parser.parse_args()
+    asyncio.run(main(args.flights, args.schedules))
@@ -0,0 +1,79 @@
+# benchmarks/bench_flight_save.py
+# 儲存一個有 1000 個班次的航班：舊版「每筆重建 Schedule + 兩次時區查詢」 vs 增量計算抵達時間
+# 需要本機 mongod（使用獨立的 bench 資料庫）
+#
+# 執行：python -m benchmarks.bench_flight_save [--schedules 1000]
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.models.flight import Flight
+from app.utils.fare_engine import to_utc
+from app.utils.flight_time_util import calculate_arrival_date
+from benchmarks._common import init_bench_db, measure, report
+
+
+def legacy_fill(flight: Flight):
+    """舊版 hook 的做法：全部重算，並以 type(s)(...) 重建 schedule（會產生新的 _id）"""
+    updated = []
+    for s in flight.schedules:
+        dep = s.departure_date
+        dep = dep.replace(tzinfo=timezone.utc) if dep.tzinfo is None else dep.astimezone(timezone.utc)
+        arr = calculate_arrival_date(dep, flight.route.flight_duration,
+                                     flight.route.departure_city, flight.route.arrival_city)
+        arr = arr.astimezone(timezone.utc)
+        updated.append(type(s)(
+            departure_date=dep,
+            arrival_date=arr,
+            available_seats=s.available_seats,
+            prices=s.prices,
+        ))
+    flight.schedules = updated
+
+
+async def main(n_schedules: int, runs: int):
+    await init_bench_db()
+    start = datetime(2026, 1, 1, 0, 30, tzinfo=timezone.utc)
+    flight = Flight.model_validate({
+        "flightNumber": "SV001",
+        "route": {"departureCity": "Taipei", "arrivalCity": "Tokyo", "flightDuration": 180},
+        "cabinClasses": [{"category": "ECONOMY", "basePrice": 5000, "totalSeats": 180}],
+        "schedules": [
+            {"departureDate": start + timedelta(days=d), "availableSeats": {"ECONOMY": 180}}
+            for d in range(n_schedules)
+        ],
+    })
+    await flight.insert()
+    ids_before = [s.id for s in flight.schedules]
+
+    # 驗證：增量計算的抵達時間與舊版一致，且 schedule _id 不變
+    reloaded = await Flight.get(flight.id)
+    expected = Flight.model_validate(reloaded.model_dump(by_alias=True))
+    legacy_fill(expected)
+    assert [to_utc(s.arrival_date) for s in reloaded.schedules] == [s.arrival_date for s in expected.schedules]
+    assert [s.id for s in reloaded.schedules] == ids_before
+
+    print(f"schedules={n_schedules}")
+
+    async def legacy_hook():
+        legacy_fill(expected)
+
+    async def incremental_hook():
+        reloaded.schedules[0].departure_date += timedelta(minutes=5)
+        await reloaded.fill_schedule_arrival_dates()
+
+    async def save_one_changed():
+        reloaded.schedules[0].departure_date += timedelta(minutes=5)
+        await reloaded.save()
+
+    report("legacy hook (all schedules)", await measure(legacy_hook, runs))
+    report("incremental hook (1 changed)", await measure(incremental_hook, runs))
+    report("save() with 1 changed", await measure(save_one_changed, runs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schedules", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.schedules, args.runs))
@@ -0,0 +1,96 @@
+# benchmarks/bench_flight_search.py
+# 比較航班搜尋：舊版「整份 Flight 載入 + Python 迴圈篩 schedules」 vs 聚合管線 $filter
+#
+# 執行：python -m benchmarks.bench_flight_search [--flights 20] [--days 1095]
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import bson
+
+from app.models.flight import Flight
+from app.services.flight_service import search_flights_pipeline
+from benchmarks._common import init_bench_db, measure, report
+
+
+DEP, ARR = "Taipei", "Tokyo"
+
+
+async def seed(db, n_flights: int, days: int):
+    start = datetime(2025, 1, 1, 0, 30, tzinfo=timezone.utc)
+    docs = []
+    for i in range(n_flights):
+        schedules = [
+            {
+                "_id": bson.ObjectId(),
+                "departureDate": start + timedelta(days=d, hours=i % 24),
+                "arrivalDate": start + timedelta(days=d, hours=i % 24 + 3),
+                "availableSeats": {"ECONOMY": 180, "BUSINESS": 30},
+                "prices": {},
+            }
+            for d in range(days)
+        ]
+        docs.append({
+            "flightNumber": f"BM{i:04d}",
+            "route": {"departureCity": DEP, "arrivalCity": ARR, "flightDuration": 180},
+            "cabinClasses": [
+                {"category": "ECONOMY", "basePrice": 5000, "totalSeats": 180, "bookedSeats": 0},
+                {"category": "BUSINESS", "basePrice": 15000, "totalSeats": 30, "bookedSeats": 0},
+            ],
+            "priceRules": {},
+            "schedules": schedules,
+        })
+    # 直接寫入原始文件，避開 before_event 的時區計算
+    await db[Flight.Settings.name].insert_many(docs)
+
+
+async def legacy_search(start_utc, end_utc):
+    flights = await Flight.find(
+        (Flight.route.departure_city == DEP) & (Flight.route.arrival_city == ARR)
+    ).to_list()
+    result, wire = [], 0
+    for f in flights:
+        wire += len(bson.encode(f.model_dump(by_alias=True)))
+        filtered = []
+        for s in f.schedules:
+            dep = s.departure_date
+            if dep.tzinfo is None:
+                dep = dep.replace(tzinfo=timezone.utc)
+            if start_utc <= dep <= end_utc:
+                filtered.append(s)
+        if filtered:
+            result.append(filtered)
+    return result, wire
+
+
+async def pipeline_search(start_utc, end_utc):
+    docs = await Flight.aggregate(search_flights_pipeline(DEP, ARR, start_utc, end_utc)).to_list()
+    wire = sum(len(bson.encode(d)) for d in docs)
+    return docs, wire
+
+
+async def main(n_flights: int, days: int, runs: int):
+    db = await init_bench_db()
+    await seed(db, n_flights, days)
+
+    start_utc = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    end_utc = start_utc + timedelta(days=7)
+
+    (legacy_rows, legacy_bytes) = await legacy_search(start_utc, end_utc)
+    (new_rows, new_bytes) = await pipeline_search(start_utc, end_utc)
+    assert sum(len(r) for r in legacy_rows) == sum(len(d["schedules"]) for d in new_rows)
+
+    print(f"flights={n_flights} schedules/flight={days} window=7d")
+    report("legacy (find + loop)", await measure(lambda: legacy_search(start_utc, end_utc), runs),
+           f"bytes={legacy_bytes}")
+    report("aggregate ($filter)", await measure(lambda: pipeline_search(start_utc, end_utc), runs),
+           f"bytes={new_bytes}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flights", type=int, default=20)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+    asyncio.run(main(args.flights, args.days, args.runs))
@@ -0,0 +1,91 @@
+# benchmarks/bench_hotel_facets.py
+# 比較篩選條件計數：逐一 count_documents（每個 facet 值一次查詢）vs 常駐點陣索引（一次 popcount）
+# 另外量測索引整份重建的耗時
+#
+# 執行：python -m benchmarks.bench_hotel_facets [--hotels 20000]
+import argparse
+import asyncio
+import random
+import time
+
+from app.models.hotel import Hotel
+from app.services import hotel_facets
+from benchmarks._common import init_bench_db, measure, report
+
+
+TYPES = ["hotel", "apartment", "guesthouse", "villa", "hostel", "motel", "capsule", "resort"]
+CITIES = ["Taipei", "Kaohsiung", "Taichung", "Hualien", "Tainan", "Tokyo", "Osaka", "Seoul"]
+SELECTIONS = [
+    {},
+    {"city": ["Taipei"]},
+    {"city": ["Taipei", "Tokyo"], "type": ["hotel", "resort"]},
+    {"city": ["Taipei"], "rating": ["8+"], "facilities": ["wifi", "pool"]},
+]
+
+
+async def seed(db, n_hotels: int):
+    rnd = random.Random(11)
+    await db[Hotel.Settings.name].insert_many([
+        {
+            "name": f"Facet Hotel {i}",
+            "type": rnd.choice(TYPES),
+            "city": rnd.choice(CITIES),
+            "rating": round(rnd.uniform(5, 10), 1),
+            "facilities": {f: rnd.random() < 0.4 for f in hotel_facets.FACILITIES},
+        }
+        for i in range(n_hotels)
+    ])
+
+
+def _match(facet: str, values) -> dict:
+    if facet == "facilities":
+        return {f"facilities.{v}": True for v in values}
+    if facet == "rating":
+        return {"rating": {"$gte": min(int(v.rstrip("+")) for v in values)}}
+    return {facet: {"$in": list(values)}}
+
+
+async def legacy_counts(db, selection):
+    # 沒有常駐索引時的做法：每個 facet 值各下一次 count_documents
+    hotels = db[Hotel.Settings.name]
+    counts = {}
+    for facet, values in (await hotel_facets.facet_counts({}))["facets"].items():
+        others = {}
+        for f, selected in selection.items():
+            if f != facet or facet in hotel_facets.CONJUNCTIVE:
+                others.update(_match(f, selected))
+        counts[facet] = {
+            v["value"]: await hotels.count_documents({**others, **_match(facet, [v["value"]])})
+            for v in values
+        }
+    return counts
+
+
+async def main(n_hotels: int, runs: int):
+    db = await init_bench_db()
+    await seed(db, n_hotels)
+
+    t0 = time.perf_counter()
+    index = await hotel_facets.rebuild()
+    print(f"hotels={n_hotels} indexed={len(index)} rebuild={(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    for selection in SELECTIONS:
+        bitmap = await hotel_facets.facet_counts(selection)
+        legacy = await legacy_counts(db, selection)
+        assert legacy == {f: {v["value"]: v["count"] for v in values} for f, values in bitmap["facets"].items()}
+        queries = sum(len(values) for values in legacy.values())
+
+        label = ",".join(f"{f}={'|'.join(v)}" for f, v in selection.items()) or "(none)"
+        print(label)
+        report("count_documents per value", await measure(lambda: legacy_counts(db, selection), runs // 5 or 1),
+               f"queries={queries}")
+        report("bitmap facet_counts", await measure(lambda: hotel_facets.facet_counts(selection), runs),
+               f"total={bitmap['total']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.hotels, args.runs))
@@ -0,0 +1,103 @@
+# benchmarks/bench_hotel_search.py
+# 比較飯店搜尋的資料讀取：舊版「每間飯店各查一次房型」(N+1) vs fetch_hotels_with_rooms（一次 $in）
+# 另外量測「所有符合的飯店都計價」與分頁後的 list_hotels（只對一頁的飯店計價）在 10 / 100 / 1000 間飯店時的耗時
+#
+# 執行：python -m benchmarks.bench_hotel_search [--sizes 10,100,1000] [--rooms 5]
+import argparse
+import asyncio
+
+import bson
+
+from app.models.hotel import Hotel
+from app.models.room import Room
+from app.services.hotel_service import _price_hotel, fetch_hotels_with_rooms, list_hotels
+from benchmarks._common import init_bench_db, measure, report
+
+
+NAME = "Bench Hotel"
+
+
+async def seed(db, n_hotels: int, rooms_per_hotel: int):
+    hotels, rooms = [], []
+    for i in range(n_hotels):
+        hotel_id = bson.ObjectId()
+        hotels.append({
+            "_id": hotel_id,
+            "name": f"{NAME} {i:04d}",
+            "type": "hotel",
+            "city": "Taipei",
+            "address": f"No.{i}, Bench Rd.",
+            "photos": [f"https://example.com/{i}/{p}.jpg" for p in range(5)],
+            "title": "bench",
+            "desc": "bench hotel",
+            "cheapestPrice": 0,
+            "checkInTime": "15:00",
+            "checkOutTime": "11:00",
+            "coordinates": {"latitude": 25.03, "longitude": 121.56},
+            "email": "bench@example.com",
+            "nearbyAttractions": ["Taipei 101"],
+            "phone": "02-0000-0000",
+            "rooms": [],
+        })
+        for r in range(rooms_per_hotel):
+            rooms.append({
+                "title": f"Room {r}",
+                "desc": ["bench room"],
+                "roomType": "Double Room",
+                "maxPeople": 2,
+                "hotelId": hotel_id,
+                "paymentOptions": [{"type": "credit_card", "description": "card", "refundable": True}],
+                "pricing": [
+                    {"days_of_week": [1, 2, 3, 4, 0], "price": 2000 + r * 100},
+                    {"days_of_week": [5, 6], "price": 2600 + r * 100},
+                ],
+                "holidays": [{"date": "2030-01-01", "price": 3500 + r * 100}],
+            })
+    await db[Hotel.Settings.name].insert_many(hotels)
+    await db[Room.Settings.name].insert_many(rooms)
+    # 與正式環境相同的 hotelId 索引（見 app/core/indexes.py）
+    await db[Room.Settings.name].create_index("hotelId", name="hotel_id")
+
+
+async def legacy_fetch(query: dict):
+    hotels = await Hotel.find(query).to_list()
+    return [(h, await Room.find(Room.hotel_id == h.id).to_list()) for h in hotels]
+
+
+START, END = "2029-12-30", "2030-01-03"
+
+
+async def price_all(query: dict):
+    # 分頁前的做法：所有符合的飯店都取房型並計價
+    return [_price_hotel(h, rooms, START, END) for h, rooms in await fetch_hotels_with_rooms(query)]
+
+
+async def page_of_hotels(limit: int):
+    return await list_hotels(name=NAME, start_date=START, end_date=END, limit=limit)
+
+
+async def main(sizes, rooms_per_hotel: int, runs: int):
+    query = {"name": {"$regex": NAME, "$options": "i"}}
+    for n_hotels in sizes:
+        db = await init_bench_db()
+        await seed(db, n_hotels, rooms_per_hotel)
+
+        legacy, batched = await legacy_fetch(query), await fetch_hotels_with_rooms(query)
+        assert [len(r) for _, r in legacy] == [len(r) for _, r in batched]
+
+        print(f"hotels={n_hotels} rooms/hotel={rooms_per_hotel}")
+        report("legacy fetch (N+1)", await measure(lambda: legacy_fetch(query), runs), f"round_trips={n_hotels + 1}")
+        report("fetch_hotels_with_rooms", await measure(lambda: fetch_hotels_with_rooms(query), runs), "round_trips=2")
+        report("price every hotel", await measure(lambda: price_all(query), runs), f"priced={n_hotels}")
+        for limit in (20, 100):
+            report(f"list_hotels (page of {limit})", await measure(lambda: page_of_hotels(limit), runs),
+                   f"priced={min(limit, n_hotels)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main([int(n) for n in args.sizes.split(",")], args.rooms, args.runs))
@@ -0,0 +1,60 @@
+# benchmarks/bench_hotel_suggestions.py
+# 比較飯店名稱自動完成：舊版資料庫 $regex（不分大小寫、無法用索引）vs 常駐 n-gram 索引
+#
+# 執行：python -m benchmarks.bench_hotel_suggestions [--hotels 20000]
+import argparse
+import asyncio
+import random
+import re
+
+from app.models.hotel import Hotel
+from app.services import hotel_suggestions
+from benchmarks._common import init_bench_db, measure, report
+
+
+WORDS = ["Grand", "Hotel", "Inn", "Taipei", "Tokyo", "Resort", "Plaza", "Royal", "Garden", "Harbour"]
+CJK = "台北晶華酒店君悅國賓福華喜來登大飯店旅館民宿高雄花蓮礁溪溫泉"
+QUERIES = ["晶華", "溫泉", "大飯店", "ho", "grand", "plaza roy", "Taipei 12"]
+
+
+async def seed(db, n_hotels: int):
+    rnd = random.Random(7)
+    docs = []
+    for i in range(n_hotels):
+        if i % 2:
+            name = " ".join(rnd.sample(WORDS, 3)) + f" {i}"
+        else:
+            name = "".join(rnd.choice(CJK) for _ in range(rnd.randrange(3, 9)))
+        docs.append({
+            "name": name,
+            "popularHotel": rnd.random() < 0.1,
+            "rating": round(rnd.uniform(5, 10), 1),
+        })
+    await db[Hotel.Settings.name].insert_many(docs)
+
+
+async def legacy_suggest(db, name: str):
+    return await db[Hotel.Settings.name].find(
+        {"name": {"$regex": re.escape(name), "$options": "i"}}, {"name": 1}
+    ).limit(10).to_list(length=10)
+
+
+async def main(n_hotels: int, runs: int):
+    db = await init_bench_db()
+    await seed(db, n_hotels)
+    index = await hotel_suggestions.rebuild()
+
+    print(f"hotels={n_hotels} indexed={len(index)}")
+    for q in QUERIES:
+        legacy = await measure(lambda: legacy_suggest(db, q), runs)
+        indexed = await measure(lambda: hotel_suggestions.suggest(q), runs)
+        report(f"$regex   {q!r}", legacy)
+        report(f"n-gram   {q!r}", indexed, f"hits={len(await hotel_suggestions.suggest(q))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.hotels, args.runs))
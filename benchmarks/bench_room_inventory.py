@@ -0,0 +1,106 @@
+# benchmarks/bench_room_inventory.py
+# 比較「入住區間還有空房的房型」兩種查法：舊版掃描區間重疊的訂單逐晚統計 vs 庫存帳 available_rooms（一次 _id $in）
+# 另外以並發搶同一間房的最後庫存，確認 reserve 不會超賣
+#
+# 執行：python -m benchmarks.bench_room_inventory [--sizes 100,1000,5000] [--orders 20]
+import argparse
+import asyncio
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+import bson
+
+from app.models.order import Order
+from app.services import room_inventory
+from benchmarks._common import init_bench_db, measure, report
+
+
+START, END = date(2030, 1, 28), date(2030, 2, 3)   # 跨月，6 晚
+CAPACITY = 5
+
+
+def _at(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+async def seed(db, n_rooms: int, orders_per_room: int):
+    rng = random.Random(n_rooms)
+    rooms = [bson.ObjectId() for _ in range(n_rooms)]
+    orders, ledgers = [], {}
+    for room_id in rooms:
+        for _ in range(orders_per_room):
+            check_in = date(2030, 1, 15) + timedelta(days=rng.randrange(30))
+            check_out = check_in + timedelta(days=rng.randrange(1, 5))
+            orders.append({
+                "userId": bson.ObjectId(), "hotelId": bson.ObjectId(), "roomId": room_id,
+                "checkInDate": _at(check_in), "checkOutDate": _at(check_out),
+                "totalPrice": 1000, "status": "confirmed",
+            })
+            # 庫存帳與訂單一致（正式環境由 create_order 維護，這裡直接在記憶體累加後整批寫入）
+            for month, days in room_inventory.nights_by_month(check_in, check_out).items():
+                ledger = ledgers.setdefault(room_inventory.ledger_id(room_id, month), {
+                    "_id": room_inventory.ledger_id(room_id, month), "roomId": room_id, "month": month,
+                    "booked": room_inventory.empty_month(month),
+                })
+                for d in days:
+                    ledger["booked"][d] += 1
+    await db[Order.Settings.name].insert_many(orders)
+    await db[room_inventory.COLLECTION].insert_many(list(ledgers.values()))
+    await db[Order.Settings.name].create_index("roomId")
+    return {room_id: CAPACITY for room_id in rooms}
+
+
+async def legacy_available(db, capacities):
+    booked = Counter()
+    cursor = db[Order.Settings.name].find(
+        {"roomId": {"$in": list(capacities)}, "status": {"$in": ["pending", "confirmed"]},
+         "checkInDate": {"$lt": _at(END)}, "checkOutDate": {"$gt": _at(START)}},
+        {"roomId": 1, "checkInDate": 1, "checkOutDate": 1},
+    )
+    async for doc in cursor:
+        day = max(doc["checkInDate"].date(), START)
+        while day < min(doc["checkOutDate"].date(), END):
+            booked[doc["roomId"], day] += 1
+            day += timedelta(days=1)
+    full = {room_id for room_id, _ in booked if any(
+        booked[room_id, START + timedelta(days=i)] >= capacities[room_id] for i in range((END - START).days)
+    )}
+    return set(capacities) - full
+
+
+async def stress_last_room(concurrency: int) -> int:
+    room_id = bson.ObjectId()
+    results = await asyncio.gather(*(
+        room_inventory.reserve(room_id, CAPACITY, START, END) for _ in range(concurrency)
+    ))
+    return sum(results)
+
+
+async def main(sizes, orders_per_room: int, runs: int):
+    for n_rooms in sizes:
+        db = await init_bench_db()
+        capacities = await seed(db, n_rooms, orders_per_room)
+
+        legacy = await legacy_available(db, capacities)
+        ledger = await room_inventory.available_rooms(capacities, START, END)
+        assert legacy == ledger, (len(legacy), len(ledger))
+
+        print(f"rooms={n_rooms} orders/room={orders_per_room} available={len(ledger)}")
+        report("legacy (scan orders)", await measure(lambda: legacy_available(db, capacities), runs))
+        report("available_rooms (ledger)", await measure(
+            lambda: room_inventory.available_rooms(capacities, START, END), runs
+        ))
+
+    booked = await stress_last_room(50)
+    print(f"50 concurrent reserves on a room with {CAPACITY} units: {booked} succeeded")
+    assert booked == CAPACITY
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,1000,5000")
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main([int(n) for n in args.sizes.split(",")], args.orders, args.runs))
@@ -0,0 +1,104 @@
+# benchmarks/bench_room_pricing.py
+# 比較房型總價計算：舊版逐晚掃描 holidays / pricing vs 編譯後的價格表（星期陣列 + 假日雜湊），並驗證結果完全相同
+# 不需要資料庫
+#
+# 執行：python -m benchmarks.bench_room_pricing [--rooms 2000] [--nights 14]
+import argparse
+import random
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import bson
+
+from app.models.room import HolidayPricing, Room, WeekdayPricing
+from app.utils import room_pricing
+from benchmarks._common import measure_sync, report
+
+
+def legacy_total(room, start_date: str, end_date: str) -> float:
+    """舊版 Room.calculate_total_price（去掉 print），作為比對基準"""
+    total_price = 0.0
+    current_date = date.fromisoformat(start_date)
+    end_date_obj = date.fromisoformat(end_date)
+    while current_date < end_date_obj:
+        date_str = current_date.isoformat()
+        node_day = (current_date.weekday() + 1) % 7
+        holiday_price = None
+        for h in room.holidays or []:
+            if h.date == date_str:
+                holiday_price = float(h.price)
+                break
+        if holiday_price is not None:
+            total_price += holiday_price
+        else:
+            for p in room.pricing or []:
+                normalized_days = [
+                    int(d["$numberInt"]) if isinstance(d, dict) and "$numberInt" in d else int(d)
+                    for d in p.days_of_week or []
+                ]
+                if node_day in normalized_days:
+                    total_price += float(p.price or 0)
+                    break
+        current_date += timedelta(days=1)
+    return total_price
+
+
+def build(n_rooms: int, seed: int = 7):
+    rnd = random.Random(seed)
+    start = date(2030, 1, 1)
+    rooms = []
+    for _ in range(n_rooms):
+        # 刻意包含：小數價格、重疊的星期規則、沒有規則的星期、同一天重複的假日
+        pricing = [
+            WeekdayPricing(days_of_week=[1, 2, 3, 4], price=rnd.choice([1800, 2150.5, 2399.99])),
+            WeekdayPricing(days_of_week=[4, 5, 6], price=rnd.uniform(2500, 4000)),
+        ]
+        holidays = [
+            HolidayPricing(date=(start + timedelta(days=rnd.randrange(365))).isoformat(), price=rnd.uniform(3000, 6000))
+            for _ in range(rnd.randrange(5, 40))
+        ]
+        holidays.append(HolidayPricing(date=holidays[0].date, price=99999))
+        # 不經過 Beanie 初始化，直接以 namespace 充當 Room 實例呼叫未綁定方法
+        rooms.append(SimpleNamespace(
+            id=bson.ObjectId(), updated_at=datetime.now(timezone.utc), pricing=pricing, holidays=holidays
+        ))
+    return rooms
+
+
+def main(n_rooms: int, nights: int, runs: int):
+    rooms = build(n_rooms)
+    rnd = random.Random(11)
+    for _ in range(200):
+        room = rnd.choice(rooms)
+        check_in = date(2030, 1, 1) + timedelta(days=rnd.randrange(360))
+        check_out = check_in + timedelta(days=rnd.randrange(1, 60))
+        expected = legacy_total(room, check_in.isoformat(), check_out.isoformat())
+        assert Room.calculate_total_price(room, check_in.isoformat(), check_out.isoformat()) == expected
+
+    check_in = "2030-03-01"
+    check_out = (date(2030, 3, 1) + timedelta(days=nights)).isoformat()
+
+    def legacy():
+        return [legacy_total(r, check_in, check_out) for r in rooms]
+
+    def compiled():
+        return [Room.calculate_total_price(r, check_in, check_out) for r in rooms]
+
+    def cold():
+        room_pricing._cache.clear()
+        return compiled()
+
+    assert legacy() == compiled()
+    print(f"rooms={n_rooms} nights={nights}")
+    report("legacy (scan per night)", measure_sync(legacy, runs))
+    report("price table (cold)", measure_sync(cold, runs))
+    report("price table (cached)", measure_sync(compiled, runs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=2000)
+    parser.add_argument("--nights", type=int, default=14)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    main(args.rooms, args.nights, args.runs)
@@ -0,0 +1,75 @@
+# benchmarks/stress_seat_booking.py
+# 併發壓力測試：數百個同時扣位請求打同一個班次，驗證不會超賣
+# 需要本機 mongod（使用獨立的 bench 資料庫）
+#
+# 執行：python -m benchmarks.stress_seat_booking [--seats 100] [--requests 500]
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import bson
+
+from app.models.flight import Flight
+from app.services.schedule_store import reserve_seats
+from benchmarks._common import init_bench_db
+
+
+async def main(seats: int, requests: int, max_per_booking: int) -> int:
+    db = await init_bench_db()
+
+    flight_oid, schedule_oid = bson.ObjectId(), bson.ObjectId()
+    await db[Flight.Settings.name].insert_one({
+        "_id": flight_oid,
+        "flightNumber": "ST001",
+        "route": {"departureCity": "Taipei", "arrivalCity": "Tokyo", "flightDuration": 180},
+        "cabinClasses": [{"category": "ECONOMY", "basePrice": 5000, "totalSeats": seats, "bookedSeats": 0}],
+        "priceRules": {},
+        "schedules": [{
+            "_id": schedule_oid,
+            "departureDate": datetime.now(timezone.utc) + timedelta(days=10),
+            "availableSeats": {"ECONOMY": seats},
+            "prices": {},
+        }],
+    })
+
+    wanted = [random.randint(1, max_per_booking) for _ in range(requests)]
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(
+        reserve_seats(flight_oid, schedule_oid, "ECONOMY", n) for n in wanted
+    ))
+    elapsed = time.perf_counter() - t0
+
+    sold = sum(n for n, r in zip(wanted, results) if r)
+    doc = await db[Flight.Settings.name].find_one({"_id": flight_oid})
+    remaining = doc["schedules"][0]["availableSeats"]["ECONOMY"]
+
+    print(f"requests={requests} seats={seats} ok={sum(1 for r in results if r)} "
+          f"sold={sold} remaining={remaining} elapsed={elapsed * 1000:.1f}ms")
+
+    if remaining < 0 or sold + remaining != seats:
+        print("FAIL: 超賣或座位數不一致")
+        return 1
+
+    # 座位不足的請求必須回 None（不能只是沒扣到座位卻回傳航班，呼叫端會當成訂位成功）
+    if await reserve_seats(flight_oid, schedule_oid, "ECONOMY", remaining + 1):
+        print("FAIL: 座位不足仍回報扣位成功")
+        return 1
+    doc = await db[Flight.Settings.name].find_one({"_id": flight_oid})
+    if doc["schedules"][0]["availableSeats"]["ECONOMY"] != remaining:
+        print("FAIL: 座位不足的請求改動了座位數")
+        return 1
+    print("OK: 沒有超賣")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seats", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--max-per-booking", type=int, default=4)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.seats, args.requests, args.max_per_booking)))